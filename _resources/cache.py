@@ -0,0 +1,311 @@
+"""
+Two tier cache with versioned keys (used for the catalog reads, see 'product.cache').
+
+** Every process keeps the last 'local_size' entries in an LRU of its memory in front of a shared cache (memcached in
+production, see 'CACHES'). A read is a dictionary lookup when the entry is in the process, one round trip to the
+shared cache when it's not and the computation when it's in neither of them. Values are shared by the readers of the
+process, they must not be changed.
+
+** Entries are not deleted when the data changes. Keys have the versions of their groups (eg: 'product:<slug>',
+'category:<id>'):
+    tiered:product-detail:<url>:<version of product:slug>.<version of categories>...
+and 'invalidate' increases the versions of the changed groups (one 'incr' for every group), so the old entries are
+never read again and expire. Versions are cached in the process for 'local_timeout' seconds: changes made in the
+process are seen at once, changes of other processes after the timeout. A version that is not in the shared cache
+(new or evicted) starts from the current time, so it's always newer than the versions it had before.
+
+** Concurrent misses of a key are computed once (a popular product that is changed is requested by hundreds of
+readers at the same time). Readers of the process wait for the first one ('Flight') and processes take a lock key in
+the shared cache ('add'), readers of the other processes poll the shared cache until the value is set. Every name
+keeps its last value in a 'stale' key too (it has no versions), readers that wait get it instead if there is one, so
+a changed page is served from the cache while it's computed again.
+
+** Entries are refreshed before they expire: a reader computes the value again with a probability that grows as the
+expiration gets closer and with the time that the computation takes ('TIERED_CACHE_EARLY_REFRESH', XFetch). Other
+readers get the current value meanwhile.
+
+** 'stats' counts local hits, shared hits, misses, early refreshes, coalesced and stale reads and invalidations of the
+process.
+"""
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LocalLRU:
+    """Thread safe LRU of '(expires, value)' entries"""
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class Entry(namedtuple('Entry', ['value', 'expires', 'delta'])):
+    """Cached value, its expiration (unix time) and seconds of its computation"""
+    __slots__ = ()
+
+    def should_refresh(self, beta):
+        """True if the entry is expired or it's chosen to be refreshed early ('1 - random()' is never 0)"""
+        return time.time() - self.delta * beta * math.log(1 - random.random()) >= self.expires
+
+
+class Flight:
+    """Computation of a key in the process. Other readers of the key wait for its value or read the stale value"""
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.stale = None
+        self.done = False
+        self.value = self.error = None
+
+    def publish_stale(self, entry):
+        with self.condition:
+            self.stale = entry
+            self.condition.notify_all()
+
+    def finish(self, value=None, error=None):
+        with self.condition:
+            self.value, self.error, self.done = value, error, True
+            self.condition.notify_all()
+
+    def wait(self, timeout):
+        """Wait until the value or the stale value is known. True if the value is computed"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.done or self.stale is not None, timeout)
+            if self.done and self.error is not None:
+                raise self.error
+            return self.done
+
+
+class TieredCache:
+    """
+    In-process LRU in front of the shared cache 'alias' ('default' if it's not configured, eg: tests that override
+    'CACHES'). 'timeout' of the shared entries, 'local_timeout' of the entries and versions in the process and
+    'local_size' of the LRU are read from the settings when they are not given
+    """
+    # Seconds between the reads of a reader that waits for another process
+    poll_interval = 0.005
+
+    def __init__(self, prefix, alias=None, timeout=None, local_timeout=None, local_size=None):
+        self.prefix = prefix
+        self._alias = alias
+        self._timeout = timeout
+        self._local_timeout = local_timeout
+        self.local = LocalLRU(local_size or settings.TIERED_CACHE_LOCAL_SIZE)
+        self.stats_lock = threading.Lock()
+        self.counters = Counter()
+        self.flights = dict()
+        self.flights_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        alias = self._alias or settings.TIERED_CACHE_ALIAS
+        return caches[alias if alias in settings.CACHES else 'default']
+
+    @property
+    def timeout(self):
+        return settings.TIERED_CACHE_TIMEOUT if self._timeout is None else self._timeout
+
+    @property
+    def local_timeout(self):
+        return settings.TIERED_CACHE_LOCAL_TIMEOUT if self._local_timeout is None else self._local_timeout
+
+    def count(self, name, value=1):
+        with self.stats_lock:
+            self.counters[name] += value
+
+    def version_key(self, group):
+        return f'{self.prefix}:version:{group}'
+
+    def versions(self, groups):
+        """Current version of every group. Versions that are not in the process are read with one round trip"""
+        versions, missing = dict(), []
+        for group in groups:
+            version = self.local.get(self.version_key(group))
+            if version is None:
+                missing.append(self.version_key(group))
+            else:
+                versions[group] = version
+        if missing:
+            found = self.shared.get_many(missing)
+            for key in missing:
+                if key not in found:
+                    version = time.time_ns()
+                    # 'add' keeps the version that another process adds at the same time
+                    found[key] = version if self.shared.add(key, version, None) else self.shared.get(key, version)
+            for group in groups:
+                key = self.version_key(group)
+                if key in found:
+                    versions[group] = found[key]
+                    self.local.set(key, found[key], self.local_timeout)
+        return versions
+
+    def make_key(self, name, groups):
+        versions = self.versions(groups)
+        return f'{self.prefix}:{name}:' + '.'.join(str(versions[group]) for group in groups)
+
+    def stale_key(self, name):
+        return f'{self.prefix}:stale:{name}'
+
+    def get_or_set(self, name, groups, compute):
+        """
+        Value of 'name' (eg: the url of the page) that depends on the groups. 'compute()' is called if it's not in
+        the cache, only by one reader at a time. 'TIERED_CACHE_TIMEOUT = 0' disables the cache
+        """
+        if not self.timeout:
+            return compute()
+        key = self.make_key(name, groups)
+        entry = self.local.get(key)
+        if entry is not None and not entry.should_refresh(settings.TIERED_CACHE_EARLY_REFRESH):
+            self.count('local_hits')
+            return entry.value
+        with self.flights_lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        if not leader:
+            if entry is not None:
+                flight.publish_stale(entry)
+            return self.follow(flight, compute)
+        try:
+            value = self.lead(key, name, flight, compute)
+        except BaseException as error:
+            flight.finish(error=error)
+            raise
+        else:
+            flight.finish(value)
+        finally:
+            with self.flights_lock:
+                del self.flights[key]
+        return value
+
+    def follow(self, flight, compute):
+        """Value of the reader of the process that computes the key, or the stale value"""
+        if flight.wait(settings.TIERED_CACHE_LOCK_TIMEOUT):
+            self.count('coalesced')
+            return flight.value
+        if flight.stale is not None:
+            self.count('stale')
+            return flight.stale.value
+        # The reader that computes it takes too long
+        self.count('misses')
+        return compute()
+
+    def lead(self, key, name, flight, compute):
+        found = self.shared.get_many([key, self.stale_key(name)])
+        entry = found.get(key)
+        beta = settings.TIERED_CACHE_EARLY_REFRESH
+        if entry is not None and not entry.should_refresh(beta):
+            self.count('shared_hits')
+            self.keep(key, entry)
+            return entry.value
+        stale = entry or found.get(self.stale_key(name))
+        flight.publish_stale(stale)
+        lock_key, token = f'{key}:lock', uuid.uuid4().hex
+        if not self.shared.add(lock_key, token, settings.TIERED_CACHE_LOCK_TIMEOUT):
+            # Another process computes the value
+            if stale is not None:
+                self.count('stale')
+                return stale.value
+            entry = self.wait_for(key, lock_key)
+            if entry is not None:
+                self.count('coalesced')
+                self.keep(key, entry)
+                return entry.value
+        try:
+            self.count('early_refreshes' if entry is not None else 'misses')
+            started = time.perf_counter()
+            value = compute()
+            entry = Entry(value, time.time() + self.timeout, time.perf_counter() - started)
+            # Stale values are kept for the readers that wait for the next computation
+            self.shared.set_many({key: entry, self.stale_key(name): entry},
+                                 self.timeout + settings.TIERED_CACHE_LOCK_TIMEOUT)
+            self.keep(key, entry)
+            return value
+        finally:
+            # The lock expires if the process is killed. It's not deleted if it expired and another process took it
+            if self.shared.get(lock_key) == token:
+                self.shared.delete(lock_key)
+
+    def wait_for(self, key, lock_key):
+        """Entry that another process computes, 'None' if it released the lock without it or it took too long"""
+        deadline = time.monotonic() + settings.TIERED_CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            found = self.shared.get_many([key, lock_key])
+            if key in found:
+                return found[key]
+            if lock_key not in found:
+                return None
+        return None
+
+    def keep(self, key, entry):
+        """Keep the entry in the process until it expires or for 'local_timeout' seconds"""
+        timeout = min(self.local_timeout, entry.expires - time.time())
+        if timeout > 0:
+            self.local.set(key, entry, timeout)
+
+    def invalidate(self, groups):
+        """Increase the versions of the groups, entries of their old versions are never read again"""
+        for group in set(groups):
+            key = self.version_key(group)
+            try:
+                version = self.shared.incr(key)
+            except ValueError:
+                version = time.time_ns()
+                self.shared.set(key, version, None)
+            self.local.set(key, version, self.local_timeout)
+            self.count('invalidations')
+
+    def clear(self):
+        """Clear both tiers and the counters (eg: between the tests, the shared cache may have other entries too)"""
+        self.local.clear()
+        self.shared.clear()
+        with self.stats_lock:
+            self.counters.clear()
+
+    def stats(self):
+        with self.stats_lock:
+            counters = dict(self.counters)
+        stats = {name: counters.get(name, 0) for name in ('local_hits', 'shared_hits', 'coalesced', 'stale', 'misses',
+                                                          'early_refreshes', 'invalidations')}
+        # Early refreshes are computed, but their readers had a value too
+        reads = sum(stats[name] for name in ('local_hits', 'shared_hits', 'coalesced', 'stale', 'misses',
+                                             'early_refreshes'))
+        hits = reads - stats['misses']
+        return dict(stats, hit_ratio=round(hits / reads, 4) if reads else None, local_entries=len(self.local))
@@ -0,0 +1,60 @@
+"""
+Local stand-in of the shared cache (memcached) to develop, test and benchmark without a cache server.
+
+** It's 'LocMemCache' (values are pickled, so readers get copies like from a server) with the latency of a network
+round trip ('OPTIONS': {'LATENCY': 0.0005}) and a counter of the round trips. Caches with the same 'LOCATION' share
+their entries in the process, like processes that share a server.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.core.cache.backends.locmem import LocMemCache
+
+
+_round_trips = Counter()
+_lock = threading.Lock()
+
+
+def round_trip(method):
+    def wrapper(self, *args, **kwargs):
+        with _lock:
+            _round_trips[self.location] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+
+class StandInCache(LocMemCache):
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.location = name
+        self.latency = float(params.get('OPTIONS', dict()).get('LATENCY', 0))
+
+    @property
+    def round_trips(self):
+        return _round_trips[self.location]
+
+    # Every method is one request to the server ('get_many' and 'set_many' too)
+    add = round_trip(LocMemCache.add)
+    get = round_trip(LocMemCache.get)
+    set = round_trip(LocMemCache.set)
+    touch = round_trip(LocMemCache.touch)
+    incr = round_trip(LocMemCache.incr)
+    delete = round_trip(LocMemCache.delete)
+    clear = round_trip(LocMemCache.clear)
+
+    @round_trip
+    def get_many(self, keys, version=None):
+        return {key: value for key, value in ((key, LocMemCache.get(self, key, self._missing, version))
+                                              for key in keys) if value is not self._missing}
+
+    @round_trip
+    def set_many(self, data, timeout=None, version=None):
+        for key, value in data.items():
+            LocMemCache.set(self, key, value, timeout, version)
+        return []
+
+    _missing = object()
@@ -0,0 +1,185 @@
+"""
+Keyset (cursor) pagination for rest-framework views.
+
+** 'LIMIT/OFFSET' pagination reads and throws away all the rows before the page, so deep pages get slower and slower.
+Keyset pagination remembers the ordering values of the last row of the page (the cursor) and the next page starts
+after it:
+    WHERE created < :created OR (created = :created AND id < :id) ORDER BY created DESC, id DESC LIMIT :size
+With an index on the ordering fields every page costs the same as the first page.
+
+** 'ordering' must end with a unique field (usually 'id') so rows with the same values are never skipped. Cursors are
+opaque (base64 of the json of the values) and the page has 'next' link only (like a feed).
+
+** Big pages (more than 'stream_threshold' rows, eg: exports) are streamed ('stream_page'): rows are read from the
+database in chunks and written to the response while they are serialized, so the whole page is never in the memory
+and the first bytes are sent before the last row is read. Exports of all the rows ('stream_export') are read page by
+page with the same keyset filter, so no query holds a cursor open for the whole export.
+https://www.django-rest-framework.org/api-guide/pagination/#custom-pagination-styles
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """'DjangoJSONEncoder' drops microseconds of datetimes but cursors must have exact values"""
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def json_encoder():
+    """Encoder of the streamed responses (the same json as 'JSONRenderer')"""
+    return JSONEncoder(ensure_ascii=not api_settings.UNICODE_JSON, allow_nan=not api_settings.STRICT_JSON,
+                       separators=(',', ':') if api_settings.COMPACT_JSON else (', ', ': '))
+
+
+class KeysetPagination(BasePagination):
+    ordering = ('-created', '-id')
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    # Pages bigger than this are streamed (see 'stream_page')
+    stream_threshold = 500
+    stream_chunk_size = 200
+
+    def get_ordering(self, view):
+        return getattr(view, 'keyset_ordering', self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            page_size = self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        return base64.urlsafe_b64encode(json.dumps(values, cls=CursorEncoder).encode()).decode()
+
+    def decode_cursor(self, cursor, queryset, ordering):
+        """Values of the cursor converted to python values of the ordering fields"""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            fields = [queryset.model._meta.get_field(field.lstrip('-')) for field in ordering]
+            if len(values) != len(fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(fields, values)]
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound('Invalid cursor')
+
+    def after(self, ordering, values):
+        """
+        Filter of the rows after the cursor: '(a > x) or (a = x and b > y) or ...'. 'a >= x' is added too, so the
+        database can seek to the cursor on the index instead of scanning from the first row
+        """
+        first = ordering[0]
+        seek = Q(**{f'{first.lstrip("-")}__lte' if first.startswith('-') else f'{first}__gte': values[0]})
+        condition = Q()
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = Q(**{f'{name}__lt' if field.startswith('-') else f'{name}__gt': values[i]})
+            for previous, value in zip(ordering[:i], values):
+                lookup &= Q(**{previous.lstrip('-'): value})
+            condition |= lookup
+        return seek & condition
+
+    def page_queryset(self, queryset, request, view=None):
+        """Rows of the page and one more row (to know if there is a next page)"""
+        self.ordering = self.get_ordering(view)
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self.after(self.ordering, self.decode_cursor(cursor, queryset, self.ordering)))
+        return queryset[:self.page_size + 1]
+
+    def set_next(self, last, has_next):
+        self.has_next = has_next
+        self.next_cursor = None
+        if has_next:
+            self.next_cursor = self.encode_cursor([getattr(last, field.lstrip('-')) for field in self.ordering])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        rows = list(self.page_queryset(queryset, request, view))
+        page = rows[:self.page_size]
+        self.set_next(page[-1] if page else None, len(rows) > self.page_size)
+        return page
+
+    def should_stream(self, request):
+        return self.get_page_size(request) > self.stream_threshold
+
+    def stream_page(self, queryset, request, serialize, view=None):
+        """
+        Response of the page that is written while it's read: '{"results": [...], "next": ...}'. 'serialize' makes
+        the data of one row. 'next' is written after the rows because it's known after the last row is read
+        """
+        rows = self.page_queryset(queryset, request, view).iterator(chunk_size=self.stream_chunk_size)
+        encoder = json_encoder()
+
+        def content():
+            yield '{"results":['
+            chunk, count, last = [], 0, None
+            for row in rows:
+                if count == self.page_size:
+                    self.set_next(last, True)
+                    break
+                chunk.append(encoder.encode(serialize(row)))
+                count, last = count + 1, row
+                if len(chunk) == self.stream_chunk_size:
+                    yield (',' if count > len(chunk) else '') + ','.join(chunk)
+                    chunk = []
+            else:
+                self.set_next(last, False)
+            if chunk:
+                yield (',' if count > len(chunk) else '') + ','.join(chunk)
+            yield f'],"next":{encoder.encode(self.get_next_link())}}}'
+
+        return StreamingHttpResponse(content(), content_type='application/json')
+
+    def stream_export(self, queryset, serialize, view=None):
+        """All the rows of the queryset as json lines (one object in a line), read 'stream_chunk_size' rows at once"""
+        ordering = self.get_ordering(view)
+        queryset = queryset.order_by(*ordering)
+        encoder = json_encoder()
+
+        def content():
+            rows = list(queryset[:self.stream_chunk_size])
+            while rows:
+                yield ''.join(encoder.encode(serialize(row)) + '\n' for row in rows)
+                if len(rows) < self.stream_chunk_size:
+                    break
+                values = [getattr(rows[-1], field.lstrip('-')) for field in ordering]
+                rows = list(queryset.filter(self.after(ordering, values))[:self.stream_chunk_size])
+
+        return StreamingHttpResponse(content(), content_type='application/x-ndjson')
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
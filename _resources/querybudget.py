@@ -0,0 +1,88 @@
+"""
+Query budgets: number of the queries (and the time) that a block of code or a view may use.
+
+** 'QueryBudget' counts the queries of every database connection with 'connection.execute_wrapper', so it works
+without 'DEBUG' and the query log (which keeps only the last 9000 queries). It's a context manager and a decorator:
+    with QueryBudget(3):
+        client.get('/product/catalog/')
+
+    @QueryBudget(queries=2, milliseconds=50)
+    def test_cart(self): ...
+'AssertionError' ('QueryBudgetExceeded') is raised when the block uses more queries or time, so it fails the tests.
+
+** django-silk saves every request and its queries (and explains them) with the same connection. Its queries are
+not counted: they are not made by the code and they grow with the queries of the code. Savepoints are not counted
+either (silk saves in atomic blocks), they don't read or write rows.
+
+** 'check_scaling' runs the same request against seeded data of diffrent sizes. Queries of a page must not grow
+with the rows of the tables (N+1 queries), see 'manage.py check_query_budget'.
+"""
+import re
+import time
+from contextlib import ContextDecorator, ExitStack
+
+from django.db import connections
+
+
+# Queries of django-silk (saving the request and its queries and explaining them) and savepoints
+IGNORED_QUERY = re.compile(r'^\s*(EXPLAIN|SAVEPOINT|RELEASE|ROLLBACK TO)\b|"silk_', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget(ContextDecorator):
+    """Count the queries of the block and fail if they are more than 'queries' or take more than 'milliseconds'"""
+    def __init__(self, queries=None, milliseconds=None, using=None):
+        self.max_queries = queries
+        self.max_milliseconds = milliseconds
+        self.using = using
+        self.queries = []
+        self.milliseconds = 0
+
+    def _recreate_cm(self):
+        # Every call of the decorated function is counted with a new budget (so calls in threads are not mixed)
+        return type(self)(self.max_queries, self.max_milliseconds, self.using)
+
+    def record(self, execute, sql, params, many, context):
+        if not IGNORED_QUERY.search(sql):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def __enter__(self):
+        self.queries = []
+        self.stack = ExitStack()
+        for alias in [self.using] if self.using else connections:
+            self.stack.enter_context(connections[alias].execute_wrapper(self.record))
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.milliseconds = (time.perf_counter() - self.started) * 1000
+        self.stack.close()
+        if exc_type is not None:
+            return False
+        if self.max_queries is not None and self.count > self.max_queries:
+            raise QueryBudgetExceeded(f'{self.count} queries (budget is {self.max_queries}):\n' +
+                                      '\n'.join(f'{i}. {sql}' for i, sql in enumerate(self.queries, start=1)))
+        if self.max_milliseconds is not None and self.milliseconds > self.max_milliseconds:
+            raise QueryBudgetExceeded(f'{self.milliseconds:.1f}ms (budget is {self.max_milliseconds}ms)')
+        return False
+
+
+def check_scaling(measure, sizes):
+    """
+    Queries of 'measure(size)' (a 'QueryBudget' of the block that reads data of that size) for every size. Raise
+    'QueryBudgetExceeded' if queries of a bigger size are more than queries of the smallest one
+    """
+    budgets = {size: measure(size) for size in sorted(sizes)}
+    counts = {size: budget.count for size, budget in budgets.items()}
+    if max(counts.values()) > counts[min(counts)]:
+        raise QueryBudgetExceeded('queries grow with the rows: ' +
+                                  ', '.join(f'{size} rows: {count} queries' for size, count in counts.items()))
+    return budgets
@@ -0,0 +1,41 @@
+"""
+Sparse fieldsets for rest-framework serializers.
+
+** Clients choose the fields of the response with '?fields=id,name,price' (eg: listing cards don't need the long
+'description'). Serializers with 'SparseFieldsMixin' only build the requested fields, and 'only_fields' gives the
+model fields they read, so the view can defer the other columns ('QuerySet.only') and join only the needed relations.
+https://www.django-rest-framework.org/api-guide/serializers/#dynamically-modifying-fields
+"""
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsMixin:
+    fields_query_param = 'fields'
+
+    @classmethod
+    def requested_fields(cls, request):
+        """Names of the fields of '?fields=' (None if all the fields are needed). Unknown names are a 400 error"""
+        value = request.query_params.get(cls.fields_query_param) if request is not None else None
+        if not value:
+            return None
+        names = [name for name in dict.fromkeys(name.strip() for name in value.split(',')) if name]
+        unknown = [name for name in names if name not in cls.Meta.fields]
+        if unknown or not names:
+            raise ValidationError({cls.fields_query_param: f'Unknown fields: {", ".join(unknown)}'})
+        return names
+
+    @classmethod
+    def only_fields(cls, names):
+        """
+        Model fields of the serializer fields ('Meta.only_fields' maps a serializer field to its model fields, other
+        fields are model fields themselves)
+        """
+        only = getattr(cls.Meta, 'only_fields', dict())
+        return [field for name in names or cls.Meta.fields for field in only.get(name, [name])]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        names = self.context.get('fields')
+        if names is not None:
+            fields = {name: field for name, field in fields.items() if name in names}
+        return fields
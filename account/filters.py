@@ -12,13 +12,15 @@ class UserFilterSet(filters.FilterSet):
 
     class Meta:
         model = get_user_model()
-        fields = ['username', 'email', 'name', 'is_active',
-                  'is_staff', 'is_admin', 'is_superuser',
-                  'password']
+        fields = ['username', 'email', 'first_name', 'last_name', 'is_active',
+                  'is_staff', 'is_admin', 'is_superuser']
 
 
 class AddressFilterSet(filters.FilterSet):
     """Filterset for Address Model"""
+    # Filters of the user by id and username. A model choice filter would load all the users for its form
+    user = filters.NumberFilter(field_name='user')
+    username = filters.CharFilter(field_name='user__username')
 
     class Meta:
         model = Address
@@ -0,0 +1,91 @@
+"""
+Benchmark the user and address api (see 'account.views') over synthetic users:
+    python manage.py bench_accounts_api --users 100000
+Users and their addresses are created in a transaction that is rolled back at the end, so the configured database is
+not changed. Time, queries and peak memory (of python objects, with 'tracemalloc') are reported for pages, filtered
+pages, streamed exports and the old list (the whole table serialized in one response).
+"""
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from _resources.querybudget import QueryBudget
+from account.models import Address
+from account.serializers import AddressSerializer
+from account.views import UserViewSet, AddressViewSet
+
+
+class Command(BaseCommand):
+    help = 'Benchmark pages and exports of the user and address api'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--skip-old', action='store_true', help='Do not serialize the whole table')
+
+    def create_users(self, count, batch_size):
+        User = get_user_model()
+        for start in range(0, count, batch_size):
+            users = User.objects.bulk_create([User(username=f'bench-{i}', slug=f'bench-{i}',
+                                                   email=f'bench-{i}@mail.com', password='!')
+                                              for i in range(start, min(count, start + batch_size))])
+            Address.objects.bulk_create([Address(user=user, city=f'City {user.pk % 100}', line='Street 1')
+                                         for user in users])
+
+    def measure(self, name, request, rows):
+        tracemalloc.start()
+        with QueryBudget() as budget:
+            started = time.perf_counter()
+            size = request()
+            elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(f'{name:32} {elapsed * 1000:10.1f}ms {rows / elapsed:9.0f} rows/s {budget.count:7} queries '
+                          f'{peak / 2 ** 20:8.1f}MB peak {size / 2 ** 20:7.1f}MB')
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        users = UserViewSet.as_view({'get': 'list'})
+        user_export = UserViewSet.as_view({'get': 'export'})
+        addresses = AddressViewSet.as_view({'get': 'list'})
+        address_export = AddressViewSet.as_view({'get': 'export'})
+        with transaction.atomic():
+            started = time.perf_counter()
+            admin = get_user_model().objects.create_superuser('bench-admin')
+            self.create_users(options['users'], options['batch_size'])
+            self.stdout.write(f'{options["users"]} users created in {time.perf_counter() - started:.1f}s')
+
+            def get(view, data=None):
+                request = factory.get('/accounts/', data)
+                force_authenticate(request, user=admin)
+                response = view(request)
+                # Size of the response. Streamed responses are read like a client, chunk by chunk
+                if response.streaming:
+                    return sum(len(chunk) for chunk in response.streaming_content)
+                return len(response.render().content)
+
+            def deep_page(view):
+                first = get(view, {'page_size': 50})
+                # Cursor of a page in the middle of the table
+                cursor = UserViewSet.pagination_class().encode_cursor([admin.pk + options['users'] // 2])
+                return first + get(view, {'page_size': 50, 'cursor': cursor})
+
+            self.measure('users: first page', lambda: get(users), 50)
+            self.measure('users: two pages (middle)', lambda: deep_page(users), 100)
+            self.measure('users: filtered page', lambda: get(users, {'email': 'bench-77@mail.com'}), 1)
+            self.measure('addresses: first page', lambda: get(addresses), 50)
+            self.measure('addresses: filtered page', lambda: get(addresses, {'city': 'City 7'}), 50)
+            self.measure('users: export', lambda: get(user_export), options['users'] + 1)
+            self.measure('addresses: export', lambda: get(address_export), options['users'])
+            if not options['skip_old']:
+                def old_list():
+                    request = factory.get('/accounts/address/')
+                    data = AddressSerializer(Address.objects.all(), many=True, context={'request': request}).data
+                    return len(JSONRenderer().render(data))
+                self.measure('addresses: old list (all rows)', old_list, options['users'])
+            transaction.set_rollback(True)
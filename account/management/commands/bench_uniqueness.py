@@ -0,0 +1,78 @@
+"""
+Benchmark the uniqueness check of the profile changes (see 'account.uniqueness') as the users grow:
+    python manage.py bench_uniqueness --sizes 10000 100000 1000000
+Users are created in a transaction that is rolled back at the end, so the configured database is not changed. For
+every size the check of the changed email and phone is measured with the indexed query and with the old full scan
+(every other user read with '.values()' and compared in python).
+"""
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from _resources.querybudget import QueryBudget
+from account.uniqueness import set_lookup_fields, taken_fields
+
+
+def full_scan(values, exclude):
+    """The old check of 'login.login.user_change_validation_check_cleaner'"""
+    users = get_user_model().objects.exclude(id=exclude).values('username', 'email', 'phone')
+    return {field for field, value in values.items() for user in users if value in user.values()}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the indexed uniqueness check against the full scan of the users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--scan-limit', type=int, default=1000000, help='Biggest size that is fully scanned')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def create_users(self, start, stop, batch_size):
+        User = get_user_model()
+        for first in range(start, stop, batch_size):
+            User.objects.bulk_create([set_lookup_fields(User(username=f'bench-{i}', slug=f'bench-{i}', password='!',
+                                                             email=f'Bench-{i}@Mail.com', phone=f'0912{i:07}'))
+                                      for i in range(first, min(stop, first + batch_size))])
+
+    def measure(self, check, repeat):
+        timings = []
+        for i in range(repeat):
+            with QueryBudget() as budget:
+                started = time.perf_counter()
+                taken = check()
+                timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000, budget.count, taken
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        with transaction.atomic():
+            user = get_user_model().objects.create_user('bench-uniqueness')
+            # Email of a user in the middle of the first size and a free phone
+            values = {'email': f'bench-{sizes[0] // 2}@mail.com', 'phone': '+98 999 000 0000'}
+            self.create_users(0, sizes[0], options['batch_size'])
+            # Plan of the indexed query: a search of the indexes for every value, not a scan of the table
+            with CaptureQueriesContext(connection) as captured:
+                taken_fields(values, exclude=user.pk)
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {captured.captured_queries[-1]["sql"]}')
+                self.stdout.write('plan: ' + '; '.join(row[-1] for row in cursor.fetchall()))
+            self.stdout.write(f'{"users":>10} {"indexed":>12} {"queries":>8} {"taken":>12} {"full scan":>12} '
+                              f'{"queries":>8} {"taken":>12}')
+            created = sizes[0]
+            for size in sizes:
+                self.create_users(created, size, options['batch_size'])
+                created = size
+                indexed, queries, taken = self.measure(lambda: taken_fields(values, exclude=user.pk),
+                                                       options['repeat'])
+                line = f'{size:10} {indexed:10.3f}ms {queries:8} {",".join(sorted(taken)) or "-":>12}'
+                # The old check compares the values as they are typed ('bench-5@mail.com' is not 'Bench-5@Mail.com')
+                if size <= options['scan_limit']:
+                    scanned, queries, taken = self.measure(lambda: full_scan(values, user.pk), 1)
+                    line += f' {scanned:10.1f}ms {queries:8} {",".join(sorted(taken)) or "-":>12}'
+                self.stdout.write(line)
+            transaction.set_rollback(True)
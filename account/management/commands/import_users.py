@@ -0,0 +1,100 @@
+"""
+Import the users of the old site from a csv file:
+    python manage.py import_users users.csv --batch-size 5000
+Columns are 'username' (required), 'password', 'email', 'phone', 'first_name', 'last_name' and the columns of the
+address: 'state', 'city', 'line', 'code', 'address_phone' and 'postal'.
+
+** Users of a batch are inserted with one 'bulk_create' and their addresses with another one, in a transaction. The
+signals of the user are not sent, so what they do for a new user is done here: slug, email or phone of the username
+and the lookup columns (see 'account.uniqueness'). Users whose username exists are skipped, so an interrupted import
+can be run again.
+
+** Passwords are kept if they are hashes of a hasher of the site ('PASSWORD_HASHERS'), otherwise the user gets an
+unusable password (and must reset it). Hashing plain passwords is too slow for an import of this size.
+"""
+import csv
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+
+from account.models import Address
+from account.uniqueness import fill_contact_fields, set_lookup_fields
+
+
+USER_FIELDS = ('email', 'phone', 'first_name', 'last_name')
+ADDRESS_FIELDS = {'state': 'state', 'city': 'city', 'line': 'line', 'code': 'code', 'address_phone': 'phone',
+                  'postal': 'postal'}
+
+
+def hashed_password(password):
+    """The password if it's a hash of a hasher of the site, otherwise an unusable password"""
+    try:
+        identify_hasher(password)
+        return password
+    except ValueError:
+        return make_password(None)
+
+
+class Command(BaseCommand):
+    help = 'Import users and their addresses from a csv file with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def new_user(self, row):
+        User = get_user_model()
+        user = User(username=row['username'], password=hashed_password(row.get('password') or ''),
+                    slug=slugify(row['username']), user_db_backend='regular',
+                    **{field: (row.get(field) or '').strip() for field in USER_FIELDS})
+        # Email and phone of the old site are kept, the username fills them only if both are empty
+        if not user.email and not user.phone:
+            fill_contact_fields(user)
+        return set_lookup_fields(user)
+
+    def import_batch(self, rows):
+        """Insert the new users of the rows and their addresses. Return the number of the inserted users"""
+        User = get_user_model()
+        rows = {row['username']: row for row in rows}
+        existing = set(User.objects.filter(username__in=rows).values_list('username', flat=True))
+        rows = [row for username, row in rows.items() if username not in existing]
+        with transaction.atomic():
+            users = User.objects.bulk_create([self.new_user(row) for row in rows])
+            Address.objects.bulk_create([Address(user=user, **{field: row.get(column) or ''
+                                                               for column, field in ADDRESS_FIELDS.items()})
+                                         for user, row in zip(users, rows)])
+        return len(users)
+
+    def handle(self, *args, **options):
+        imported = skipped = invalid = 0
+        started = time.perf_counter()
+        try:
+            file = open(options['file'], newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        with file:
+            reader = csv.DictReader(file)
+            if 'username' not in (reader.fieldnames or ()):
+                raise CommandError("'username' column is required")
+            batch = []
+            for row in reader:
+                row['username'] = (row['username'] or '').strip()
+                # Validators of the username field
+                if not 3 <= len(row['username']) <= 33:
+                    invalid += 1
+                    continue
+                batch.append(row)
+                if len(batch) == options['batch_size']:
+                    count = self.import_batch(batch)
+                    imported, skipped = imported + count, skipped + len(batch) - count
+                    batch = []
+            if batch:
+                count = self.import_batch(batch)
+                imported, skipped = imported + count, skipped + len(batch) - count
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{imported} users imported in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} users/s), '
+                          f'{skipped} existing (or repeated) usernames skipped, {invalid} invalid usernames')
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:59
+
+import re
+
+from django.db import migrations, models
+
+
+# A frozen copy of the normalization of 'account.uniqueness' when this migration was written
+NOT_DIGIT = re.compile(r'\D')
+PHONE_PREFIX = re.compile(r'^(?:0098|98)(?=9\d{9}$)')
+BATCH_SIZE = 1000
+
+
+def fill_lookup_fields(apps, schema_editor):
+    """Normalized email and phone of the existing users, in batches of 'BATCH_SIZE' users"""
+    User = apps.get_model('account', 'User')
+    last = None
+    while True:
+        users = User.objects.order_by('pk').only('email', 'phone')
+        users = list((users.filter(pk__gt=last) if last is not None else users)[:BATCH_SIZE])
+        if not users:
+            break
+        for user in users:
+            user.email_lookup = (user.email or '').strip().lower()
+            user.phone_lookup = PHONE_PREFIX.sub('0', NOT_DIGIT.sub('', user.phone or ''))
+        User.objects.bulk_update(users, ['email_lookup', 'phone_lookup'])
+        last = users[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='address',
+            options={'ordering': ('-updated',), 'verbose_name': 'Address', 'verbose_name_plural': 'Address'},
+        ),
+        migrations.AlterModelOptions(
+            name='user',
+            options={'verbose_name': 'User', 'verbose_name_plural': 'User'},
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='email_lookup',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='phone_lookup',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=15),
+        ),
+        migrations.RunPython(fill_lookup_fields, migrations.RunPython.noop),
+    ]
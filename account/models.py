@@ -39,20 +39,17 @@ class MyUserManager(BaseUserManager):
     # def create_superuser(self, username, password=None, name=None, **kwargs):
     def create_superuser(self, username, password=None, first_name='', last_name='', **kwargs):
         """
-        Creates and saves a superuser with the given email and password.
+        Creates and saves a superuser with the given email and password (with one insert).
         """
-        user = self.create_user(
+        return self.create_user(
             username,
             password=password,
             first_name=first_name,
             last_name=last_name,
+            is_staff=True,
+            is_admin=True,
+            is_superuser=True,
         )
-        user.is_staff = True
-        user.is_admin = True
-        user.is_superuser = True
-        user.user_db_backend = 'regular'
-        user.save(using=self._db)
-        return user
 
 
 class User(AbstractBaseUser, PermissionsMixin):
@@ -74,6 +71,9 @@ class User(AbstractBaseUser, PermissionsMixin):
                              blank=True,
                              validators=[MaxLengthValidator(13, _('phone cannot be longer than 13 chars')),
                                          MinLengthValidator(11, _('phone cannot be shorter than 11 chars'))])
+    # Normalized email and phone (see 'account.uniqueness') to check uniqueness with an index
+    email_lookup = models.CharField(max_length=254, blank=True, editable=False, db_index=True)
+    phone_lookup = models.CharField(max_length=15, blank=True, editable=False, db_index=True)
     first_name = models.CharField(verbose_name=_('first name'),
                                   max_length=50,
                                   blank=True,
@@ -119,12 +119,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     
     @property
     def orders(self):
-        """Get all current user orders"""
-        # print(self.cart_user.first().order_cart.all())
-        order_qs = Order.objects.none()
-        for cart in self.cart_user.all():
-            order_qs = (order_qs | cart.order_cart.all()).distinct()
-        return order_qs
+        """Get all current user orders (newest first) with one query on '(user, created, id)' index"""
+        return Order.objects.filter(user=self).order_by('-created', '-id')
 
 
 class Address(models.Model):
@@ -55,7 +55,7 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
         model = get_user_model()
         fields = [
                   'url',
-                  'username', 'password', 'email', 'name', 'is_active',
+                  'username', 'password', 'email', 'first_name', 'last_name', 'is_active',
                   'is_staff', 'is_admin', 'is_superuser',]
         extra_kwargs = {
             'password': {'write_only': True,
@@ -160,8 +160,9 @@ class UserNewSerializer(UserSerializer):
     This serializer inherited from UserSerializer and takes all the fields and methods of the parent
     Serializer.
     """
-    # This field name must be the same as 'related_name' arguement in 'user' field in 'Address' Model:
-    user_address = AddressSerializer(many=True, read_only=True)
+    # 'source' must be the 'related_name' arguement of 'user' field in 'Address' Model. It's a one to one relation, so
+    # it's not 'many' and it's read with 'select_related' in the same query of the users:
+    user_address = AddressSerializer(source='address_user', read_only=True)
     # Below field used for test purpose! But be aware if we use default 'create' and 'update' methods,
     # This field cause 'TypeError' as it's a unexpected keyword argument.
     # some_field = serializers.CharField(default='Test field')
@@ -172,7 +173,7 @@ class UserNewSerializer(UserSerializer):
     class Meta(UserSerializer.Meta):
         fields = [
                   'url',
-                  'username', 'password', 'email', 'name', 'is_active',
+                  'username', 'password', 'email', 'first_name', 'last_name', 'is_active',
                   'is_staff', 'is_admin', 'is_superuser', 'user_address',
                   # 'some_field',
                   ]
@@ -8,9 +8,9 @@ from django.utils.text import slugify
 from django.db import IntegrityError
 # from rest_framework.authtoken.models import Token
 from .models import Address
+from .uniqueness import fill_contact_fields, set_lookup_fields
 
 import decimal
-import re
 
 
 @receiver(pre_save, sender=settings.AUTH_USER_MODEL)
@@ -40,6 +40,22 @@ def fill_slug_field(sender, instance, **kwargs):
         instance.slug = slugify(instance.username)
 
 
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def fill_phone_email_on_username(sender, instance, **kwargs):
+    """
+    If username is based on phone or email, fill another field accordingly. It's filled before the insert of the new
+    user, so the user is not saved again (and all the signals run again) after it's created
+    """
+    if instance._state.adding:
+        fill_contact_fields(instance)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def fill_lookup_fields(sender, instance, **kwargs):
+    """Fill normalized email and phone of the user (used to check uniqueness)"""
+    set_lookup_fields(instance)
+
+
 # This signal will used for 'DRF based authentication':
 # @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 # def create_auth_token(sender, instance=None, created=False, **kwargs):
@@ -48,20 +64,6 @@ def fill_slug_field(sender, instance, **kwargs):
 #         Token.objects.create(user=instance)
 
 
-@receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def fill_phone_email_on_username(sender, instance=None, created=False, **kwargs):
-    """If username is based on phone or email, fill another field accordingly"""
-    if created:
-        regex_email = re.compile(r'([A-Za-z0-9]+[.-_])*[A-Za-z0-9]+@[A-Za-z0-9-]+(\.[A-Z|a-z]{2,})+')
-        regex_phone =  re.compile(r'09[0-3][0-9]-?[0-9]{3}-?[0-9]{4}')
-        if re.fullmatch(regex_email, instance.username):
-            instance.email = instance.username
-            instance.save()
-        elif re.fullmatch(regex_phone, instance.username):
-            instance.phone = instance.username
-            instance.save()
-
-
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def set_if_social_login_field(sender, instance=None, created=False, **kwargs):
     """To set if a user login with social_login, check if the user 'password' is empty"""
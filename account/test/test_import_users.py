@@ -0,0 +1,50 @@
+import csv
+import os
+import tempfile
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+
+from _resources.querybudget import QueryBudget
+
+
+User = get_user_model()
+
+
+class TestImportUsers(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='ali@mail.com', password='123456')
+        file, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, ['username', 'password', 'email', 'phone', 'city', 'address_phone'])
+            writer.writeheader()
+            writer.writerow({'username': 'reza@mail.com', 'password': make_password('123456'), 'city': 'Tehran'})
+            writer.writerow({'username': '09121112233', 'password': 'plain', 'email': 'Old@Mail.com'})
+            writer.writerow({'username': 'ali@mail.com', 'password': 'plain'})
+            writer.writerow({'username': 'ab'})
+            for i in range(10):
+                writer.writerow({'username': f'user-{i}', 'address_phone': '1234567'})
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_import(self):
+        """Users and addresses of a batch are inserted with two queries"""
+        # Query of the existing usernames, savepoint, users and addresses of both batches
+        with QueryBudget(8):
+            call_command('import_users', self.path, batch_size=7, stdout=open(os.devnull, 'w'))
+        self.assertEqual(User.objects.count(), 13)
+        reza = User.objects.select_related('address_user').get(username='reza@mail.com')
+        self.assertTrue(reza.check_password('123456'))
+        self.assertEqual((reza.email, reza.email_lookup, reza.slug, reza.address_user.city),
+                         ('reza@mail.com', 'reza@mail.com', 'rezamailcom', 'Tehran'))
+        # Email of the old site is kept and the plain password is not
+        phone = User.objects.get(username='09121112233')
+        self.assertEqual((phone.email, phone.email_lookup, phone.phone), ('Old@Mail.com', 'old@mail.com', ''))
+        self.assertFalse(phone.has_usable_password())
+        self.assertEqual(User.objects.get(username='user-3').address_user.phone, '1234567')
+        # Existing users are skipped
+        call_command('import_users', self.path, stdout=open(os.devnull, 'w'))
+        self.assertEqual(User.objects.count(), 13)
@@ -0,0 +1,34 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from _resources.querybudget import QueryBudget
+from account.uniqueness import normalize_email, normalize_phone, taken_fields
+
+
+User = get_user_model()
+
+
+class TestUniqueness(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ali', password='123456', email='Ali@Mail.com',
+                                             phone='0912 111 2233')
+        self.other = User.objects.create_user(username='09351112233', password='123456')
+
+    def test_normalize(self):
+        """Emails are lowercase and phones are digits with the local prefix"""
+        self.assertEqual(normalize_email(' Ali@Mail.COM '), 'ali@mail.com')
+        self.assertEqual(normalize_phone('+98 912-111-2233'), '09121112233')
+        self.assertEqual(normalize_phone('00989121112233'), '09121112233')
+        self.assertEqual((self.user.email_lookup, self.user.phone_lookup), ('ali@mail.com', '09121112233'))
+
+    def test_taken_fields(self):
+        """All the fields are checked in one query, against every field of the other users"""
+        with QueryBudget(1):
+            taken = taken_fields({'username': 'ALI@mail.com', 'email': 'ali@mail.com ', 'phone': '+989121112233'},
+                                 exclude=self.other.pk)
+        self.assertEqual(taken, {'username', 'email', 'phone'})
+        # A phone that is the username of another user
+        self.assertEqual(taken_fields({'phone': '0935-111-2233'}, exclude=self.user.pk), {'phone'})
+        # Values of the same user and empty values are not taken
+        self.assertEqual(taken_fields({'email': 'ali@mail.com', 'phone': '09121112233'}, exclude=self.user.pk), set())
+        self.assertEqual(taken_fields({'username': 'reza', 'email': '', 'phone': ''}), set())
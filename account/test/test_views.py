@@ -0,0 +1,83 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from _resources.querybudget import QueryBudget, check_scaling
+from account.models import Address
+from account.views import AccountPagination
+
+
+User = get_user_model()
+
+
+class TestAccountApi(TestCase):
+
+    def setUp(self) -> None:
+        self.admin = User.objects.create_superuser('admin')
+        self.client.force_login(self.admin)
+
+    def create_users(self, count):
+        users = User.objects.bulk_create([User(username=f'user-{i}', slug=f'user-{i}') for i in range(count)])
+        Address.objects.bulk_create([Address(user=user, city='Tehran' if i % 2 else 'Shiraz')
+                                     for i, user in enumerate(users)])
+        return users
+
+    def get_json(self, url, data=None):
+        return self.client.get(url, data).json()
+
+    def test_pages(self):
+        """Test if users and addresses are read by cursor pages and filtered"""
+        users = self.create_users(5)
+        response = self.get_json(reverse('accounts:user-list'), {'page_size': 2})
+        usernames = [row['username'] for row in response['results']]
+        self.assertEqual(response['results'][0]['user_address']['city'], 'Shiraz')
+        while response['next']:
+            response = self.get_json(response['next'])
+            usernames += [row['username'] for row in response['results']]
+        self.assertEqual(usernames, [user.username for user in reversed(users)] + ['admin'])
+        response = self.get_json(reverse('accounts:address-list'), {'city': 'Shiraz'})
+        self.assertEqual([row['user']['username'] for row in response['results']], ['user-4', 'user-2', 'user-0'])
+        response = self.get_json(reverse('accounts:address-list'), {'username': 'user-3'})
+        self.assertEqual([row['user']['username'] for row in response['results']], ['user-3'])
+
+    def test_staff_only(self):
+        """Test if only the staff read and change the users and users are not filtered by their password hash"""
+        user = self.create_users(1)[0]
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('accounts:user-list')).status_code, 403)
+        self.client.logout()
+        response = self.client.post(reverse('accounts:user-list'), {'username': 'intruder', 'password': '123456'})
+        self.assertIn(response.status_code, (401, 403))
+        self.assertFalse(User.objects.filter(username='intruder').exists())
+        self.client.force_login(self.admin)
+        response = self.get_json(reverse('accounts:user-list'), {'password': 'x'})
+        self.assertEqual(len(response['results']), 2)
+
+    def test_queries(self):
+        """Test if queries of the pages don't grow with the users"""
+        def measure(url):
+            def run(size):
+                User.objects.exclude(pk=self.admin.pk).delete()
+                self.create_users(size)
+                with QueryBudget(5) as budget:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                return budget
+            return run
+
+        check_scaling(measure(reverse('accounts:user-list')), [2, 20])
+        check_scaling(measure(reverse('accounts:address-list')), [2, 20])
+
+    def test_export(self):
+        """Test if all the filtered rows are streamed as json lines"""
+        self.create_users(7)
+        with mock.patch.object(AccountPagination, 'stream_chunk_size', 3):
+            response = self.client.get(reverse('accounts:address-export'), {'city': 'Tehran'})
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([row['user']['username'] for row in rows], ['user-5', 'user-3', 'user-1'])
+        with mock.patch.object(AccountPagination, 'stream_chunk_size', 3):
+            response = self.client.get(reverse('accounts:user-export'))
+            self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 8)
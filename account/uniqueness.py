@@ -0,0 +1,86 @@
+"""
+Uniqueness of the usernames, emails and phones of the users.
+
+** Emails and phones are kept normalized in indexed lookup columns of the user ('email_lookup', 'phone_lookup'), so
+'Ali@Mail.com ' and 'ali@mail.com' or '+98 912 111 2233' and '09121112233' are the same value. They are filled by
+the 'pre_save' signal of the user ('set_lookup_fields' must be called for the users of 'bulk_create').
+
+** 'taken_fields' checks all the changed fields in one query. Every value is searched in the indexed columns
+(username is unique and indexed) of the other users, so the check does not grow with the users:
+    taken_fields({'email': 'a@b.com', 'phone': '0912 111 2233'}, exclude=request.user.pk)  ->  {'phone'}
+A value is taken if any user has it as another field too (eg: an email that is the username of another user).
+
+** Usernames of the signup are emails or phones. 'fill_contact_fields' copies the username to the email or phone
+field of a new user before it's inserted, so a signup is one insert of the user (see 'account.signals').
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.db.models import Q, Count
+
+
+NOT_DIGIT = re.compile(r'\D')
+PHONE = re.compile(r'[\d\s()+-]+')
+# Usernames that are emails or phones (compiled once, they are matched on every signup and import)
+USERNAME_EMAIL = re.compile(r'([A-Za-z0-9]+[.-_])*[A-Za-z0-9]+@[A-Za-z0-9-]+(\.[A-Z|a-z]{2,})+')
+USERNAME_PHONE = re.compile(r'09[0-3][0-9]-?[0-9]{3}-?[0-9]{4}')
+# International prefix of the phones of Iran: '+98 912...' and '0098912...' are '0912...'
+PHONE_PREFIX = re.compile(r'^(?:0098|98)(?=9\d{9}$)')
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def normalize_phone(phone):
+    digits = NOT_DIGIT.sub('', phone or '')
+    return PHONE_PREFIX.sub('0', digits)
+
+
+def fill_contact_fields(user):
+    """If username of the user is an email or a phone, fill that field with it"""
+    if USERNAME_EMAIL.fullmatch(user.username):
+        user.email = user.username
+    elif USERNAME_PHONE.fullmatch(user.username):
+        user.phone = user.username
+    return user
+
+
+def set_lookup_fields(user):
+    """Fill the lookup columns of the user from its email and phone"""
+    user.email_lookup = normalize_email(user.email)
+    user.phone_lookup = normalize_phone(user.phone)
+    return user
+
+
+def lookups(field, value):
+    """Condition of the users that have the value of the field (in any of the fields), None for an empty value"""
+    email = normalize_email(value) if field in ('username', 'email') else ''
+    # Only the values made of digits and separators are phones ('ali-2' is not the phone '2')
+    phone = normalize_phone(value) if field in ('username', 'phone') and PHONE.fullmatch(value.strip()) else ''
+    condition = Q(username=value.strip()) if field == 'username' else Q()
+    # Empty lookups are not values (users without email or phone)
+    if email:
+        condition |= Q(email_lookup=email) | Q(username=email)
+    if phone:
+        condition |= Q(phone_lookup=phone) | Q(username=phone)
+    return condition or None
+
+
+def taken_fields(values, exclude=None):
+    """Set of the fields of 'values' ('username', 'email' and 'phone') that other users have, in one query"""
+    conditions = {field: lookups(field, value) for field, value in values.items()
+                  if field in ('username', 'email', 'phone') and value}
+    conditions = {field: condition for field, condition in conditions.items() if condition is not None}
+    if not conditions:
+        return set()
+    users = get_user_model().objects.all()
+    if exclude is not None:
+        users = users.exclude(pk=exclude)
+    # Only the few users with one of the values are read (an 'OR' of indexed lookups) and counted for every field
+    condition = Q()
+    for field_condition in conditions.values():
+        condition |= field_condition
+    counts = users.filter(condition).aggregate(**{f'{field}_taken': Count('pk', filter=field_condition)
+                                                  for field, field_condition in conditions.items()})
+    return {field for field in conditions if counts[f'{field}_taken']}
@@ -9,52 +9,56 @@ class.
 IMPORTANT: But beware if change 'lookup_field' attribute, 'tests' must be written generics to support arbitrary 'lookup_field'.
 """
 from django.contrib.auth import get_user_model
+from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
-from rest_framework import status
 from rest_framework import permissions
 from rest_framework import authentication
-from rest_framework.response import Response
 from django_filters import rest_framework as filters
 
+from _resources.pagination import KeysetPagination
+
 from .models import Address
 from .serializers import UserSerializer, AddressSerializer, UserNewSerializer
 from .filters import UserFilterSet, AddressFilterSet
 
 
-class UserViewSet(ModelViewSet):
+class AccountPagination(KeysetPagination):
+    """Cursor pagination of the users and addresses on the primary key (newest first)"""
+    ordering = ('-id', )
+    page_size = 50
+    max_page_size = 1000
+
+
+class ExportMixin:
+    """'export' action: all the filtered rows as json lines (streamed, see 'KeysetPagination.stream_export')"""
+    @action(detail=False, methods=['get'])
+    def export(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        return self.paginator.stream_export(self.filter_queryset(self.get_queryset()), serializer.to_representation,
+                                            view=self)
+
+
+class UserViewSet(ExportMixin, ModelViewSet):
     """This ViewSet used for list, retreive, post and update User model"""
     queryset = get_user_model().objects.all()
     serializer_class = UserNewSerializer
-    # In production we rather use 'permissions.IsAdminUser' but for dev we use 'AllowAny'
-    # permission_classes = [permissions.IsAdminUser, ]
-    permission_classes = [permissions.AllowAny, ]
+    permission_classes = [permissions.IsAdminUser, ]
     authentication_classes = [authentication.TokenAuthentication, authentication.SessionAuthentication, ]
     filter_backends = (filters.DjangoFilterBackend, )
     filterset_class = UserFilterSet
+    pagination_class = AccountPagination
     lookup_field = get_user_model().USERNAME_FIELD
 
     def get_queryset(self):
-        """Override this method. Remember it's so much faster to use 'get_queryset' method instead of 'queryset' attribute"""
-        if self.request.user.is_authenticated:
-            if self.request.user.is_staff:
-                queryset = get_user_model().objects.all()
-            else:
-                queryset = get_user_model().objects.filter(id=self.request.user.id)
-        else:
-            queryset = get_user_model().objects.none()
-        return queryset
+        """
+        Only the staff use this api (see 'permission_classes'). Users are filtered by 'UserFilterSet' and paginated by
+        cursor, so the staff never read the whole table with one request (see 'export' for all of them)
+        """
+        # Address of every user is read in the same query
+        return get_user_model().objects.select_related('address_user')
 
-    def list(self, request, *args, **kwargs):
-        """Override 'list' method to send 'request' object to serializer - although it's not needed for ModelSerializer"""
-        # queryset = get_user_model().objects.all()
-        queryset = self.get_queryset()
-        if queryset.exists():
-            serializer = UserNewSerializer(instance=queryset, many=True, context={'request': request})
-            return Response(data=serializer.data, status=status.HTTP_200_OK)
-        return Response(data='Error: User is not authenticated!', status=status.HTTP_200_OK)
-    
 
-class AddressViewSet(ModelViewSet):
+class AddressViewSet(ExportMixin, ModelViewSet):
     """This ViewSet used for list, retreive, post and update Address model"""
     queryset = Address.objects.all()
     serializer_class = AddressSerializer
@@ -62,9 +66,8 @@ class AddressViewSet(ModelViewSet):
     authentication_classes = [authentication.TokenAuthentication, authentication.SessionAuthentication, ]
     filter_backends = (filters.DjangoFilterBackend, )
     filterset_class = AddressFilterSet
+    pagination_class = AccountPagination
 
-    def list(self, request, *args, **kwargs):
-        """Override 'list' method to send 'request' object to serializer - although it's not needed for ModelSerializer"""
-        queryset = Address.objects.all()
-        serializer = AddressSerializer(instance=queryset, many=True, context={'request': request})
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
+    def get_queryset(self):
+        # User of every address (nested in the serializer) is read in the same query
+        return Address.objects.select_related('user')
@@ -0,0 +1,155 @@
+"""
+Carts of the guests (anonymous users) and moving them into the database after login or checkout.
+
+** Most of the guest carts are abandoned, so they are not saved in 'Cart' and 'CartItem'. 'GuestCart' keeps the items
+in the cache as 'product id: quantity' and only a random id of the cart is saved in the session. It has the same
+'add_to_cart', 'remove_from_cart' and 'clear_cart' methods of 'Cart', so views work with both of them (use 'get_cart').
+
+** After login 'synch_cart_session_cart_after_authentication' merges the guest cart into the current cart of the user
+with one upsert and removes it from the cache. At checkout of a guest 'GuestCart.persist' is used.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from _resources.func import get_random_string
+from product.models import Product
+from .models import Cart, CartItem
+
+
+# Key of the guest cart id in the session
+GUEST_CART_SESSION_KEY = 'guest_cart'
+
+
+class GuestCart:
+    """Cart of an anonymous user stored in the cache"""
+    def __init__(self, session):
+        self.session = session
+        self.cart_id = session.get(GUEST_CART_SESSION_KEY)
+        data = cache.get(self.cache_key) if self.cart_id else None
+        self.items, self.version = (data['items'], data['version']) if data else (dict(), 0)
+
+    @property
+    def cache_key(self):
+        return f'guest-cart-{self.cart_id}'
+
+    @property
+    def pk(self):
+        return self.cart_id
+
+    def save(self):
+        """Save the items in the cache. The cart id is saved in the session only when the first item is added"""
+        if not self.cart_id:
+            self.cart_id = get_random_string(20)
+            self.session[GUEST_CART_SESSION_KEY] = self.cart_id
+        self.version += 1
+        cache.set(self.cache_key, {'items': self.items, 'version': self.version}, timeout=settings.GUEST_CART_TIMEOUT)
+
+    def add_to_cart(self, product, quantity=1):
+        self.items[product.pk] = self.items.get(product.pk, 0) + quantity
+        self.save()
+
+    def remove_from_cart(self, product):
+        if self.items.pop(product.pk, None) is not None:
+            self.save()
+
+    def clear_cart(self):
+        if self.items:
+            self.items.clear()
+            self.save()
+
+    def update_items(self, additions, quantities):
+        """Apply a batch of changes like 'Cart.update_items'"""
+        for product_id, quantity in quantities.items():
+            if quantity > 0:
+                self.items[product_id] = quantity
+            else:
+                self.items.pop(product_id, None)
+        for product_id, quantity in additions.items():
+            self.items[product_id] = self.items.get(product_id, 0) + quantity
+        self.save()
+
+    def delete(self):
+        """Remove the cart from the cache and the session"""
+        if self.cart_id:
+            cache.delete(self.cache_key)
+            self.session.pop(GUEST_CART_SESSION_KEY, None)
+            self.cart_id, self.items, self.version = None, dict(), 0
+
+    def get_price(self, cached=True):
+        """Price of the cart (guests have no user discount). It's always computed with one query"""
+        from .pricing import price_guest_cart
+        return price_guest_cart(self)
+
+    @property
+    def total_price(self):
+        return self.get_price().total
+
+    def persist(self, user=None):
+        """Save the items in the database (in the current cart of the user if it's given) and delete the guest cart"""
+        cart = get_user_cart(user) if user else Cart.objects.create()
+        merge_items(cart, self.items)
+        self.delete()
+        return cart
+
+    def __len__(self):
+        return len(self.items)
+
+
+def get_user_cart(user):
+    """Current cart of the user (the last cart that is not ordered yet). It's created if the user has no cart"""
+    cart = Cart.objects.filter(user=user, order_cart__isnull=True).order_by('-id').first()
+    return cart or Cart.objects.create(user=user)
+
+
+def get_cart(request):
+    """Cart of the request. Users have 'Cart' and guests have 'GuestCart'"""
+    if request.user.is_authenticated:
+        return get_user_cart(request.user)
+    return GuestCart(request.session)
+
+
+def merge_items(cart, items):
+    """Add quantities of the items ('product id: quantity') to the cart with one upsert"""
+    # Products may be deleted while they were in the guest cart
+    items = {product_id: items[product_id]
+             for product_id in Product.objects.filter(id__in=items).values_list('id', flat=True)}
+    if not items:
+        return
+    with transaction.atomic():
+        CartItem.objects.add_quantities(cart.pk, items)
+        cart.increase_version()
+
+
+def reduce_operations(operations):
+    """
+    Reduce a batch of operations ('{"op": "add" | "update" | "remove", "product": id, "quantity": n}') to the final
+    change of every product. Return '(additions, quantities)': quantities to add and quantities to set (0 removes).
+    Raise 'ValueError' if an operation is not valid.
+    """
+    additions, quantities = dict(), dict()
+    for operation in operations:
+        product_id, op = int(operation['product']), operation.get('op')
+        quantity = int(operation.get('quantity', 1 if op == 'add' else 0))
+        if quantity < 0 or (op == 'add' and quantity == 0):
+            raise ValueError(f'invalid quantity: {quantity}')
+        if op == 'add':
+            if product_id in quantities:
+                quantities[product_id] += quantity
+            else:
+                additions[product_id] = additions.get(product_id, 0) + quantity
+        elif op in ('update', 'remove'):
+            additions.pop(product_id, None)
+            quantities[product_id] = quantity if op == 'update' else 0
+        else:
+            raise ValueError(f'invalid operation: {op}')
+    return additions, quantities
+
+
+def synch_cart_session_cart_after_authentication(Cart, request):
+    """Merge cart of the guest into the cart of the user that just logged in (or signed up)"""
+    guest_cart = GuestCart(request.session)
+    if guest_cart.items:
+        guest_cart.persist(request.user)
+    else:
+        guest_cart.delete()
@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart_functions import get_cart as get_request_cart
+
+
+def get_cart(request):
+    """Cart of the user or the guest for all the templates. It's loaded only if a template uses it"""
+    return {'cart': SimpleLazyObject(lambda: get_request_cart(request))}
@@ -0,0 +1,78 @@
+"""
+Benchmark concurrent changes of one cart (ops/sec) and check that no update is lost:
+    python manage.py bench_cart --threads 16 --ops 200 --products 5
+Every thread adds every product to the same cart 'ops' times. At the end quantity of every product must be
+'threads * ops'. With '--naive' the old 'get_or_create' and 'save' way is measured too (it loses updates).
+Benchmark objects are deleted at the end.
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+
+from cart.models import Cart, CartItem
+from product.models import Category, Product
+
+
+def naive_add_to_cart(cart, product, quantity=1):
+    """'Cart.add_to_cart' before the atomic upserts (read, change and save)"""
+    cart_item, created = cart.cart_item_cart.get_or_create(product=product, defaults={'quantity': quantity})
+    if not created:
+        cart_item.quantity += quantity
+        cart_item.save()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent cart mutations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--ops', type=int, default=200, help='Number of adds of every product in every thread')
+        parser.add_argument('--products', type=int, default=5)
+        parser.add_argument('--naive', action='store_true', help='Measure the read-modify-write way too')
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name='Cart benchmark')
+        products = [Product.objects.create(category=category, name=f'Cart benchmark {i}', price=100, discount=0)
+                    for i in range(options['products'])]
+        try:
+            self.run('atomic upsert', lambda cart, product: cart.add_to_cart(product), products, options)
+            if options['naive']:
+                self.run('get_or_create + save', naive_add_to_cart, products, options)
+        finally:
+            category.delete()
+
+    def run(self, name, add, products, options):
+        cart = Cart.objects.create()
+        barrier = threading.Barrier(options['threads'])
+        errors = []
+
+        def worker():
+            barrier.wait()
+            try:
+                for i in range(options['ops']):
+                    for product in products:
+                        try:
+                            add(cart, product)
+                        except OperationalError as e:    # 'database is locked' of SQLite
+                            errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for i in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        ops = options['threads'] * options['ops'] * len(products)
+        expected = options['threads'] * options['ops']
+        quantities = dict(CartItem.objects.filter(cart=cart).values_list('product', 'quantity'))
+        # Adds that failed with an error are not lost updates
+        lost = sum(expected - quantities.get(product.pk, 0) for product in products) - len(errors)
+        self.stdout.write(f'{name}: {ops} adds from {options["threads"]} threads in {elapsed:.2f}s '
+                          f'({ops / elapsed:.0f} ops/s), {lost} lost updates, {len(errors)} errors')
+        cart.delete()
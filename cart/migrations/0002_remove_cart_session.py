@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='cart',
+            name='session',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_remove_cart_session'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='cart_item_unique_cart_product'),
+        ),
+    ]
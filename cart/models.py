@@ -1,7 +1,6 @@
-from django.db import models
+from django.db import models, connection, transaction
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.contrib.sessions.models import Session
 from django.utils.text import slugify
 from django.urls import reverse
 from django.core.validators import MinValueValidator
@@ -15,48 +14,111 @@ class Cart(models.Model):
                              related_name='cart_user',
                              null=True,
                              blank=True)
-    session = models.ForeignKey(Session,
-                                verbose_name=_('session'),
-                                on_delete=models.CASCADE,
-                                related_name='cart_session',
-                                null=True,
-                                blank=True)
     created = models.DateTimeField(auto_now_add=True)
+    # Increased on every change of the cart items. Prices of the cart are cached by this version (see 'cart.pricing')
+    version = models.PositiveIntegerField(verbose_name=_('version'), default=0, editable=False)
     
     class Meta:
         verbose_name = 'Cart'
         verbose_name_plural = 'Cart'
 
     def __str__(self):
-        return f"Cart - {self.user.username if self.user else self.session.session_key}"
+        # Carts of the guests are saved only at checkout (see 'cart.cart_functions.GuestCart')
+        return f"Cart - {self.user.username if self.user else self.pk}"
+
+    def get_price(self, cached=True):
+        """Price of the cart with all the discounts (see 'cart.pricing.CartPrice')"""
+        from .pricing import price_cart
+        return price_cart(self, cached=cached)
 
     @property
     def total_price(self):
-        total_price = self.cart_items.aggregate(total=models.Sum(models.F('quantity') * models.F('product__price')))['total']
-        return total_price or 0
+        return self.get_price().total
+
+    def increase_version(self):
+        Cart.objects.filter(pk=self.pk).update(version=models.F('version') + 1)
+        self.version += 1
 
+    # Every change of the items is one statement (see 'CartItemManager') and it's committed with the new version
     def add_to_cart(self, product, quantity=1):
-        if self.user:
-            cart_item, created = self.cart_items.get_or_create(product=product)
-            cart_item.quantity += quantity
-            cart_item.save()
-        else:
-            cart_item, created = self.cart_items.get_or_create(product=product, session=self.session)
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
+        """Add the product (or increase its quantity). Return the new quantity of the product in the cart"""
+        with transaction.atomic():
+            quantity = CartItem.objects.add_quantities(self.pk, {product.pk: quantity})[product.pk]
+            self.increase_version()
+        return quantity
 
     def remove_from_cart(self, product):
-        if self.user:
-            self.cart_items.filter(product=product).delete()
-        else:
-            self.cart_items.filter(product=product, session=self.session).delete()
+        """Remove the product from the cart. Return its removed quantity (0 if it was not in the cart)"""
+        with transaction.atomic():
+            removed = CartItem.objects.delete_items(self.pk, [product.pk])
+            if removed:
+                self.increase_version()
+        return removed.get(product.pk, 0)
+
+    def set_quantities(self, quantities):
+        """Set quantity of many products ('product id: quantity'). Products with quantity 0 are removed"""
+        with transaction.atomic():
+            CartItem.objects.set_quantities(self.pk, quantities)
+            self.increase_version()
 
     def clear_cart(self):
-        if self.user:
-            self.cart_items.all().delete()
-        else:
-            self.cart_items.filter(session=self.session).delete()
+        with transaction.atomic():
+            if CartItem.objects.delete_items(self.pk):
+                self.increase_version()
+
+    def update_items(self, additions, quantities):
+        """
+        Apply a batch of changes in one transaction with one new version. 'additions' are added to the current
+        quantities and 'quantities' are set (see 'cart.cart_functions.reduce_operations')
+        """
+        with transaction.atomic():
+            CartItem.objects.set_quantities(self.pk, quantities)
+            CartItem.objects.add_quantities(self.pk, additions)
+            self.increase_version()
+
+
+class CartItemManager(models.Manager):
+    """
+    Atomic changes of the cart items. Every method is only one statement, so concurrent requests (eg: two tabs of the
+    browser) never lose an update. Items are upserted on the unique '(cart, product)' with 'INSERT ... ON CONFLICT'
+    and deleted with 'DELETE ... RETURNING' (both are supported by PostgreSQL and SQLite 3.35+).
+    """
+    def add_quantities(self, cart_id, quantities):
+        """Insert the products or increase their quantity. Return 'product id: new quantity'"""
+        if not quantities:
+            return dict()
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        values = ', '.join(['(%s, %s, %s)'] * len(quantities))
+        params = [value for product_id, quantity in quantities.items() for value in (cart_id, product_id, quantity)]
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {table} (cart_id, product_id, quantity) VALUES {values} '
+                           f'ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {table}.quantity + '
+                           f'excluded.quantity RETURNING product_id, quantity', params)
+            return dict(cursor.fetchall())
+
+    def set_quantities(self, cart_id, quantities):
+        """Set quantity of the products. Products with quantity 0 are deleted"""
+        removed = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        if removed:
+            self.delete_items(cart_id, removed)
+        self.bulk_create([CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                          for product_id, quantity in quantities.items() if quantity > 0],
+                         update_conflicts=True,
+                         unique_fields=['cart', 'product'],
+                         update_fields=['quantity'])
+
+    def delete_items(self, cart_id, product_ids=None):
+        """Delete the products (all of them if 'product_ids' is None). Return 'product id: deleted quantity'"""
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql, params = f'DELETE FROM {table} WHERE cart_id = %s', [cart_id]
+        if product_ids is not None:
+            if not product_ids:
+                return dict()
+            sql += f" AND product_id IN ({', '.join(['%s'] * len(product_ids))})"
+            params += list(product_ids)
+        with connection.cursor() as cursor:
+            cursor.execute(sql + ' RETURNING product_id, quantity', params)
+            return dict(cursor.fetchall())
 
 
 class CartItem(models.Model):
@@ -72,10 +134,14 @@ class CartItem(models.Model):
                                            verbose_name=_('quantity'),
                                            validators=[MinValueValidator(1)])
     # session = models.ForeignKey(Session,on_delete=models.CASCADE, null=True, blank=True)
+    objects = CartItemManager()
 
     class Meta:
         verbose_name = 'CartItem'
         verbose_name_plural = 'CartItem'
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='cart_item_unique_cart_product'),
+        ]
     
     @property
     def price(self):
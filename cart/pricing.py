@@ -0,0 +1,142 @@
+"""
+Price of the carts: line totals, product discounts, user discounts and the grand total.
+
+** All the items of a cart (or a batch of carts) are read with one annotated query. Product price and discount and
+the user discounts are joined in the same query, so nothing is loaded lazily per item.
+
+** Discounts are applied in this order: 'Product.discount' is subtracted from the price of every unit, then
+'User.discount_percent' is applied on the subtotal and at last 'User.discount_value' is subtracted (total is never
+less than 0). Prices have no decimal places so every discount is rounded to an integer.
+
+** Every change of a cart increases 'Cart.version', so prices are cached by cart id and version. Product prices may
+change without changing the cart, so cached prices expire after 'CART_PRICE_TIMEOUT' seconds. Orders must be priced
+with 'cached=False'.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from product.models import Product
+from .models import CartItem
+
+
+class CartLine:
+    """Price of one item of the cart"""
+    __slots__ = ('product_id', 'quantity', 'unit_price', 'unit_discount', 'name')
+
+    def __init__(self, product_id, quantity, unit_price, unit_discount, name=''):
+        self.product_id = product_id
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.unit_discount = unit_discount
+        self.name = name
+
+    @property
+    def discount(self):
+        return self.unit_discount * self.quantity
+
+    @property
+    def total(self):
+        return (self.unit_price - self.unit_discount) * self.quantity
+
+
+class CartPrice:
+    """Price of a cart. 'lines' are 'product id: CartLine'"""
+    def __init__(self, cart_id, version, discount_value=0, discount_percent=0):
+        self.cart_id = cart_id
+        self.version = version
+        self.lines = dict()
+        self.discount_value = Decimal(discount_value)
+        self.discount_percent = Decimal(discount_percent)
+
+    @property
+    def subtotal(self):
+        """Total price of the items after product discounts"""
+        return sum((line.total for line in self.lines.values()), Decimal(0))
+
+    @property
+    def product_discount(self):
+        return sum((line.discount for line in self.lines.values()), Decimal(0))
+
+    @property
+    def user_discount(self):
+        """Discount of the user on the subtotal. It's never more than the subtotal"""
+        subtotal = self.subtotal
+        percent = (subtotal * self.discount_percent / 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        return min(percent + self.discount_value, subtotal)
+
+    @property
+    def total(self):
+        return self.subtotal - self.user_discount
+
+    @property
+    def quantity(self):
+        return sum(line.quantity for line in self.lines.values())
+
+    def __repr__(self):
+        return f'<CartPrice {self.cart_id} (v{self.version}): {self.total}>'
+
+
+def price_key(cart):
+    return f'cart-price-{cart.pk}-{cart.version}'
+
+
+def price_query(cart_ids):
+    """Items of the carts with price and discount of their products and discounts of the cart users"""
+    return CartItem.objects.filter(cart_id__in=cart_ids)\
+        .annotate(name=F('product__name'),
+                  unit_price=F('product__price'),
+                  unit_discount=F('product__discount'),
+                  discount_value=F('cart__user__discount_value'),
+                  discount_percent=F('cart__user__discount_percent'))\
+        .values_list('cart_id', 'product_id', 'quantity', 'name', 'unit_price', 'unit_discount', 'discount_value',
+                     'discount_percent')
+
+
+def compute_prices(carts):
+    """Price the carts with one query. Return 'cart id: CartPrice'"""
+    prices = {cart.pk: CartPrice(cart.pk, cart.version) for cart in carts}
+    if not prices:
+        return prices
+    for cart_id, product_id, quantity, name, unit_price, unit_discount, discount_value, discount_percent \
+            in price_query(list(prices)):
+        price = prices[cart_id]
+        price.discount_value, price.discount_percent = Decimal(discount_value or 0), Decimal(discount_percent or 0)
+        price.lines[product_id] = CartLine(product_id, quantity, unit_price, min(unit_discount, unit_price), name)
+    return prices
+
+
+def price_guest_cart(cart):
+    """Price of a 'GuestCart' (its items are not in the database) with one query"""
+    price = CartPrice(cart.pk, cart.version)
+    for product_id, name, unit_price, unit_discount in Product.objects.filter(id__in=cart.items)\
+            .values_list('id', 'name', 'price', 'discount'):
+        price.lines[product_id] = CartLine(product_id, cart.items[product_id], unit_price,
+                                           min(unit_discount, unit_price), name)
+    return price
+
+
+def price_carts(carts, cached=True):
+    """
+    Price a batch of carts (instances of 'Cart'). Cached prices of the current cart versions are used and all the
+    others are priced with one query. Return 'cart id: CartPrice'
+    """
+    carts = list(carts)
+    if not cached:
+        return compute_prices(carts)
+    keys = {price_key(cart): cart for cart in carts}
+    found = cache.get_many(list(keys))
+    prices = {price.cart_id: price for price in found.values()}
+    computed = compute_prices([cart for key, cart in keys.items() if key not in found])
+    if computed:
+        cache.set_many({key: computed[cart.pk] for key, cart in keys.items() if cart.pk in computed},
+                       timeout=settings.CART_PRICE_TIMEOUT)
+    prices.update(computed)
+    return prices
+
+
+def price_cart(cart, cached=True):
+    """Price of one cart"""
+    return price_carts([cart], cached=cached)[cart.pk]
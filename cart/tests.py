@@ -1,3 +1,230 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from order.checkout import checkout
+from product.models import Category, Product
+from .cart_functions import GuestCart
+from .models import Cart, CartItem
+from .pricing import price_carts
+
+
+User = get_user_model()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestCartPricing(TestCase):
+
+    def setUp(self) -> None:
+        # Ids of the rolled back carts are used again by the next tests
+        cache.clear()
+        category = Category.objects.create(name='Giyim')
+        self.dress = Product.objects.create(category=category, name='Elbise', price=1000, discount=100)
+        self.shirt = Product.objects.create(category=category, name='Gomlek', price=500, discount=0)
+        self.user = User.objects.create_user(username='ehsan', password='123456')
+        self.cart = Cart.objects.create(user=self.user)
+        self.cart.add_to_cart(self.dress, 2)
+        self.cart.add_to_cart(self.shirt)
+
+    def test_product_discount(self):
+        """Test if line totals and the total have product discounts"""
+        price = self.cart.get_price()
+
+        self.assertEqual(price.lines[self.dress.id].total, 1800)
+        self.assertEqual(price.product_discount, 200)
+        self.assertEqual(price.subtotal, 2300)
+        self.assertEqual(self.cart.total_price, 2300)
+
+    def test_user_discount(self):
+        """Test if the percent and then the value discount of the user are applied on the subtotal"""
+        User.objects.filter(pk=self.user.pk).update(discount_percent=Decimal('10.5'), discount_value=100)
+        price = self.cart.get_price(cached=False)
+
+        self.assertEqual(price.user_discount, 242 + 100)
+        self.assertEqual(price.total, 2300 - 342)
+
+        User.objects.filter(pk=self.user.pk).update(discount_value=10000)
+        self.assertEqual(self.cart.get_price(cached=False).total, 0)
+
+    def test_batch_one_query(self):
+        """Test if a batch of carts is priced with one query"""
+        carts = [self.cart] + [Cart.objects.create() for i in range(5)]
+        for cart in carts[1:]:
+            cart.add_to_cart(self.shirt, 3)
+
+        with self.assertNumQueries(1):
+            prices = price_carts(carts)
+        self.assertEqual([prices[cart.pk].total for cart in carts], [2300] + [1500] * 5)
+
+    def test_cached_per_version(self):
+        """Test if price is read from cache until the cart changes"""
+        self.cart.get_price()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cart.get_price().total, 2300)
+
+        self.cart.remove_from_cart(self.shirt)
+        self.assertEqual(self.cart.get_price().total, 1800)
+
+    def test_order_price(self):
+        """Test if order totals are the cart price at checkout"""
+        Product.objects.update(quantity_available=10)
+        order = checkout(self.user, self.cart)
+
+        self.assertEqual(order.get_total_price, 2300)
+        self.assertEqual(order.product_discount, 200)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestGuestCart(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+        category = Category.objects.create(name='Giyim')
+        self.dress = Product.objects.create(category=category, name='Elbise', price=1000, discount=100)
+        self.shirt = Product.objects.create(category=category, name='Gomlek', price=500, discount=0)
+        self.user = User.objects.create_user(username='ehsan', password='123456')
+
+    def guest_cart(self):
+        """Guest cart of the test client with a dress and two shirts"""
+        session = self.client.session
+        cart = GuestCart(session)
+        cart.add_to_cart(self.dress)
+        cart.add_to_cart(self.shirt, 2)
+        session.save()
+        return cart
+
+    def test_guest_cart_not_in_database(self):
+        """Test if guest cart is kept in the cache and not in the database"""
+        cart = self.guest_cart()
+        cart.remove_from_cart(self.dress)
+
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(GuestCart(self.client.session).items, {self.shirt.id: 2})
+        self.assertEqual(GuestCart(self.client.session).total_price, 1000)
+
+    def test_merge_after_login(self):
+        """Test if guest cart is merged into the user cart after login"""
+        self.guest_cart()
+        cart = Cart.objects.create(user=self.user)
+        cart.add_to_cart(self.shirt)
+        response = self.client.post(reverse('login:classic-login'),
+                                    data={'data': json.dumps({'username': 'ehsan', 'password': '123456'})})
+
+        self.assertEqual(response.json()['status'], 'ok')
+        self.assertEqual(dict(cart.cart_item_cart.values_list('product', 'quantity')),
+                         {self.dress.id: 1, self.shirt.id: 3})
+        self.assertEqual(Cart.objects.count(), 1)
+        self.assertFalse(GuestCart(self.client.session).items)
+
+    def test_persist_at_checkout(self):
+        """Test if guest cart is saved in the database at checkout"""
+        cart = self.guest_cart().persist()
+
+        self.assertEqual(cart.get_price(cached=False).total, 1900)
+
+
+class TestCartMutations(TestCase):
+
+    def setUp(self) -> None:
+        category = Category.objects.create(name='Giyim')
+        self.dress = Product.objects.create(category=category, name='Elbise', price=1000, discount=100)
+        self.shirt = Product.objects.create(category=category, name='Gomlek', price=500, discount=0)
+        self.cart = Cart.objects.create()
+
+    def test_add_increments(self):
+        """Test if adding a product again increases its quantity with one statement"""
+        self.assertEqual(self.cart.add_to_cart(self.dress, 2), 2)
+        with self.assertNumQueries(1):
+            quantities = CartItem.objects.add_quantities(self.cart.pk, {self.dress.pk: 3, self.shirt.pk: 1})
+
+        self.assertEqual(quantities, {self.dress.pk: 5, self.shirt.pk: 1})
+        self.assertEqual(self.cart.cart_item_cart.count(), 2)
+        self.assertEqual(self.cart.version, 1)
+
+    def test_remove_returns_quantity(self):
+        """Test if removing a product returns its removed quantity"""
+        self.cart.add_to_cart(self.dress, 2)
+
+        self.assertEqual(self.cart.remove_from_cart(self.dress), 2)
+        self.assertEqual(self.cart.remove_from_cart(self.dress), 0)
+        self.assertFalse(self.cart.cart_item_cart.exists())
+
+    def test_set_quantities(self):
+        """Test if quantities of many products are set and products with 0 quantity are removed"""
+        self.cart.add_to_cart(self.dress, 2)
+        self.cart.set_quantities({self.dress.pk: 0, self.shirt.pk: 4})
+
+        self.assertEqual(dict(self.cart.cart_item_cart.values_list('product', 'quantity')), {self.shirt.pk: 4})
+        self.cart.set_quantities({self.shirt.pk: 1})
+        self.assertEqual(self.cart.cart_item_cart.get().quantity, 1)
+
+    def test_unique_cart_product(self):
+        """Test if a product can not be in a cart twice"""
+        self.cart.add_to_cart(self.dress)
+
+        with self.assertRaises(IntegrityError):
+            CartItem.objects.create(cart=self.cart, product=self.dress)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestCartViews(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+        category = Category.objects.create(name='Giyim')
+        self.dress = Product.objects.create(category=category, name='Elbise', price=1000, discount=100)
+        self.shirt = Product.objects.create(category=category, name='Gomlek', price=500, discount=0)
+        self.user = User.objects.create_user(username='ehsan', password='123456')
+
+    def batch(self, *operations):
+        return self.client.post(reverse('cart:cart-batch'), data={'data': json.dumps({'operations': operations})})
+
+    def test_batch_operations(self):
+        """Test if a batch of operations is applied with one request and the new cart is returned"""
+        self.client.force_login(self.user)
+        response = self.batch({'op': 'add', 'product': self.dress.id, 'quantity': 2},
+                              {'op': 'add', 'product': self.shirt.id},
+                              {'op': 'add', 'product': self.shirt.id},
+                              {'op': 'update', 'product': self.dress.id, 'quantity': 1})
+        data = response.json()
+
+        self.assertEqual(data['status'], 'ok')
+        self.assertEqual(data['cart']['total'], '1900')
+        self.assertEqual(data['cart']['version'], 1)
+        self.assertEqual(dict(Cart.objects.get(user=self.user).cart_item_cart.values_list('product', 'quantity')),
+                         {self.dress.id: 1, self.shirt.id: 2})
+
+        response = self.batch({'op': 'remove', 'product': self.dress.id})
+        self.assertEqual(response.json()['cart']['total'], '1000')
+
+    def test_guest_batch(self):
+        """Test if guests use the api with their cache cart"""
+        self.batch({'op': 'add', 'product': self.shirt.id, 'quantity': 3})
+        response = self.client.get(reverse('cart:cart-detail'))
+
+        self.assertEqual(response.json()['cart']['quantity'], 3)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_invalid_batch(self):
+        """Test if invalid operations and unknown products change nothing"""
+        self.assertEqual(self.batch({'op': 'buy', 'product': self.dress.id}).json()['code'], 400)
+        self.assertEqual(self.batch({'op': 'add', 'product': self.dress.id, 'quantity': -1}).json()['code'], 400)
+        self.assertEqual(self.batch({'op': 'add', 'product': 1000}).json()['code'], 404)
+        self.assertEqual(self.client.get(reverse('cart:cart-detail')).json()['cart']['items'], [])
+
+    def test_conditional_get(self):
+        """Test if the cart is not sent again while its version is the same"""
+        self.client.force_login(self.user)
+        etag = self.batch({'op': 'add', 'product': self.dress.id})['ETag']
+        response = self.client.get(reverse('cart:cart-detail'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.batch({'op': 'add', 'product': self.dress.id})
+        response = self.client.get(reverse('cart:cart-detail'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
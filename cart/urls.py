@@ -5,5 +5,6 @@ from . import views
 app_name = 'cart'
 
 urlpatterns = [
-    
-]
\ No newline at end of file
+    path('', views.cart_detail, name='cart-detail'),
+    path('batch/', views.cart_batch, name='cart-batch'),
+]
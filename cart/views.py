@@ -1,3 +1,80 @@
-from django.shortcuts import render
+"""
+JSON api of the cart for the frontend (same response style of 'login.views').
 
-# Create your views here.
+** 'cart_detail' supports conditional GET: 'ETag' of the response is made from the cart version, so polling clients
+that send 'If-None-Match' get '304' without pricing the cart.
+
+** 'cart_batch' applies a batch of operations with one request (eg: many clicks on quick-add buttons) and returns
+the recomputed cart. The batch is sent like the login forms as json in the 'data' field:
+    {"operations": [{"op": "add", "product": 12, "quantity": 2}, {"op": "remove", "product": 7}]}
+"""
+from django.http import JsonResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET, require_POST
+
+from product.models import Product
+from .cart_functions import get_cart, reduce_operations
+
+import json
+
+
+def cart_etag(cart):
+    return f'"{cart.pk or 0}-{cart.version}"'
+
+
+def cart_response(cart, msg='', status='ok', code=200):
+    """Json of the cart with its prices"""
+    price = cart.get_price()
+    data = {
+        'msg': msg,
+        'status': status,
+        'code': code,
+        'cart': {
+            'version': cart.version,
+            'items': [{'product': line.product_id,
+                       'name': line.name,
+                       'quantity': line.quantity,
+                       'unit_price': line.unit_price,
+                       'unit_discount': line.unit_discount,
+                       'total': line.total} for line in price.lines.values()],
+            'quantity': price.quantity,
+            'subtotal': price.subtotal,
+            'product_discount': price.product_discount,
+            'user_discount': price.user_discount,
+            'total': price.total,
+        }
+    }
+    response = JsonResponse(data=data)
+    response['ETag'] = cart_etag(cart)
+    # Browsers must always check the cart with the server (with 'If-None-Match')
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_GET
+def cart_detail(request):
+    """Cart of the user or the guest"""
+    cart = get_cart(request)
+    if cart_etag(cart) in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = cart_etag(cart)
+        return response
+    return cart_response(cart)
+
+
+@require_POST
+def cart_batch(request):
+    """Apply a batch of 'add', 'update' and 'remove' operations to the cart"""
+    json_data = request.POST.get('data', None)
+    if not json_data:
+        return JsonResponse(data={'msg': 'داده ای دریافت نشد', 'status': 'nok', 'code': 400})
+    try:
+        additions, quantities = reduce_operations(json.loads(json_data)['operations'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse(data={'msg': 'عملیات نامعتبر است', 'status': 'nok', 'code': 400})
+    products = set(additions) | {product_id for product_id, quantity in quantities.items() if quantity}
+    if Product.objects.filter(id__in=products, is_active=True).count() != len(products):
+        return JsonResponse(data={'msg': 'محصول پیدا نشد', 'status': 'nok', 'code': 404})
+    cart = get_cart(request)
+    cart.update_items(additions, quantities)
+    return cart_response(cart, msg='سبد خرید به روز شد')
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'cart',
     'order',
     'payment',
+    'crawler',
 ]
 
 
@@ -85,7 +86,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                # 'cart.context_processor.get_cart',
+                'cart.context_processor.get_cart',
+                'product.context_processor.category_tree',
             ],
         },
     },
@@ -285,3 +287,94 @@ INTERNAL_IPS = [
     "127.0.0.1",
     # ...
 ]
+
+
+# Crawler settings (used by 'crawler' app)
+CRAWLER_BASE_URL = 'https://public.trendyol.com'
+CRAWLER_IMAGE_BASE_URL = 'https://cdn.dsmcdn.com'
+# Maximum number of requests in flight (it's also the size of the connection pool)
+CRAWLER_CONCURRENCY = 16
+# Maximum requests per second sent to every host
+CRAWLER_RATE_PER_HOST = 20
+CRAWLER_RETRIES = 3
+# Number of products upserted in every transaction
+CRAWLER_BATCH_SIZE = 1000
+# Number of processes used to make thumbnails of crawled images (None means number of CPUs)
+CRAWLER_IMAGE_WORKERS = None
+
+# Standard thumbnails of product images. They are made right after the images are crawled (see 'crawler.images')
+# so they must be the same geometry and options used in templates: {% thumbnail product.image "300x300" crop="center" %}
+PRODUCT_THUMBNAIL_SIZES = [
+    ('100x100', {'crop': 'center'}),
+    ('300x300', {'crop': 'center'}),
+    ('800x800', {}),
+]
+
+# Seconds that every process keeps the category tree in memory (see 'product.tree')
+CATEGORY_TREE_TIMEOUT = 300
+
+# Seconds that prices of a cart version are cached. Product prices may change without changing the cart (see 'cart.pricing')
+CART_PRICE_TIMEOUT = 60
+# Seconds that carts of the guests are kept in the cache (see 'cart.cart_functions.GuestCart')
+GUEST_CART_TIMEOUT = 60 * 60 * 24 * 14
+
+# Seconds that stock of an unpaid order is reserved for it (see 'order.inventory')
+ORDER_RESERVATION_TIMEOUT = 60 * 15
+# Order ids that every process takes from the database at once (see 'order.numbers')
+ORDER_ID_BLOCK_SIZE = 100
+
+# Payment gateway api (see 'payment.gateway'). Verification requests of every process are sent with a pool of
+# 'PAYMENT_GATEWAY_CONCURRENCY' connections
+PAYMENT_GATEWAY_URL = config('PAYMENT_GATEWAY_URL', default='http://127.0.0.1:8001')
+PAYMENT_GATEWAY_MERCHANT = config('PAYMENT_GATEWAY_MERCHANT', default='')
+PAYMENT_GATEWAY_CONCURRENCY = 32
+PAYMENT_GATEWAY_TIMEOUT = 10
+# Seconds after which a payment that is stuck in verification (eg: the process is killed) may be verified again
+PAYMENT_VERIFY_TIMEOUT = 60
+
+# Only the newest matches of a search are ranked, so common words are as fast as rare ones (see 'product.search')
+SEARCH_RANK_WINDOW = 5000
+
+# Lower bounds of the price facet buckets of the catalog pages (selling price, the last bucket has no upper bound)
+FACET_PRICE_BUCKETS = [0, 250, 500, 1000, 2500, 5000, 10000]
+# Facet bitmaps of a category page are built when it's requested this many times (before that counts are read with
+# SQL). Every process keeps bitmaps of 'FACET_INDEX_SIZE' pages for 'FACET_INDEX_TIMEOUT' seconds (see 'product.facets')
+FACET_INDEX_WARM_HITS = 2
+FACET_INDEX_SIZE = 64
+FACET_INDEX_TIMEOUT = 300
+
+# Autocomplete index of every process (see 'product.autocomplete'). It's loaded from the snapshot that
+# 'manage.py build_autocomplete' writes, only the 'AUTOCOMPLETE_MAX_PHRASES' most popular phrases are kept
+AUTOCOMPLETE_SNAPSHOT = config('AUTOCOMPLETE_SNAPSHOT', default=os.path.join(BASE_DIR, 'autocomplete.snapshot'))
+AUTOCOMPLETE_MAX_PHRASES = 500000
+# Seconds between reading the products changed after the snapshot (0 disables it). They are kept in a second index
+# that is merged into the main one when it has 'AUTOCOMPLETE_OVERLAY_SIZE' phrases
+AUTOCOMPLETE_REFRESH = 60
+AUTOCOMPLETE_OVERLAY_SIZE = 5000
+
+# Password hashes of the login views run in a pool of 'LOGIN_HASHING_WORKERS' threads of every process, at most
+# 'LOGIN_HASHING_QUEUE' of them wait for a thread (a hash takes ~0.3s) and more logins are rejected
+# (see 'login.hashing')
+LOGIN_HASHING_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+LOGIN_HASHING_QUEUE = 8 * LOGIN_HASHING_WORKERS
+
+# 'default' is the cache of the process. 'shared' is the cache of all the processes: a cache server in production
+# ('SHARED_CACHE_BACKEND' and 'SHARED_CACHE_LOCATION' are required, see 'production.py') and a local stand-in in
+# development and tests ('_resources.cache_standin', see 'dev.py')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+# Catalog pages are cached in 'TIERED_CACHE_ALIAS' for 'TIERED_CACHE_TIMEOUT' seconds (0 disables it) and every process
+# keeps 'TIERED_CACHE_LOCAL_SIZE' of them for 'TIERED_CACHE_LOCAL_TIMEOUT' seconds, that is the longest time a change of
+# another process is not seen (see '_resources.cache')
+TIERED_CACHE_ALIAS = 'shared'
+TIERED_CACHE_TIMEOUT = 600
+TIERED_CACHE_LOCAL_SIZE = 1000
+TIERED_CACHE_LOCAL_TIMEOUT = 5
+# A missing catalog page is computed by one reader of all the processes, the others wait for it (or get its stale
+# value) for at most 'TIERED_CACHE_LOCK_TIMEOUT' seconds. Pages are computed again before they expire with a
+# probability that 'TIERED_CACHE_EARLY_REFRESH' scales (0 disables it, see '_resources.cache')
+TIERED_CACHE_LOCK_TIMEOUT = 10
+TIERED_CACHE_EARLY_REFRESH = 1.0
@@ -1,3 +1,5 @@
+from decouple import config
+
 from .base import *
 
 DEBUG = True
@@ -11,6 +13,12 @@ SESSION_COOKIE_SECURE = False
 # CSRF_COOKIE_SECURE = False
 SECURE_SSL_REDIRECT = False
 
+# Local stand-in of the cache server, its entries are not shared with other processes
+CACHES['shared'] = {
+    'BACKEND': config('SHARED_CACHE_BACKEND', default='_resources.cache_standin.StandInCache'),
+    'LOCATION': config('SHARED_CACHE_LOCATION', default='shared'),
+}
+
 try:
     from .local import *
 except ImportError:
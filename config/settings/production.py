@@ -1,3 +1,6 @@
+from decouple import config
+from django.core.exceptions import ImproperlyConfigured
+
 from .base import *
 
 DEBUG = False
@@ -22,6 +25,15 @@ MAIN_SCHEME = 'https' if SECURE_SSL_REDIRECT else 'http'
 
 PARENT_HOST = 'rapadana.ir'
 
+# Cache server of all the processes. Catalog pages are invalidated by other processes (eg: the crawler), so a cache
+# of the process would serve changed pages until they expire
+CACHES['shared'] = {
+    'BACKEND': config('SHARED_CACHE_BACKEND', default='django.core.cache.backends.memcached.PyMemcacheCache'),
+    'LOCATION': config('SHARED_CACHE_LOCATION'),
+}
+if CACHES['shared']['BACKEND'].endswith(('.LocMemCache', '.DummyCache', '.StandInCache')):
+    raise ImproperlyConfigured('SHARED_CACHE_BACKEND must be a cache server in production')
+
 try:
     from .local import *
 except ImportError:
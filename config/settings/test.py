@@ -0,0 +1,5 @@
+from .dev import *
+
+# django-silk saves and explains every request and keeps the last one of a test for the next test, so it's not used in
+# the tests (queries of the tests are only the queries of the code)
+MIDDLEWARE = [name for name in MIDDLEWARE if not name.startswith('silk.')]
@@ -18,9 +18,11 @@ urlpatterns = [
     # path('token-auth/', token_view.obtain_auth_token),    # But in this example 'accounts.tests' module only works with
 
     path('login/', include('login.urls')),
+    path('accounts/', include('account.urls')),
     path('product/', include('product.urls')),
     path('cart/', include('cart.urls')),
     path('order/', include('order.urls')),
+    path('payment/', include('payment.urls')),
     path('', include('vitrin.urls')),
 ]
 
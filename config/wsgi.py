@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.dev')
 
 application = get_wsgi_application()
+
+# Load the autocomplete index in the background (see 'product.autocomplete')
+from product.autocomplete import start_refresher  # noqa: E402
+
+start_refresher()
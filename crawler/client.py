@@ -0,0 +1,125 @@
+"""
+Async HTTP client used by the crawler.
+
+** Only one 'aiohttp.ClientSession' is used for the whole crawl, so TCP (and TLS) connections stay alive and are
+reused between requests. 'TCPConnector' limits are the size of the connection pool:
+https://docs.aiohttp.org/en/stable/client_advanced.html#limiting-connection-pool-size
+
+** 'concurrency' bounds the number of in flight requests and 'rate_per_host' is the maximum requests per second
+sent to every host. Trendyol starts to answer with '429' if we send too many requests, so failed requests are
+retried with exponential backoff (and 'Retry-After' header if the server sends it).
+"""
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+
+# Statuses that are worth retrying. Any other status is returned to the caller as it is.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """Raised when a request failed after all the retries"""
+
+
+class FetchResult:
+    """Response of a request. Body is read completely so connection is released to the pool immediately"""
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class HostRateLimiter:
+    """Spread requests of every host so no more than 'rate' requests per second are sent to it"""
+    def __init__(self, rate=None):
+        self.interval = 1 / rate if rate else 0
+        self._next_slot = dict()
+
+    async def wait(self, host):
+        if not self.interval:
+            return
+        # Event loop is single threaded so reserving the slot needs no lock
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class CrawlerClient:
+    """
+    Pooled keep-alive client with bounded concurrency, per host rate limiting and retry. Must be used as an
+    async context manager:
+        async with CrawlerClient(concurrency=32) as client:
+            data = await client.get_json(url)
+    """
+    def __init__(self, concurrency=16, rate_per_host=None, retries=3, backoff=0.5, timeout=30, headers=None):
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.headers = {'Accept': 'application/json', 'User-Agent': 'Mozilla/5.0 (compatible; trendyol-crawl)'}
+        self.headers.update(headers or {})
+        self.rate_limiter = HostRateLimiter(rate_per_host)
+        self.requests = 0
+        self.retried = 0
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency,
+                                         limit_per_host=self.concurrency,
+                                         keepalive_timeout=60,
+                                         ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers=self.headers)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    def _retry_delay(self, attempt, retry_after=None):
+        """Exponential backoff with jitter. 'Retry-After' header wins if the server sent it"""
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    async def fetch(self, url, params=None, headers=None):
+        """Send GET request and return 'FetchResult'. Raise 'FetchError' if all the retries failed"""
+        host = urlsplit(url).netloc
+        last_error = None
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            async with self._semaphore:
+                await self.rate_limiter.wait(host)
+                self.requests += 1
+                try:
+                    async with self._session.get(url, params=params, headers=headers) as response:
+                        body = await response.read()
+                        if response.status not in RETRY_STATUSES:
+                            return FetchResult(str(response.url), response.status, response.headers, body)
+                        last_error = f'status {response.status}'
+                        retry_after = response.headers.get('Retry-After')
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    last_error = repr(e)
+            if attempt < self.retries:
+                self.retried += 1
+                # Sleep outside of the semaphore so other requests could use the slot
+                await asyncio.sleep(self._retry_delay(attempt, retry_after))
+        raise FetchError(f'{url} failed after {self.retries + 1} attempts: {last_error}')
+
+    async def get_json(self, url, params=None):
+        """Fetch url and return decoded json. Any status except for 200 raises 'FetchError'"""
+        result = await self.fetch(url, params=params)
+        if result.status != 200:
+            raise FetchError(f'{url} returned status {result.status}')
+        return result.json()
@@ -0,0 +1,72 @@
+"""
+Fingerprints of the crawled content to make re-crawls incremental.
+
+** Pages: 'ETag' and 'Last-Modified' of every page are stored in 'PageValidator' and sent back in the next crawl as
+'If-None-Match' and 'If-Modified-Since'. If the server answers with '304' the page is not parsed at all.
+
+** Products: sha1 of the normalized record is stored in 'ProductFingerprint'. Records with the same hash are not
+written again, so 'Product.updated' does not change and database is not churned for nothing.
+"""
+import hashlib
+import json
+
+from .models import ProductFingerprint, PageValidator
+
+
+# Only the fields that are saved in 'Product' are part of the hash
+HASHED_FIELDS = ['name', 'description', 'brand', 'category_path', 'price', 'discount', 'images', 'image']
+
+
+def content_hash(record):
+    """sha1 of the normalized record"""
+    normalized = {field: record.get(field) for field in HASHED_FIELDS}
+    normalized['name'] = ' '.join(normalized['name'].split())
+    normalized['price'], normalized['discount'] = str(normalized['price']), str(normalized['discount'])
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def changed_records(records):
+    """Return records whose content changed since the last time they were saved. Hash is set on every record"""
+    for record in records:
+        record['content_hash'] = content_hash(record)
+    saved = dict(ProductFingerprint.objects.filter(external_id__in=[r['external_id'] for r in records])
+                 .values_list('external_id', 'content_hash'))
+    return [r for r in records if saved.get(r['external_id']) != r['content_hash']]
+
+
+def save_fingerprints(records):
+    """Insert or update hashes of the saved records with one query"""
+    ProductFingerprint.objects.bulk_create(
+        [ProductFingerprint(external_id=r['external_id'], content_hash=r['content_hash']) for r in records],
+        update_conflicts=True,
+        unique_fields=['external_id'],
+        update_fields=['content_hash', 'updated'])
+
+
+def load_validators(url_prefix=None, urls=None):
+    """Return validators of the urls (or the urls starting with 'url_prefix') as 'url: PageValidator'"""
+    queryset = PageValidator.objects.all()
+    if url_prefix:
+        queryset = queryset.filter(url__startswith=url_prefix)
+    if urls is not None:
+        queryset = queryset.filter(url__in=urls)
+    return {validator.url: validator for validator in queryset}
+
+
+def save_validators(validators):
+    """Insert or update the validators (a list of unsaved 'PageValidator') with one query"""
+    if validators:
+        PageValidator.objects.bulk_create(validators,
+                                          update_conflicts=True,
+                                          unique_fields=['url'],
+                                          update_fields=['etag', 'last_modified', 'total', 'updated'])
+
+
+def request_headers(validator):
+    """Conditional request headers of the page"""
+    headers = dict()
+    if validator and validator.etag:
+        headers['If-None-Match'] = validator.etag
+    if validator and validator.last_modified:
+        headers['If-Modified-Since'] = validator.last_modified
+    return headers
@@ -0,0 +1,186 @@
+"""
+Download main image of the crawled products and pre-generate their thumbnails.
+
+** Images are downloaded concurrently with the crawler client. Trendyol uses the same images for color variants,
+so every url is downloaded only once (urls downloaded in the previous crawls are loaded from 'CrawledImage') and
+files are stored by sha1 of their content ('products/ab/<sha1>.jpg'), so identical files are stored only once.
+
+** sorl-thumbnail makes thumbnails lazily on the first page view. Standard sizes ('PRODUCT_THUMBNAIL_SIZES') are made
+in a process pool right after download, with the same names sorl-thumbnail gives them. So 'get_thumbnail' in
+templates finds the files and does not resize anything.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as thumbnail_settings, defaults as thumbnail_defaults
+from sorl.thumbnail.images import ImageFile
+
+from .client import FetchError
+from .models import CrawledImage
+
+
+logger = logging.getLogger(__name__)
+
+def image_name(digest, url):
+    """Storage name of the image. Name is made from content hash so identical images have the same name"""
+    extension = os.path.splitext(urlsplit(url).path)[1].lower() or '.jpg'
+    return f'products/{digest[:2]}/{digest}{extension}'
+
+
+def store_image(name, content):
+    """Save image in the storage if it's not already stored. Return True if the file is created"""
+    if default_storage.exists(name):
+        return False
+    default_storage.save(name, ContentFile(content))
+    return True
+
+
+def thumbnail_options(source, options):
+    """Complete options exactly like 'ThumbnailBackend.get_thumbnail' does (thumbnail name is made from options)"""
+    options = dict(options)
+    backend = default.backend
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in ThumbnailBackend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in ThumbnailBackend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(thumbnail_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def create_thumbnails(name, sizes):
+    """
+    Make thumbnails of the stored image in all the sizes. It runs in the process pool so it must not use
+    database. Return number of the created thumbnails.
+    """
+    source = ImageFile(name, default_storage)
+    source_image = default.engine.get_image(source)
+    created = 0
+    try:
+        for geometry, options in sizes:
+            options = thumbnail_options(source, options)
+            thumbnail = ImageFile(default.backend._get_thumbnail_filename(source, geometry, options), default.storage)
+            if thumbnail.exists():
+                continue
+            options['image_info'] = default.engine.get_image_info(source_image)
+            default.backend._create_thumbnail(source_image, geometry, options, thumbnail)
+            created += 1
+    finally:
+        default.engine.cleanup(source_image)
+    return created
+
+
+def known_images(urls):
+    """Return 'url: image name' of the urls downloaded before"""
+    return dict(CrawledImage.objects.filter(url__in=urls).values_list('url', 'image'))
+
+
+def save_images(images):
+    """Save downloaded images. 'images' is a list of '(url, content hash, image name)'"""
+    CrawledImage.objects.bulk_create([CrawledImage(url=url, content_hash=digest, image=name)
+                                      for url, digest, name in images],
+                                     ignore_conflicts=True)
+
+
+class ImagePipeline:
+    """
+    Called with the records of every crawled page. Downloads main image of the records and sets its stored name as
+    'image' of the record (then it's saved in 'Product.image' by 'crawler.ingest'). Must be closed at the end to
+    wait for the thumbnails.
+    """
+    def __init__(self, client, sizes=None, workers=None):
+        self.client = client
+        self.sizes = settings.PRODUCT_THUMBNAIL_SIZES if sizes is None else sizes
+        self.executor = ProcessPoolExecutor(max_workers=workers or settings.CRAWLER_IMAGE_WORKERS,
+                                            initializer=django.setup)
+        # url: image name, and downloads in progress. content hash: image name of the files stored in this crawl
+        self.names = dict()
+        self.downloads = dict()
+        self.digests = dict()
+        self.new_images = []
+        self.thumbnail_jobs = []
+        self.downloaded = 0
+        self.deduplicated = 0
+        self.thumbnails = 0
+        self.failed = 0
+        self.thumbnails_failed = 0
+
+    async def __call__(self, records):
+        urls = {record['images'][0] for record in records if record['images']}
+        unknown = [url for url in urls if url not in self.names and url not in self.downloads]
+        if unknown:
+            self.names.update(await sync_to_async(known_images)(unknown))
+        names = dict(zip(urls, await asyncio.gather(*(self.resolve(url) for url in urls))))
+        await self.save()
+        for record in records:
+            if record['images'] and names[record['images'][0]]:
+                record['image'] = names[record['images'][0]]
+
+    async def resolve(self, url):
+        """Return image name of the url. Download it if it's not downloaded yet (only once for every url)"""
+        if url in self.names:
+            return self.names[url]
+        if url not in self.downloads:
+            self.downloads[url] = asyncio.ensure_future(self.download(url))
+        return await self.downloads[url]
+
+    async def download(self, url):
+        try:
+            result = await self.client.fetch(url)
+        except FetchError:
+            result = None
+        if result is None or result.status != 200:
+            self.failed += 1
+            self.downloads.pop(url, None)
+            return None
+        self.downloaded += 1
+        digest = hashlib.sha1(result.body).hexdigest()
+        if digest in self.digests:
+            name = self.digests[digest]
+            self.deduplicated += 1
+        else:
+            name = self.digests[digest] = image_name(digest, url)
+            if await asyncio.to_thread(store_image, name, result.body):
+                loop = asyncio.get_running_loop()
+                self.thumbnail_jobs.append(loop.run_in_executor(self.executor, create_thumbnails, name, self.sizes))
+            else:
+                self.deduplicated += 1
+        self.new_images.append((url, digest, name))
+        self.names[url] = name
+        self.downloads.pop(url, None)
+        return name
+
+    async def save(self):
+        """Save downloaded images with one query"""
+        if self.new_images:
+            images, self.new_images = self.new_images, []
+            await sync_to_async(save_images)(images)
+
+    async def close(self):
+        """
+        Wait for all the thumbnails and shut down the process pool. Images whose thumbnails are not made (eg: a broken
+        file) are only counted, sorl-thumbnail tries them again on the first page view
+        """
+        try:
+            await self.save()
+            for result in await asyncio.gather(*self.thumbnail_jobs, return_exceptions=True):
+                if isinstance(result, Exception):
+                    self.thumbnails_failed += 1
+                    logger.warning('thumbnails are not made: %r', result)
+                else:
+                    self.thumbnails += result
+        finally:
+            self.executor.shutdown()
@@ -0,0 +1,137 @@
+"""
+Save product records (built in 'crawler.parsers') into 'product' app models.
+
+** Products are upserted in batches by their 'external_id' (Trendyol id) with one 'INSERT ... ON CONFLICT DO UPDATE'
+statement for every batch. 'bulk_create' does not call 'Product.save' so slugs of the new products are allocated
+for the whole batch with 'product.slugs.allocate_slugs' (only one query).
+
+** Categories and brands are loaded once in 'CatalogMap' and foreign keys are resolved from it. Only missing
+categories and brands are created.
+
+** Records whose content hash is the same as the last saved one ('crawler.fingerprints') are skipped.
+
+** Search documents and facet counts of the upserted products are updated in the same transaction
+('product.search.update_index' and 'product.facets.record_changes'), so they never need a full rebuild.
+"""
+from functools import lru_cache
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from product.cache import invalidate_products
+from product.facets import STATE_FIELDS, facet_state, read_states, record_changes
+from product.models import Category, Brand, Product
+from product.search import update_index
+from product.slugs import allocate_slugs
+from .fingerprints import changed_records, save_fingerprints
+
+
+# Fields updated when a crawled product already exists. 'slug' and 'created' of the product never change.
+UPSERT_FIELDS = ['name', 'category', 'brand', 'price', 'discount', 'updated']
+# These fields are updated only if the record has them (eg: listing pages have no description)
+OPTIONAL_FIELDS = ['description', 'image']
+
+# The same few thousand brand names are slugified for every product
+brand_slug = lru_cache(maxsize=4096)(slugify)
+
+
+class CatalogMap:
+    """In memory map of category paths and brand slugs to their model objects"""
+    def __init__(self):
+        self.categories = dict()
+        self.brands = dict()
+        self.loaded = False
+
+    def load(self):
+        """Load all the categories and brands with two queries"""
+        by_id = {category.id: category for category in Category.objects.all()}
+        for category in by_id.values():
+            path, node = [], category
+            while node:
+                path.insert(0, node.name)
+                node = by_id.get(node.parent_id)
+            self.categories[tuple(path)] = category
+        self.brands = {brand.slug: brand for brand in Brand.objects.all()}
+        self.loaded = True
+
+    def category(self, path):
+        """Get the category of the path (and create it and its parents if not exist). 'path' is a list of names"""
+        path = tuple(path)
+        if path not in self.categories:
+            parent = self.category(path[:-1]) if len(path) > 1 else None
+            self.categories[path], created = Category.objects.get_or_create(name=path[-1], parent=parent)
+        return self.categories[path]
+
+    def brand(self, name):
+        return self.brands.get(brand_slug(name)) if name else None
+
+    def prepare(self, records):
+        """Create missing categories and brands of the records (brands are created with one query)"""
+        if not self.loaded:
+            self.load()
+        for record in records:
+            if record['category_path']:
+                self.category(record['category_path'])
+        missing = {brand_slug(r['brand']): r['brand'] for r in records
+                   if r['brand'] and brand_slug(r['brand']) not in self.brands}
+        if missing:
+            Brand.objects.bulk_create([Brand(name=name, slug=slug) for slug, name in missing.items()],
+                                      ignore_conflicts=True)
+            self.brands.update({brand.slug: brand for brand in Brand.objects.filter(slug__in=missing)})
+
+
+def upsert_batch(records, catalog, incremental=True):
+    """Insert or update one batch of the records. Return number of upserted (changed) products"""
+    records = list({r['external_id']: r for r in records if r['name'] and r['category_path']}.values())
+    if incremental and records:
+        records = changed_records(records)
+    if not records:
+        return 0
+    catalog.prepare(records)
+    products = Product.objects.filter(external_id__in=[r['external_id'] for r in records])
+    existing, old_states = dict(), dict()
+    for external_id, slug, pk, *state in products.values_list('external_id', 'slug', *STATE_FIELDS):
+        existing[external_id] = slug
+        old_states[pk] = facet_state(*state)
+    slugs = allocate_slugs(Product, {r['external_id']: (r['name'], r['external_id'])
+                                     for r in records if r['external_id'] not in existing})
+    slugs.update(existing)
+
+    groups = dict()
+    for record in records:
+        fields = UPSERT_FIELDS + [field for field in OPTIONAL_FIELDS if record.get(field)]
+        groups.setdefault(tuple(fields), []).append(record)
+    for fields, group in groups.items():
+        Product.objects.bulk_create(
+            [Product(external_id=r['external_id'],
+                     slug=slugs[r['external_id']],
+                     name=r['name'],
+                     description=r['description'],
+                     category=catalog.category(r['category_path']),
+                     brand=catalog.brand(r['brand']),
+                     price=r['price'],
+                     discount=r['discount'],
+                     image=r.get('image', '')) for r in group],
+            update_conflicts=True,
+            unique_fields=['external_id'],
+            update_fields=list(fields))
+    update_index(products)
+    new_states = read_states(products)
+    record_changes(old_states, new_states)
+    invalidate_products(slugs.values(), old_states, new_states)
+    if incremental:
+        save_fingerprints(records)
+    return len(records)
+
+
+def ingest_products(records, catalog=None, batch_size=1000, incremental=True):
+    """
+    Upsert products of the records in batches (one transaction for every batch). Return number of changed products.
+    If 'incremental' is False, all the records are written even if they have not changed.
+    """
+    catalog = catalog or CatalogMap()
+    saved = 0
+    for start in range(0, len(records), batch_size):
+        with transaction.atomic():
+            saved += upsert_batch(records[start:start + batch_size], catalog, incremental)
+    return saved
@@ -0,0 +1,75 @@
+"""
+Benchmark the image pipeline with local fixture images served by the stand-in server:
+    python manage.py bench_images --images 200 --variants 3 --workers 4
+Every image is served with 'variants' diffrent urls (like color variants in Trendyol). Files are stored in a temporary
+MEDIA_ROOT and database changes are rolled back at the end.
+"""
+import asyncio
+import io
+import shutil
+import tempfile
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from crawler.client import CrawlerClient
+from crawler.images import ImagePipeline
+from crawler.standin import StandInServer
+
+
+def fixture_image(index, size=(1200, 1800)):
+    """Noisy jpeg, so its size and decoding cost are like a real product photo"""
+    noise = Image.effect_noise(size, 40 + index % 40)
+    image = Image.merge('RGB', (noise, noise.rotate(90, expand=False), noise.transpose(Image.FLIP_LEFT_RIGHT)))
+    content = io.BytesIO()
+    image.save(content, format='JPEG', quality=85)
+    return content.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark image download, deduplication and thumbnail generation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=100, help='Number of distinct images')
+        parser.add_argument('--variants', type=int, default=3, help='Number of urls of every image')
+        parser.add_argument('--workers', type=int, default=settings.CRAWLER_IMAGE_WORKERS)
+        parser.add_argument('--concurrency', type=int, default=settings.CRAWLER_CONCURRENCY)
+
+    def handle(self, *args, **options):
+        images = [fixture_image(i) for i in range(options['images'])]
+        files = {f'/bench/{i}/{v}.jpg': content for i, content in enumerate(images) for v in range(options['variants'])}
+        media_root = tempfile.mkdtemp()
+        try:
+            with StandInServer(dict(), dict(), files=files) as server, transaction.atomic(), \
+                    override_settings(MEDIA_ROOT=media_root):
+                records = [{'images': [f'{server.url}{path}']} for path in files]
+                pipeline, elapsed = async_to_sync(self.run_pipeline)(records, options)
+                # First render of the listing after the crawl (thumbnails are only registered in sorl key value store)
+                started = time.perf_counter()
+                for record in records[::options['variants']]:
+                    for geometry, thumbnail_options in settings.PRODUCT_THUMBNAIL_SIZES:
+                        get_thumbnail(record['image'], geometry, **thumbnail_options)
+                render = time.perf_counter() - started
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(media_root)
+
+        self.stdout.write(f'{len(records)} urls, {pipeline.downloaded} downloaded ({pipeline.deduplicated} duplicates) '
+                          f'and {pipeline.thumbnails} thumbnails in {elapsed:.2f}s: '
+                          f'{pipeline.downloaded / elapsed:.1f} images/s, {pipeline.thumbnails / elapsed:.1f} thumbnails/s')
+        self.stdout.write(f'First render of {len(images)} products after the crawl: {render:.2f}s')
+
+    async def run_pipeline(self, records, options):
+        started = time.perf_counter()
+        async with CrawlerClient(concurrency=options['concurrency']) as client:
+            pipeline = ImagePipeline(client, workers=options['workers'])
+            # Records are sent to the pipeline in pages of 24 like the crawler does
+            await asyncio.gather(*(pipeline(records[i:i + 24]) for i in range(0, len(records), 24)))
+            await pipeline.close()
+        return pipeline, time.perf_counter() - started
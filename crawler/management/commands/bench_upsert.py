@@ -0,0 +1,62 @@
+"""
+Benchmark the bulk upsert of crawled products (rows/sec):
+    python manage.py bench_upsert --rows 10000 100000 1000000
+Every size is synced three times: first time all the products are inserted, second time all of them are updated
+and third time nothing has changed so all the writes are skipped.
+Everything is rolled back at the end unless '--keep' is used.
+"""
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from crawler.ingest import CatalogMap, ingest_products
+
+
+def synthetic_records(rows, price_shift=0):
+    """Make product records like the records of 'crawler.parsers'"""
+    for i in range(rows):
+        yield {
+            'external_id': f'bench-{i}',
+            'name': f'Benchmark product {i % (rows // 3 or 1)}',    # Names are repeated to have slug collisions
+            'description': '',
+            'brand': f'Benchmark brand {i % 200}',
+            'category_path': ['Benchmark', f'Category {i % 40}'],
+            'price': Decimal(100 + i % 1000 + price_shift),
+            'discount': Decimal(i % 50),
+            'images': [],
+            'url': '',
+        }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bulk upsert throughput of crawled products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--batch-size', type=int, default=settings.CRAWLER_BATCH_SIZE)
+        parser.add_argument('--keep', action='store_true', help='Do not roll back the upserted products')
+
+    def sync(self, rows, batch_size, price_shift):
+        catalog = CatalogMap()
+        records = synthetic_records(rows, price_shift)
+        started = time.perf_counter()
+        while True:
+            chunk = [record for _, record in zip(range(batch_size * 10), records)]
+            if not chunk:
+                break
+            ingest_products(chunk, catalog, batch_size=batch_size)
+        return time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        for rows in options['rows']:
+            with transaction.atomic():
+                insert_time = self.sync(rows, options['batch_size'], 0)
+                update_time = self.sync(rows, options['batch_size'], 1)
+                unchanged_time = self.sync(rows, options['batch_size'], 1)
+                transaction.set_rollback(not options['keep'])
+            self.stdout.write(f'{rows} rows: insert {rows / insert_time:,.0f} rows/s ({insert_time:.2f}s), '
+                              f'update {rows / update_time:,.0f} rows/s ({update_time:.2f}s), '
+                              f'unchanged {rows / unchanged_time:,.0f} rows/s ({unchanged_time:.2f}s)')
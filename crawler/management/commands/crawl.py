@@ -0,0 +1,35 @@
+"""
+Crawl Trendyol categories and save their products:
+    python manage.py crawl kadin-elbise-x-g1-c56 erkek-ayakkabi-x-g2-c114 --pages 10 --details
+"""
+from django.core.management.base import BaseCommand
+
+from crawler.spider import run_crawl
+
+
+class Command(BaseCommand):
+    help = 'Crawl Trendyol category listings and save products in product app'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Trendyol category paths (eg: kadin-elbise-x-g1-c56)')
+        parser.add_argument('--pages', type=int, default=None, help='Maximum pages crawled for every category')
+        parser.add_argument('--concurrency', type=int, default=None, help='Maximum number of requests in flight')
+        parser.add_argument('--rate', type=float, default=None, help='Maximum requests per second for every host')
+        parser.add_argument('--retries', type=int, default=None)
+        parser.add_argument('--details', action='store_true', help='Fetch product details (description) too')
+        parser.add_argument('--images', action='store_true', help='Download images and make their thumbnails')
+        parser.add_argument('--dry-run', action='store_true', help='Crawl without saving products')
+        parser.add_argument('--full', action='store_true',
+                            help='Fetch all the pages and write all the products even if they have not changed')
+
+    def handle(self, *args, **options):
+        stats = run_crawl(options['paths'],
+                          concurrency=options['concurrency'],
+                          rate_per_host=options['rate'],
+                          retries=options['retries'],
+                          max_pages=options['pages'],
+                          details=options['details'],
+                          save=not options['dry_run'],
+                          incremental=not options['full'],
+                          images=options['images'])
+        self.stdout.write(self.style.SUCCESS(f'Crawled {stats}'))
@@ -0,0 +1,35 @@
+"""
+Benchmark the crawler against the local stand-in server with a synthetic catalog:
+    python manage.py crawl_bench --categories 4 --pages 50 --concurrency 32
+Products are not saved unless '--save' is used (Beware that '--save' writes into the configured database).
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from crawler.spider import run_crawl
+from crawler.standin import StandInServer, synthetic_catalog
+
+
+class Command(BaseCommand):
+    help = 'Benchmark crawler throughput (pages/s and products/s) against the local stand-in server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=4)
+        parser.add_argument('--pages', type=int, default=25, help='Pages of every category')
+        parser.add_argument('--concurrency', type=int, default=settings.CRAWLER_CONCURRENCY)
+        parser.add_argument('--details', action='store_true')
+        parser.add_argument('--save', action='store_true')
+
+    def handle(self, *args, **options):
+        listings, products = synthetic_catalog(categories=options['categories'], pages=options['pages'])
+        paths = sorted({path for path, page in listings})
+        with StandInServer(listings, products) as server, override_settings(CRAWLER_BASE_URL=server.url):
+            stats = run_crawl(paths,
+                              concurrency=options['concurrency'],
+                              rate_per_host=0,
+                              details=options['details'],
+                              save=options['save'])
+            connections = server.connections
+        self.stdout.write(f'{stats}')
+        self.stdout.write(f'{connections} connections opened for {stats.requests} requests')
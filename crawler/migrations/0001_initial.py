@@ -0,0 +1,42 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageValidator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=255, unique=True, verbose_name='url')),
+                ('etag', models.CharField(blank=True, max_length=100, verbose_name='etag')),
+                ('last_modified', models.CharField(blank=True, max_length=50, verbose_name='last modified')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='total')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'PageValidator',
+                'verbose_name_plural': 'PageValidator',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_id', models.CharField(max_length=30, unique=True, verbose_name='external id')),
+                ('content_hash', models.CharField(max_length=40, verbose_name='content hash')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'ProductFingerprint',
+                'verbose_name_plural': 'ProductFingerprint',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawledImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=255, unique=True, verbose_name='url')),
+                ('content_hash', models.CharField(db_index=True, max_length=40, verbose_name='content hash')),
+                ('image', models.CharField(max_length=100, verbose_name='image')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'CrawledImage',
+                'verbose_name_plural': 'CrawledImage',
+            },
+        ),
+    ]
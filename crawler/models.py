@@ -0,0 +1,48 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class ProductFingerprint(models.Model):
+    """Hash of the last saved content of a crawled product. Product is not written again if its hash is the same"""
+    external_id = models.CharField(verbose_name=_('external id'), max_length=30, unique=True)
+    content_hash = models.CharField(verbose_name=_('content hash'), max_length=40)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'ProductFingerprint'
+        verbose_name_plural = 'ProductFingerprint'
+
+    def __str__(self):
+        return f'{self.external_id}: {self.content_hash}'
+
+
+class PageValidator(models.Model):
+    """'ETag' and 'Last-Modified' of the crawled pages, used to send conditional requests"""
+    url = models.CharField(verbose_name=_('url'), max_length=255, unique=True)
+    etag = models.CharField(verbose_name=_('etag'), max_length=100, blank=True)
+    last_modified = models.CharField(verbose_name=_('last modified'), max_length=50, blank=True)
+    # Total number of products of the category. Needed when the first listing page is not modified
+    total = models.PositiveIntegerField(verbose_name=_('total'), default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'PageValidator'
+        verbose_name_plural = 'PageValidator'
+
+    def __str__(self):
+        return self.url
+
+
+class CrawledImage(models.Model):
+    """Stored file of every downloaded image url, so an image url is never downloaded twice"""
+    url = models.CharField(verbose_name=_('url'), max_length=255, unique=True)
+    content_hash = models.CharField(verbose_name=_('content hash'), max_length=40, db_index=True)
+    image = models.CharField(verbose_name=_('image'), max_length=100)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'CrawledImage'
+        verbose_name_plural = 'CrawledImage'
+
+    def __str__(self):
+        return self.url
@@ -0,0 +1,84 @@
+"""
+Map Trendyol json payloads to plain product records that 'crawler.ingest' saves in 'product' app models.
+
+A product record is a dictionary like this:
+    {'external_id': '123', 'name': '...', 'description': '...', 'brand': 'Koton',
+     'category_path': ['Kadin', 'Giyim', 'Elbise'], 'price': Decimal('400'), 'discount': Decimal('100'),
+     'images': ['https://cdn.dsmcdn.com/...jpg'], 'url': 'https://www.trendyol.com/...'}
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from urllib.parse import urljoin
+
+from django.conf import settings
+
+
+# Trendyol returns 24 products in every listing page
+LISTING_PAGE_SIZE = 24
+
+
+def listing_url(path, page):
+    """Url of the 'page'th listing page of a category (eg: 'kadin-elbise-x-g1-c56')"""
+    return f'{settings.CRAWLER_BASE_URL}/discovery-web-searchgw-service/v2/api/infinite-scroll/{path}?pi={page}'
+
+
+def product_url(external_id):
+    """Url of the product detail api"""
+    return f'{settings.CRAWLER_BASE_URL}/discovery-web-productgw-service/api/productDetail/{external_id}'
+
+
+def to_price(value):
+    """Prices are stored without decimal places in 'Product'"""
+    return Decimal(str(value or 0)).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+
+
+def _image_urls(images):
+    return [urljoin(settings.CRAWLER_IMAGE_BASE_URL, image) for image in images or []]
+
+
+def _category_path(hierarchy, name):
+    path = [part.strip() for part in (hierarchy or '').split('/') if part.strip()]
+    return path or ([name] if name else [])
+
+
+def parse_listing_product(item):
+    """Map one product of the listing page to product record"""
+    price = item.get('price') or {}
+    original = to_price(price.get('originalPrice') or price.get('sellingPrice'))
+    selling = to_price(price.get('discountedPrice') or price.get('sellingPrice') or original)
+    brand = item.get('brand') or {}
+    return {
+        'external_id': str(item['id']),
+        'name': item.get('name', '').strip(),
+        'description': '',
+        'brand': (brand.get('name') or '').strip(),
+        'category_path': _category_path(item.get('categoryHierarchy'), item.get('categoryName')),
+        'price': original,
+        'discount': max(original - selling, Decimal(0)),
+        'images': _image_urls(item.get('images')),
+        'url': urljoin('https://www.trendyol.com', item.get('url', '')),
+    }
+
+
+def parse_listing(payload):
+    """Return products records of a listing page and total number of products in the category"""
+    result = payload.get('result') or {}
+    records = [parse_listing_product(item) for item in result.get('products') or [] if item.get('id')]
+    return records, int(result.get('totalCount') or 0)
+
+
+def parse_product(payload):
+    """Map product detail payload to product record"""
+    result = payload.get('result') or {}
+    record = parse_listing_product({
+        'id': result['id'],
+        'name': result.get('name'),
+        'brand': result.get('brand'),
+        'categoryHierarchy': (result.get('category') or {}).get('hierarchy'),
+        'categoryName': (result.get('category') or {}).get('name'),
+        'price': result.get('price'),
+        'images': result.get('images'),
+        'url': result.get('url'),
+    })
+    descriptions = [d.get('description', '') for d in result.get('contentDescriptions') or []]
+    record['description'] = '\n'.join(d for d in descriptions if d)
+    return record
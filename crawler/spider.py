@@ -0,0 +1,214 @@
+"""
+Crawl Trendyol category listings (and optionally product details) concurrently.
+
+** First page of every category is fetched to know the number of pages and then all the other pages are fetched
+concurrently. 'CrawlerClient' takes care of bounding the number of requests in flight.
+
+** Parsed records of every page are sent to 'sink' while other pages are still downloading, so database writes do
+not stop the crawl. 'BatchSink' collects records of many pages and saves them in batches of thousands of products.
+"""
+import asyncio
+import math
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+
+from .client import CrawlerClient, FetchError
+from .fingerprints import load_validators, save_validators, request_headers
+from .images import ImagePipeline
+from .ingest import CatalogMap, ingest_products
+from .models import PageValidator
+from .parsers import LISTING_PAGE_SIZE, listing_url, product_url, parse_listing, parse_product
+
+
+class CrawlStats:
+    """Counters of a crawl run. Used to size the crawler (pages/sec and products/sec)"""
+    def __init__(self):
+        self.pages = 0
+        self.products = 0
+        self.saved = 0
+        self.failed = 0
+        self.not_modified = 0
+        self.requests = 0
+        self.retried = 0
+        self.images = None
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def skipped(self):
+        """Number of fetched products that were not written because they have not changed"""
+        return self.products - self.saved
+
+    @property
+    def pages_per_sec(self):
+        return self.pages / self.elapsed if self.elapsed else 0
+
+    @property
+    def products_per_sec(self):
+        return self.products / self.elapsed if self.elapsed else 0
+
+    def __str__(self):
+        images = ''
+        if self.images:
+            images = (f'{self.images.downloaded} images downloaded ({self.images.deduplicated} duplicates, '
+                      f'{self.images.failed} failed), {self.images.thumbnails} thumbnails '
+                      f'({self.images.thumbnails_failed} failed), ')
+        return (f'{self.pages} pages ({self.not_modified} not modified), {self.products} products '
+                f'({self.saved} changed, {self.skipped} skipped), {images}{self.requests} requests '
+                f'({self.retried} retried, {self.failed} failed) in {self.elapsed:.2f}s: '
+                f'{self.pages_per_sec:.1f} pages/s, {self.products_per_sec:.1f} products/s')
+
+
+class BatchSink:
+    """Collect records of the pages and send them to 'save' (a sync function) in batches of 'batch_size'"""
+    def __init__(self, save, batch_size):
+        self.save = sync_to_async(save)
+        self.batch_size = batch_size
+        self.records = []
+
+    async def __call__(self, records):
+        self.records.extend(records)
+        if len(self.records) < self.batch_size:
+            return 0
+        return await self.flush()
+
+    async def flush(self):
+        batch, self.records = self.records, []
+        return await self.save(batch) if batch else 0
+
+
+class Spider:
+    """
+    Crawl categories with the 'client' (an open 'CrawlerClient'). 'sink' is an async callable that receives the
+    product records of every page and returns number of saved products.
+    If 'conditional' is True, pages are requested with their 'ETag' and 'Last-Modified' of the last crawl and
+    pages that are not modified are skipped. 'images' is an 'ImagePipeline' that downloads images of the records.
+    """
+    def __init__(self, client, sink=None, max_pages=None, details=False, conditional=False, images=None):
+        self.client = client
+        self.sink = sink
+        self.images = images
+        self.max_pages = max_pages
+        self.details = details
+        self.conditional = conditional
+        self.stats = CrawlStats()
+        # Validators loaded from database and validators of the pages fetched in this crawl (saved at the end)
+        self.validators = dict()
+        self.new_validators = dict()
+
+    async def crawl(self, paths):
+        """Crawl all the category paths and return 'CrawlStats'"""
+        await asyncio.gather(*(self.crawl_category(path) for path in paths))
+        if isinstance(self.sink, BatchSink):
+            self.stats.saved += await self.sink.flush()
+        if self.images:
+            await self.images.close()
+            self.stats.images = self.images
+        if self.conditional:
+            # Validators are saved only after all the records are saved, otherwise a failed crawl could skip
+            # products that were never saved
+            validators = [v for v in self.new_validators.values() if v.etag or v.last_modified]
+            await sync_to_async(save_validators)(validators)
+        self.stats.finished = time.perf_counter()
+        return self.stats
+
+    async def crawl_category(self, path):
+        if self.conditional:
+            self.validators.update(await sync_to_async(load_validators)(url_prefix=listing_url(path, '')))
+        total = await self.crawl_page(path, 1)
+        last_page = math.ceil(total / LISTING_PAGE_SIZE)
+        if self.max_pages:
+            last_page = min(last_page, self.max_pages)
+        await asyncio.gather(*(self.crawl_page(path, page) for page in range(2, last_page + 1)))
+
+    async def fetch_payload(self, url):
+        """Fetch json of the url. Return None if the page is not modified since the last crawl"""
+        result = await self.client.fetch(url, headers=request_headers(self.validators.get(url)))
+        if result.status == 304:
+            self.stats.not_modified += 1
+            return None
+        if result.status != 200:
+            raise FetchError(f'{url} returned status {result.status}')
+        if self.conditional:
+            self.new_validators[url] = PageValidator(url=url,
+                                                     etag=result.headers.get('ETag', ''),
+                                                     last_modified=result.headers.get('Last-Modified', ''))
+        return result.json()
+
+    async def crawl_page(self, path, page):
+        """Fetch, parse and send one listing page to the sink. Return total number of products of the category"""
+        url = listing_url(path, page)
+        try:
+            payload = await self.fetch_payload(url)
+        except FetchError:
+            self.stats.failed += 1
+            return 0
+        if payload is None:
+            return self.validators[url].total
+        records, total = parse_listing(payload)
+        if url in self.new_validators:
+            self.new_validators[url].total = total
+        self.stats.pages += 1
+        self.stats.products += len(records)
+        if self.details:
+            if self.conditional:
+                urls = [product_url(record['external_id']) for record in records]
+                self.validators.update(await sync_to_async(load_validators)(urls=urls))
+            records = await asyncio.gather(*(self.fetch_detail(record) for record in records))
+            # Detail has all the saved fields, so products with a not modified detail are not changed
+            records = [record for record in records if record is not None]
+        if self.images:
+            await self.images(records)
+        if self.sink and records:
+            self.stats.saved += await self.sink(records)
+        return total
+
+    async def fetch_detail(self, record):
+        """
+        Complete the listing record with product detail (description). Listing record is kept if it failed and None
+        is returned if the detail is not modified since the last crawl (the product is saved with the detail then)
+        """
+        try:
+            payload = await self.fetch_payload(product_url(record['external_id']))
+        except FetchError:
+            self.stats.failed += 1
+            return record
+        if payload is None:
+            return None
+        detail = parse_product(payload)
+        return {**record, **{k: v for k, v in detail.items() if v}}
+
+
+def run_crawl(paths, concurrency=None, rate_per_host=None, retries=None, max_pages=None, details=False, save=True,
+              batch_size=None, incremental=True, images=False):
+    """
+    Crawl the category paths and save the products (if 'save'). It's used in sync codes like management commands.
+    'async_to_sync' is used instead of 'asyncio.run' so database writes happen in the caller thread.
+    If 'incremental' is False, all the pages are fetched and all the products are written even if not changed.
+    If 'images' is True, main image of the products are downloaded and their thumbnails are made.
+    """
+    if rate_per_host is None:
+        rate_per_host = settings.CRAWLER_RATE_PER_HOST
+
+    async def main():
+        async with CrawlerClient(concurrency=concurrency or settings.CRAWLER_CONCURRENCY,
+                                 rate_per_host=rate_per_host,
+                                 retries=settings.CRAWLER_RETRIES if retries is None else retries) as client:
+            sink = None
+            if save:
+                catalog = CatalogMap()
+                sink = BatchSink(lambda records: ingest_products(records, catalog, incremental=incremental),
+                                 batch_size or settings.CRAWLER_BATCH_SIZE)
+            spider = Spider(client, sink=sink, max_pages=max_pages, details=details,
+                            conditional=save and incremental,
+                            images=ImagePipeline(client) if images else None)
+            stats = await spider.crawl(paths)
+            stats.requests, stats.retried = client.requests, client.retried
+            return stats
+    return async_to_sync(main)()
@@ -0,0 +1,154 @@
+"""
+Local stand-in of Trendyol apis to test and benchmark the crawler without sending any request to Trendyol.
+
+** Server serves recorded pages from a directory (eg: 'crawler/test/pages') or synthetic pages made by
+'synthetic_catalog'. Files in the directory are named like this:
+    listing__<category path>__<page>.json
+    product__<product id>.json
+
+** Server speaks HTTP/1.1 so the crawler keep-alive connections could be tested. 'fail_first' makes the server
+answer with '503' to the first n requests to test retry of the crawler.
+
+** Every response has an 'ETag' (hash of the body) and server answers with '304' if 'If-None-Match' is the same.
+
+** 'files' are served as they are (eg: product images) with their path: {'/ty1/product/1.jpg': b'...'}
+"""
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+LISTING_PREFIX = '/discovery-web-searchgw-service/v2/api/infinite-scroll/'
+PRODUCT_PREFIX = '/discovery-web-productgw-service/api/productDetail/'
+
+
+def load_pages(directory):
+    """Load recorded listing pages and product details from the directory"""
+    listings, products = dict(), dict()
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith('.json'):
+            continue
+        with open(os.path.join(directory, file_name), encoding='utf-8') as f:
+            payload = json.load(f)
+        parts = file_name[:-len('.json')].split('__')
+        if parts[0] == 'listing':
+            listings[(parts[1], int(parts[2]))] = payload
+        elif parts[0] == 'product':
+            products[parts[1]] = payload
+    return listings, products
+
+
+def synthetic_catalog(categories=4, pages=10, page_size=24):
+    """Make listing pages and product details of a fake catalog with 'categories * pages * page_size' products"""
+    listings, products = dict(), dict()
+    total = pages * page_size
+    for c in range(categories):
+        path = f'synthetic-category-{c}'
+        for page in range(1, pages + 1):
+            items = []
+            for i in range(page_size):
+                product_id = str(c * total + (page - 1) * page_size + i + 1)
+                item = {
+                    'id': int(product_id),
+                    'name': f'Synthetic product {product_id}',
+                    'brand': {'id': product_id[-2:], 'name': f'Brand {int(product_id) % 50}'},
+                    'categoryHierarchy': f'Synthetic/Category {c}',
+                    'categoryName': f'Category {c}',
+                    'price': {'originalPrice': 100 + int(product_id) % 900, 'sellingPrice': 90 + int(product_id) % 900},
+                    'images': [f'/ty{c}/product/media/images/{product_id}/1.jpg'],
+                    'url': f'/brand/synthetic-product-p-{product_id}',
+                }
+                items.append(item)
+                products[product_id] = {'result': {**item, 'contentDescriptions': [
+                    {'description': f'Description of synthetic product {product_id}'}]}}
+            listings[(path, page)] = {'result': {'products': items, 'totalCount': total}}
+    return listings, products
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            with self.server.lock:
+                self.server.not_modified += 1
+            status, body = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status in (200, 304):
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_file(self, content):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            fail = server.requests <= server.fail_first
+        if fail:
+            return self.send_json(503, {'error': 'unavailable'})
+        url = urlsplit(self.path)
+        if url.path in server.files:
+            return self.send_file(server.files[url.path])
+        payload = None
+        if url.path.startswith(LISTING_PREFIX):
+            page = int(parse_qs(url.query).get('pi', ['1'])[0])
+            payload = server.listings.get((url.path[len(LISTING_PREFIX):], page))
+        elif url.path.startswith(PRODUCT_PREFIX):
+            payload = server.products.get(url.path[len(PRODUCT_PREFIX):])
+        if payload is None:
+            return self.send_json(404, {'error': 'not found'})
+        self.send_json(200, payload)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Run the server in a background thread:
+        with StandInServer(*load_pages(directory)) as server:
+            settings.CRAWLER_BASE_URL = server.url
+    """
+    daemon_threads = True
+
+    def __init__(self, listings, products, fail_first=0, files=None):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.listings = listings
+        self.products = products
+        self.files = files or dict()
+        self.fail_first = fail_first
+        self.requests = 0
+        self.not_modified = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
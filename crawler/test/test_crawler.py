@@ -0,0 +1,113 @@
+import os
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, SimpleTestCase, override_settings
+
+from crawler.client import CrawlerClient
+from crawler.parsers import parse_listing
+from crawler.spider import Spider, run_crawl
+from crawler.standin import StandInServer, load_pages
+from product.models import Category, Brand, Product
+
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), 'pages')
+CATEGORY_PATH = 'kadin-elbise-x-g1-c56'
+
+
+class TestParsers(SimpleTestCase):
+
+    def test_parse_listing(self):
+        """Test if listing payload mapped to product records properly"""
+        listings, products = load_pages(PAGES_DIR)
+        records, total = parse_listing(listings[(CATEGORY_PATH, 1)])
+
+        self.assertEqual(total, 27)
+        self.assertEqual(len(records), 24)
+        record = records[1]
+        self.assertEqual(record['external_id'], '700000137')
+        self.assertEqual(record['category_path'], ['Giyim', 'Elbise'])
+        self.assertEqual(record['brand'], 'LC Waikiki')
+        self.assertEqual(record['price'] - record['discount'], Decimal(round(record['price'] * Decimal('0.8'))))
+        self.assertTrue(record['images'][0].startswith('https://cdn.dsmcdn.com/ty901/'))
+
+
+class TestCrawl(TestCase):
+
+    def setUp(self) -> None:
+        self.listings, self.products = load_pages(PAGES_DIR)
+
+    def test_crawl_saves_products(self):
+        """Test if all the pages of the category crawled and products saved with their category and brand"""
+        with StandInServer(self.listings, self.products) as server, override_settings(CRAWLER_BASE_URL=server.url):
+            stats = run_crawl([CATEGORY_PATH], concurrency=4, rate_per_host=0)
+
+        self.assertEqual(stats.pages, 2)
+        self.assertEqual(stats.products, 27)
+        self.assertEqual(Product.objects.count(), 27)
+        self.assertEqual(Brand.objects.count(), 6)
+        dress = Category.objects.get(name='Elbise')
+        self.assertEqual(dress.parent.name, 'Giyim')
+        self.assertEqual(dress.product_category.count(), 27)
+
+    def test_crawl_details(self):
+        """Test if product details merged in listing records"""
+        with StandInServer(self.listings, self.products) as server, override_settings(CRAWLER_BASE_URL=server.url):
+            stats = run_crawl([CATEGORY_PATH], rate_per_host=0, retries=0, details=True)
+
+        # Only two product details are recorded, the other ones are failed requests
+        self.assertEqual(stats.failed, 25)
+        self.assertEqual(Product.objects.exclude(description='').count(), 2)
+
+    def test_incremental_crawl(self):
+        """Test if not modified pages and not changed products are skipped in the next crawl"""
+        with StandInServer(self.listings, self.products) as server, override_settings(CRAWLER_BASE_URL=server.url):
+            run_crawl([CATEGORY_PATH], rate_per_host=0)
+            updated = dict(Product.objects.values_list('external_id', 'updated'))
+            stats = run_crawl([CATEGORY_PATH], rate_per_host=0)
+
+            self.assertEqual(stats.not_modified, 2)
+            self.assertEqual(stats.saved, 0)
+            self.assertEqual(dict(Product.objects.values_list('external_id', 'updated')), updated)
+
+            # Change price of one product of the second page
+            self.listings[(CATEGORY_PATH, 2)]['result']['products'][0]['price']['originalPrice'] = 5000
+            stats = run_crawl([CATEGORY_PATH], rate_per_host=0)
+
+        self.assertEqual(stats.not_modified, 1)
+        self.assertEqual((stats.products, stats.saved, stats.skipped), (3, 1, 2))
+        self.assertEqual(Product.objects.filter(price=5000).count(), 1)
+
+    def test_not_modified_details(self):
+        """Test if products with a not modified detail are not written again when their listing page is changed"""
+        with StandInServer(self.listings, self.products) as server, override_settings(CRAWLER_BASE_URL=server.url):
+            run_crawl([CATEGORY_PATH], rate_per_host=0, retries=0, details=True)
+            updated = dict(Product.objects.values_list('external_id', 'updated'))
+            # Change price of a product without detail on every page, so the listings are modified
+            for page in (1, 2):
+                products = self.listings[(CATEGORY_PATH, page)]['result']['products']
+                product = next(p for p in products if str(p['id']) not in self.products)
+                product['price']['originalPrice'] = 5000
+            stats = run_crawl([CATEGORY_PATH], rate_per_host=0, retries=0, details=True)
+
+        self.assertEqual(stats.not_modified, 2)
+        self.assertEqual(stats.saved, 2)
+        self.assertEqual(Product.objects.exclude(description='').count(), 2)
+        for external_id in self.products:
+            self.assertEqual(Product.objects.get(external_id=external_id).updated, updated[external_id])
+
+    def test_retry_and_keep_alive(self):
+        """Test if failed requests retried and connections reused between requests"""
+        async def crawl():
+            async with CrawlerClient(concurrency=2, retries=3, backoff=0.01) as client:
+                stats = await Spider(client).crawl([CATEGORY_PATH])
+                return stats, client
+
+        with StandInServer(self.listings, self.products, fail_first=2) as server, \
+                override_settings(CRAWLER_BASE_URL=server.url):
+            stats, client = async_to_sync(crawl)()
+            connections = server.connections
+
+        self.assertEqual(stats.pages, 2)
+        self.assertEqual(client.retried, 2)
+        self.assertLess(connections, client.requests)
@@ -0,0 +1,92 @@
+import io
+import os
+import shutil
+import tempfile
+from urllib.parse import urlsplit
+
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from crawler.models import PageValidator
+from crawler.parsers import parse_listing
+from crawler.spider import run_crawl
+from crawler.standin import StandInServer, load_pages
+from product.models import Product
+
+from .test_crawler import PAGES_DIR, CATEGORY_PATH
+
+
+def make_image(color):
+    content = io.BytesIO()
+    Image.new('RGB', (1200, 1800), color).save(content, format='JPEG')
+    return content.getvalue()
+
+
+class TestImagePipeline(TestCase):
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.listings, self.products = load_pages(PAGES_DIR)
+        # Every 3 products (color variants) have the same image with diffrent urls
+        self.files = dict()
+        for page in (1, 2):
+            records, total = parse_listing(self.listings[(CATEGORY_PATH, page)])
+            for record in records:
+                index = (int(record['external_id']) - 700000000) // 137
+                self.files[urlsplit(record['images'][0]).path] = make_image((index // 3 * 25, 0, 0))
+        self.server = StandInServer(self.listings, self.products, files=self.files).__enter__()
+
+    def tearDown(self) -> None:
+        self.server.__exit__()
+        shutil.rmtree(self.media_root)
+
+    def crawl(self, **kwargs):
+        with override_settings(CRAWLER_BASE_URL=self.server.url, CRAWLER_IMAGE_BASE_URL=self.server.url,
+                               MEDIA_ROOT=self.media_root, CRAWLER_IMAGE_WORKERS=2):
+            return run_crawl([CATEGORY_PATH], rate_per_host=0, images=True, **kwargs)
+
+    def stored_files(self, directory):
+        return [os.path.join(root, name) for root, dirs, files in os.walk(os.path.join(self.media_root, directory))
+                for name in files]
+
+    def test_images_deduplicated(self):
+        """Test if identical images stored once and all the products have their image"""
+        stats = self.crawl()
+
+        self.assertEqual(stats.images.downloaded, 27)
+        self.assertEqual(stats.images.deduplicated, 18)
+        self.assertEqual(len(self.stored_files('products')), 9)
+        self.assertFalse(Product.objects.filter(image='').exists())
+        self.assertEqual(Product.objects.values('image').distinct().count(), 9)
+
+    def test_thumbnails_pre_generated(self):
+        """Test if sorl-thumbnail finds the pre-generated thumbnails and does not make them again"""
+        stats = self.crawl()
+        thumbnails = self.stored_files('cache')
+
+        self.assertEqual(stats.images.thumbnails, 9 * 3)
+        self.assertEqual(len(thumbnails), 9 * 3)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            thumbnail = get_thumbnail(Product.objects.first().image, '300x300', crop='center')
+            self.assertIn(os.path.join(self.media_root, thumbnail.name), thumbnails)
+        self.assertEqual(len(self.stored_files('cache')), 9 * 3)
+
+    def test_broken_image(self):
+        """Test if an image whose thumbnails are not made is counted and the crawl is finished"""
+        self.files[next(iter(self.files))] = b'not an image'
+        with self.assertLogs('crawler.images', 'WARNING'):
+            stats = self.crawl()
+
+        self.assertEqual(stats.images.thumbnails_failed, 1)
+        self.assertEqual(stats.images.thumbnails, 9 * 3)
+        self.assertEqual(stats.saved, Product.objects.count())
+        self.assertTrue(PageValidator.objects.exists())
+
+    def test_urls_downloaded_once(self):
+        """Test if image urls of the previous crawls are not downloaded again"""
+        self.crawl()
+        stats = self.crawl(incremental=False)
+
+        self.assertEqual(stats.images.downloaded, 0)
+        self.assertFalse(Product.objects.filter(image='').exists())
@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from crawler.ingest import CatalogMap, ingest_products
+from product.models import Category, Brand, Product
+
+
+def make_record(external_id, name, price=100, brand='Koton', description=''):
+    return {'external_id': external_id, 'name': name, 'description': description, 'brand': brand,
+            'category_path': ['Giyim', 'Elbise'], 'price': Decimal(price), 'discount': Decimal(0),
+            'images': [], 'url': ''}
+
+
+class TestUpsert(TestCase):
+
+    def test_upsert_by_external_id(self):
+        """Test if crawled products are updated by their external id and not duplicated"""
+        ingest_products([make_record('1', 'Siyah Elbise'), make_record('2', 'Mavi Elbise', description='Pamuk')])
+        ingest_products([make_record('1', 'Siyah Elbise', price=80), make_record('2', 'Mavi Elbise')])
+
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(Product.objects.get(external_id='1').price, 80)
+        # Listing records have no description so description of the product is kept
+        self.assertEqual(Product.objects.get(external_id='2').description, 'Pamuk')
+
+    def test_unchanged_products_skipped(self):
+        """Test if products are not written again when their content has not changed"""
+        records = [make_record('1', 'Siyah Elbise'), make_record('2', 'Mavi Elbise')]
+        self.assertEqual(ingest_products(records), 2)
+        updated = dict(Product.objects.values_list('external_id', 'updated'))
+        records[1]['price'] = Decimal(90)
+
+        self.assertEqual(ingest_products(records), 1)
+        self.assertEqual(Product.objects.get(external_id='1').updated, updated['1'])
+        self.assertNotEqual(Product.objects.get(external_id='2').updated, updated['2'])
+        # Full sync writes all the records
+        self.assertEqual(ingest_products(records, incremental=False), 2)
+
+    def test_slug_collisions(self):
+        """Test if products with the same name get unique slugs and slugs do not change after update"""
+        Product.objects.create(name='Siyah Elbise', category=Category.objects.create(name='Other'), price=1, discount=0)
+        ingest_products([make_record('1', 'Siyah Elbise'), make_record('2', 'Siyah Elbise')])
+        slugs = dict(Product.objects.filter(external_id__isnull=False).values_list('external_id', 'slug'))
+        ingest_products([make_record('1', 'Siyah Elbise Yeni'), make_record('2', 'Siyah Elbise')])
+
+        self.assertEqual(slugs, {'1': 'siyah-elbise-1', '2': 'siyah-elbise-2'})
+        self.assertEqual(dict(Product.objects.filter(external_id__isnull=False).values_list('external_id', 'slug')),
+                         slugs)
+
+    def test_foreign_keys_resolved_in_memory(self):
+        """Test if number of queries does not grow with number of products, categories and brands"""
+        catalog = CatalogMap()
+        ingest_products([make_record('0', 'Warm up', brand='Brand 0')], catalog)
+        records = [make_record(str(i), f'Elbise {i}', brand=f'Brand {i % 5}') for i in range(1, 200)]
+        with CaptureQueriesContext(connection) as context:
+            ingest_products(records, catalog)
+        selects = [q['sql'] for q in context.captured_queries if q['sql'].startswith('SELECT')]
+
+        # Fingerprints, new brands, existing external ids, slug candidates, search documents and facet values.
+        # Categories are not queried at all
+        self.assertEqual(len(selects), 6)
+
+        self.assertEqual(Brand.objects.count(), 5)
+        self.assertEqual(Category.objects.get(name='Elbise').product_category.count(), 200)
@@ -0,0 +1,130 @@
+"""
+Password hashing of the login views out of the request path.
+
+** Checking or making a password is PBKDF2 with hundreds of thousands of iterations (~0.3s of CPU). Under ASGI, sync
+views run one at a time in one thread of the process, so a login burst makes every other page wait for the hashes.
+Login views are async (see 'login.views'): database queries run with 'sync_to_async' and hashes run in 'hashing', a
+pool of 'LOGIN_HASHING_WORKERS' threads ('hashlib.pbkdf2_hmac' releases the GIL, so they hash in parallel and other
+requests are served meanwhile). Hashes do not use the database, so the threads hold no connection.
+
+** At most 'LOGIN_HASHING_QUEUE' hashes wait for a thread. More logins are rejected at once ('HashingPoolFull') instead
+of making the queue (and the latency of every login) grow without bound. 'metrics' of the pool are the queue depth,
+its peak, the average wait, completed and rejected hashes of the process.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from asgiref.sync import sync_to_async
+
+
+class HashingPoolFull(Exception):
+    """All the threads of the pool are busy and its queue is full"""
+
+
+class HashingPool:
+    """Bounded thread pool of the password hashes of the process (shared by all the event loops)"""
+    def __init__(self, workers=None, queue=None):
+        self.workers = workers
+        self.queue = queue
+        self.lock = threading.Lock()
+        self.executor = None
+        self.reset()
+
+    def reset(self):
+        """Shut down the threads and clear the metrics (eg: when the settings are changed in tests)"""
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+            self.executor = None
+            # Submitted hashes (waiting or hashing), hashes in the threads and the counters
+            self.pending = 0
+            self.hashing = 0
+            self.peak_queued = 0
+            self.completed = 0
+            self.rejected = 0
+            self.wait_time = 0
+
+    @property
+    def max_workers(self):
+        return self.workers or settings.LOGIN_HASHING_WORKERS
+
+    @property
+    def limit(self):
+        """Hashes that may be submitted at the same time: one for every thread and the queue"""
+        return self.max_workers + (settings.LOGIN_HASHING_QUEUE if self.queue is None else self.queue)
+
+    def metrics(self):
+        with self.lock:
+            return {'workers': self.max_workers, 'limit': self.limit,
+                    'hashing': self.hashing, 'queued': self.pending - self.hashing, 'peak_queued': self.peak_queued,
+                    'completed': self.completed, 'rejected': self.rejected,
+                    'average_wait_ms': round(self.wait_time / max(self.completed, 1) * 1000, 2)}
+
+    def job(self, function, args, submitted):
+        started = time.perf_counter()
+        with self.lock:
+            self.hashing += 1
+            self.wait_time += started - submitted
+        try:
+            return function(*args)
+        finally:
+            with self.lock:
+                self.hashing -= 1
+
+    async def run(self, function, *args):
+        """Run the function in a thread of the pool. Raise 'HashingPoolFull' if the queue is full"""
+        with self.lock:
+            if self.pending >= self.limit:
+                self.rejected += 1
+                raise HashingPoolFull()
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hashing')
+            self.pending += 1
+            self.peak_queued = max(self.peak_queued, self.pending - self.max_workers)
+            future = self.executor.submit(self.job, function, args, time.perf_counter())
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            with self.lock:
+                self.pending -= 1
+                self.completed += 1
+
+
+hashing = HashingPool()
+
+
+def verify_password(password, encoded):
+    """(password is correct, new hash of the password if its hasher or iterations are changed) of the hashed password"""
+    if not check_password(password, encoded):
+        return False, None
+    preferred = get_hasher('default')
+    if identify_hasher(encoded).algorithm != preferred.algorithm or preferred.must_update(encoded):
+        return True, make_password(password)
+    return True, None
+
+
+async def authenticate(username, password):
+    """
+    Async 'django.contrib.auth.authenticate' of the model backend: the user is read with 'sync_to_async' and the
+    password is checked in the pool. Like the model backend, a password is hashed for an unknown username too, so
+    the time of the answer does not tell if the username exists
+    """
+    User = get_user_model()
+    try:
+        user = await sync_to_async(User._default_manager.get_by_natural_key)(username)
+    except User.DoesNotExist:
+        await hashing.run(make_password, password)
+        return None
+    correct, new_hash = await hashing.run(verify_password, password, user.password)
+    if not correct or not user.is_active:
+        return None
+    if new_hash:
+        user.password = new_hash
+        await sync_to_async(user.save)(update_fields=['password'])
+    user.backend = 'django.contrib.auth.backends.ModelBackend'
+    return user
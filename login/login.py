@@ -4,18 +4,29 @@ These functions defined for better code management and code modularity.
 """
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
-from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
+from account.uniqueness import taken_fields
+
 
 def user_signup_login(request, user):
     """
     Login user with session mode after which he/she signup to the website. Note that because we use more
     than one (default) login backend, we must set backend the one we want. If we don't this we receive errors.
     """
+    user.set_password(user.password)
+    return save_signup_login(request, user)
+
+
+def save_signup_login(request, user):
+    """
+    Save and login the new user whose password is hashed. The new user is inserted once and its address is created in
+    the same transaction (see 'account.signals').
+    """
     try:
-        user.set_password(user.password)
-        user.save()
+        with transaction.atomic():
+            user.save()
         login(request, user, backend='django.contrib.auth.backends.ModelBackend')
         messages.success(request, _('Welcome to Green Apple'))
         # messages.success(request, _('به وبسایت گرین اپل خوش آمدید'))
@@ -46,20 +57,14 @@ def user_password_change(request, form):
 def user_change_validation_check_cleaner(request, form):
     """
     NOTE: 'username' does not needed here because username field validated before FORM.is_valid() method.
+    Changed fields are checked against the other users in one indexed query (see 'account.uniqueness').
     """
-    error = 0
-    # Just get needed fields for every users except for current user. Remember 'values' returns a list of dictionary
-    users_except_current_list = get_user_model().objects.exclude(id=request.user.id).values('username', 'email', 'phone')
-    # List of fields we want to search in form.changed_data
-    important_fields_list = ['username', 'email', 'phone']
-    for field in form.changed_data:
-        if field in important_fields_list:
-            field_value = form.cleaned_data[field]
-            for user_dict in users_except_current_list:
-                if field_value in user_dict.values():
-                    messages.error(request, _(f"This {field} is already register"))
-                    error += 1
-    return error
+    changed = {field: form.cleaned_data[field] for field in form.changed_data if field in ('username', 'email', 'phone')}
+    taken = taken_fields(changed, exclude=request.user.id)
+    for field in changed:
+        if field in taken:
+            messages.error(request, _(f"This {field} is already register"))
+    return len(taken)
 
 
 def change_user_account_data(request, user, form):
@@ -0,0 +1,167 @@
+"""
+Load benchmark of a login burst with catalog traffic under ASGI:
+    python manage.py bench_login_load --clients 32 --seconds 10 --logins 0.2
+Requests are sent to Django's ASGI handler in this process (no network and server). Every client sends a login (with
+probability 'logins') or a catalog page and waits for the answer, for 'seconds'. It's run twice: with the old sync
+login view (authenticate and login in the view, like every sync view it runs in the one thread of the sync views) and
+with the async view that hashes in the pool (see 'login.hashing'). p50/p99 latency of the logins and catalog pages
+are reported. Benchmark users and products are deleted at the end.
+
+This module is the urlconf of the benchmark too. django-silk and debug toolbar are not used (they save and explain
+every request).
+"""
+import asyncio
+import json
+import random
+import statistics
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test.utils import override_settings
+from django.urls import path
+
+from account.uniqueness import set_lookup_fields
+from login import views
+from login.hashing import hashing
+from product.models import Category, Product
+from product.views import ProductViewSet
+
+
+def sync_login(request):
+    """'login.views.classic_login' before the hashing pool"""
+    data = json.loads(request.POST['data'])
+    user = authenticate(request, username=data['username'], password=data['password'])
+    if user:
+        views.login_synch_cart(request, user)
+        return JsonResponse(data={'msg': 'ورود با موفقیت انجام گرفت', 'status': 'ok', 'code': 200})
+    return JsonResponse(data={'msg': 'نام کاربری یا رمز عبور اشتباه است', 'status': 'nok', 'code': 401})
+
+
+urlpatterns = [
+    path('sync-login/', sync_login),
+    path('login/', views.classic_login),
+    path('catalog/', ProductViewSet.as_view({'get': 'list'})),
+]
+
+# Unmasked csrf token of every client (cookie and header)
+CSRF_TOKEN = 'b' * 32
+MIDDLEWARE = [name for name in settings.MIDDLEWARE if not name.startswith(('silk.', 'debug_toolbar.'))]
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-login'}}
+
+
+async def send_request(application, method, url, body=b''):
+    """Send the request to the ASGI application and return (status, body)"""
+    path, _, query = url.partition('?')
+    headers = [(b'cookie', f'csrftoken={CSRF_TOKEN}'.encode()), (b'x-csrftoken', CSRF_TOKEN.encode())]
+    if body:
+        headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+             'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+             'headers': headers, 'client': ('127.0.0.1', 40000), 'server': ('testserver', 80)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'body': b''}
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # The client does not disconnect
+        return await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+
+    await application(scope, receive, send)
+    return response['status'], response['body']
+
+
+def percentile(values, p):
+    return statistics.quantiles(values, n=100)[p - 1] * 1000 if len(values) > 1 else 0
+
+
+class Command(BaseCommand):
+    help = 'Compare p50/p99 latency of logins and catalog pages with the sync and the async login view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=32)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--logins', type=float, default=0.2, help='Probability of a login request')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--products', type=int, default=200)
+
+    def seed(self, options):
+        User = get_user_model()
+        password = make_password('bench-password')
+        User.objects.bulk_create([set_lookup_fields(User(username=f'bench-login-{i}', slug=f'bench-login-{i}',
+                                                         password=password)) for i in range(options['users'])])
+        category = Category.objects.create(name='Bench Login')
+        Product.objects.bulk_create([Product(category=category, name=f'Bench Login {i}', slug=f'bench-login-{i}',
+                                             price=100 + i, discount=0, quantity_available=10)
+                                     for i in range(options['products'])])
+        return category
+
+    def handle(self, *args, **options):
+        category = self.seed(options)
+        try:
+            with override_settings(ROOT_URLCONF=__name__, MIDDLEWARE=MIDDLEWARE, CACHES=LOCAL_CACHE):
+                for name, login_url in (('sync login view', '/sync-login/'), ('async login view', '/login/')):
+                    hashing.reset()
+                    results = asyncio.run(self.run(ASGIHandler(), login_url, options))
+                    self.report(name, results, options)
+                    if login_url == '/login/':
+                        self.stdout.write(f'    hashing pool: {hashing.metrics()}')
+        finally:
+            hashing.reset()
+            Product.objects.filter(category=category).delete()
+            category.delete()
+            get_user_model().objects.filter(username__startswith='bench-login-').delete()
+
+    async def run(self, application, login_url, options):
+        results = {'login': [], 'catalog': [], 'rejected': 0, 'failed': 0}
+        logins = [urlencode({'data': json.dumps({'username': f'bench-login-{i}', 'password': 'bench-password'})})
+                  .encode() for i in range(options['users'])]
+        # Load the urlconf and the caches of the process
+        await send_request(application, 'GET', '/catalog/?page_size=20')
+        await send_request(application, 'POST', login_url, logins[0])
+        stop = time.perf_counter() + options['seconds']
+
+        async def client(number):
+            generator = random.Random(number)
+            while time.perf_counter() < stop:
+                is_login = generator.random() < options['logins']
+                started = time.perf_counter()
+                if is_login:
+                    status, body = await send_request(application, 'POST', login_url, generator.choice(logins))
+                else:
+                    status, body = await send_request(application, 'GET', '/catalog/?page_size=20')
+                elapsed = time.perf_counter() - started
+                code = json.loads(body).get('code') if is_login and status == 200 else status
+                if code == 503:
+                    results['rejected'] += 1
+                elif code != 200:
+                    results['failed'] += 1
+                else:
+                    results['login' if is_login else 'catalog'].append(elapsed)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(options['clients'])))
+        # Requests sent before the stop are waited for
+        results['elapsed'] = time.perf_counter() - started
+        return results
+
+    def report(self, name, results, options):
+        self.stdout.write(f'{name} ({options["clients"]} clients, {options["logins"]:.0%} logins, '
+                          f'{results["elapsed"]:.1f}s with the last answers): {results["rejected"]} logins rejected, '
+                          f'{results["failed"]} failed')
+        for kind in ('login', 'catalog'):
+            timings = results[kind]
+            self.stdout.write(f'    {kind:8} {len(timings):6} requests {len(timings) / options["seconds"]:7.1f}/s '
+                              f'p50 {percentile(timings, 50):8.1f}ms  p99 {percentile(timings, 99):8.1f}ms')
@@ -1,6 +1,15 @@
-from django.test import TestCase, Client
+import asyncio
+import json
+import threading
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from login.hashing import hashing, HashingPoolFull
 
 
 class TestLoginViews(TestCase):
@@ -43,3 +52,80 @@ class TestLoginViews(TestCase):
         response = self.client.post(url, data=post_data)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()['status'], 400)
+
+
+class TestSignupWrites(TestCase):
+    """Test that a signup writes the new user and its address once"""
+    def test_sign_up_writes(self):
+        url = reverse('login:signup')
+        post_data = {'data': [f'{{"username": "09351112233", "password": "123456"}}']}
+        with CaptureQueriesContext(connection) as captured:
+            self.client.post(url, data=post_data)
+        # Tables of the writes (django-silk saves the queries too)
+        writes = [query['sql'].split('"')[1] for query in captured.captured_queries
+                  if query['sql'].startswith(('INSERT', 'UPDATE'))]
+        writes = [table for table in writes if table.startswith('account_')]
+        # 'last_login' of the user is updated by 'login'
+        self.assertEqual(writes, ['account_user', 'account_address', 'account_user'])
+        self.assertIn('"last_login"', [query['sql'] for query in captured.captured_queries
+                                        if query['sql'].startswith('UPDATE "account_user"')][0])
+        user = get_user_model().objects.select_related('address_user').get(username='09351112233')
+        self.assertEqual((user.phone, user.phone_lookup, user.address_user.user_id), (user.username, user.username,
+                                                                                      user.pk))
+
+
+class TestHashingPool(TestCase):
+    """Test async login views with the password hashing pool"""
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='ehsan@gmail.com', password='123456')
+        hashing.reset()
+
+    def tearDown(self):
+        hashing.reset()
+
+    def post(self, name, data):
+        return self.client.post(reverse(name), data={'data': json.dumps(data)}).json()
+
+    def test_login(self):
+        """Passwords are checked in the pool and its metrics are counted"""
+        login = {'username': 'ehsan@gmail.com', 'password': '123456'}
+        self.assertEqual(self.post('login:classic-login', login)['code'], 200)
+        self.assertEqual(self.post('login:classic-login', {**login, 'password': 'wrong'})['code'], 401)
+        # A password is hashed for the unknown usernames too
+        self.assertEqual(self.post('login:classic-login', {'username': 'unknown', 'password': '123456'})['code'], 401)
+        self.assertEqual({key: hashing.metrics()[key] for key in ('completed', 'rejected', 'hashing', 'queued')},
+                         {'completed': 3, 'rejected': 0, 'hashing': 0, 'queued': 0})
+
+    def test_password_change(self):
+        """New password is saved and the user stays signed in"""
+        self.client.force_login(self.user)
+        response = self.post('login:password-change', {'password': '123456', 'new-password': '654321'})
+        self.assertEqual(response['code'], 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('654321'))
+        self.assertEqual(self.post('login:password-change', {'password': '123456', 'new-password': '1'})['code'], 402)
+
+    @override_settings(LOGIN_HASHING_WORKERS=1, LOGIN_HASHING_QUEUE=1)
+    def test_full_pool(self):
+        """Logins are rejected when all the threads are busy and the queue is full"""
+        started, release = threading.Event(), threading.Event()
+
+        def blocked():
+            started.set()
+            release.wait(5)
+
+        async def fill():
+            # One hash in the thread and one in the queue
+            jobs = [asyncio.ensure_future(hashing.run(blocked)), asyncio.ensure_future(hashing.run(blocked))]
+            await asyncio.sleep(0)
+            await asyncio.to_thread(started.wait, 5)
+            metrics = hashing.metrics()
+            with self.assertRaises(HashingPoolFull):
+                await hashing.run(blocked)
+            release.set()
+            await asyncio.gather(*jobs)
+            return metrics
+
+        metrics = async_to_sync(fill)()
+        self.assertEqual((metrics['hashing'], metrics['queued'], metrics['peak_queued']), (1, 1, 1))
+        self.assertEqual((hashing.metrics()['rejected'], hashing.metrics()['completed']), (1, 2))
@@ -13,6 +13,7 @@ urlpatterns = [
     path('password-change', views.password_change, name='password-change'),
     path('edit-profile', views.edit_profile, name='edit-profile'),
     path('edit-profile-image', views.edit_profile_image, name='edit-profile-image'),
+    path('hashing-metrics/', views.hashing_metrics, name='hashing-metrics'),
 ]
 
 urlpatterns += [
@@ -3,39 +3,52 @@ from django.shortcuts import render, redirect
 from django.http import JsonResponse
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth import get_user_model
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout, update_session_auth_hash
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils.translation import gettext_lazy as _
 # from django.views.decorators.cache import cache_page, never_cache
-# from cart.models import Cart
+from asgiref.sync import sync_to_async
+from cart.models import Cart
 from .forms import UserPasswordChangeForm
-from .login import user_signup_login, user_password_change
-# from cart.cart_functions import synch_cart_session_cart_after_authentication
+from .hashing import hashing, authenticate as authenticate_async, HashingPoolFull
+from .login import save_signup_login
+from cart.cart_functions import synch_cart_session_cart_after_authentication
 
 import json
 
 
+def login_synch_cart(request, user):
+    login(request, user)
+    # Synchronize Cart data with cart session data after login
+    synch_cart_session_cart_after_authentication(Cart, request)
+
+
+def busy_response():
+    """Answer of the login views when the password hashing pool is full (see 'login.hashing')"""
+    return JsonResponse(data={'msg': 'سرور مشغول است، لطفا چند لحظه دیگر تلاش کنید', 'status': 'nok', 'code': 503})
+
+
 # @cache_page(60 * 15)
-def classic_login(request):
-    """Handles the classic or ordinary user login procedure"""
+async def classic_login(request):
+    """Handles the classic or ordinary user login procedure. The password is checked in the hashing pool"""
     if request.method == 'POST':
         data_json = request.POST['data']
         if not data_json:
             return JsonResponse(data={'msg': 'اطلاعاتی دریافت نشد', 'status': 'nok', 'code': 400})
         data = json.loads(data_json)
-        user = authenticate(request,
-                            username=data['username'],
-                            password=data['password'])
+        try:
+            user = await authenticate_async(username=data['username'], password=data['password'])
+        except HashingPoolFull:
+            return busy_response()
         if user:
-            login(request, user)
-            # Synchronize Cart data with cart session data after login
-            # synch_cart_session_cart_after_authentication(Cart, request)
+            await sync_to_async(login_synch_cart)(request, user)
             return JsonResponse(data={'msg': 'ورود با موفقیت انجام گرفت', 'status': 'ok', 'code': 200})
         else:
             return JsonResponse(data={'msg': 'نام کاربری یا رمز عبور اشتباه است', 'status': 'nok','code': 401})
     else:
-        return render(request, 'login/signin.html')
+        return await sync_to_async(render)(request, 'login/signin.html')
 
 
 @login_required
@@ -46,21 +59,30 @@ def logout_view(request):
     return redirect('vitrin:index')
 
 
+def signup_synch_cart(request, user):
+    if not save_signup_login(request, user):
+        return False
+    # Synchronize Cart data with cart session data after login
+    synch_cart_session_cart_after_authentication(Cart, request)
+    return True
+
+
 # @cache_page(60 * 15)
-def signup(request):
-    """SignUp user after user proceeds with signup form in 'user_signup_view"""
+async def signup(request):
+    """SignUp user after user proceeds with signup form in 'user_signup_view'. The password is hashed in the pool"""
     if request.method == 'POST':
         json_data = request.POST.get('data', None)
         if not json_data:
             return JsonResponse(data={'msg': 'داده ای دریافت نشد', 'status': 'nok', 'code': 401})
         data = json.loads(json_data)
-        new_user = get_user_model().objects.filter(username=data['username'])
-        if new_user.exists():
+        if await get_user_model().objects.filter(username=data['username']).aexists():
             return JsonResponse(data={'msg': f'کاربر {data["username"]} در حال حاضر وجود دارد', 'status': 'nok', 'code': 400})
-        new_user = get_user_model()(username=data['username'], password=data['password'])
-        if user_signup_login(request, new_user):
-            # Synchronize Cart data with cart session data after login
-            # synch_cart_session_cart_after_authentication(Cart, request)
+        try:
+            password = await hashing.run(make_password, data['password'])
+        except HashingPoolFull:
+            return busy_response()
+        new_user = get_user_model()(username=data['username'], password=password)
+        if await sync_to_async(signup_synch_cart)(request, new_user):
             # If user created successfully, direct him/her to his/her newly created profile
             return JsonResponse(data={'msg': f"کاربر جدید ساخته شد", 'status': 'ok', 'code': 201})
         # If there is a problem in 'user_signup_login' (eg: user could not login the website) redirect
@@ -68,29 +90,50 @@ def signup(request):
         return JsonResponse(data={'msg': 'کاربر جدید ایجاد شد اما لاگین انجام نشد', 'status': 'nok', 'code': 301})
     # If any method used except for 'POST', redirect user to 'login_signup' view
     else:
-        return render(request, 'login/signup.html')
+        return await sync_to_async(render)(request, 'login/signup.html')
 
 
-@login_required
-def password_change(request):
-    """Handles changing of user password"""
+def save_password(request, user):
+    user.save(update_fields=['password'])
+    # The session of the user is kept (its hash of the password is changed)
+    update_session_auth_hash(request, user)
+
+
+async def password_change(request):
+    """
+    Handles changing of user password. 'login_required' of Django 4.2 does not support async views, so the user is
+    checked in the view. Both passwords are hashed in the pool
+    """
+    username = await sync_to_async(lambda: request.user.is_authenticated and request.user.username)()
+    if not username:
+        return redirect_to_login(request.get_full_path())
     if request.method == 'POST':
         json_data = request.POST.get('data', None)
         if not json_data:
             return JsonResponse(data={'msg': 'داده ای دریافت نشد', 'status': 'nok', 'code': 400})
         data = json.loads(json_data)
-        user = authenticate(request, username=request.user.username, password=data['password'])
-        if not user:
-            return JsonResponse(data={'msg': 'رمز عبور اشتباه است', 'status': 'nok', 'code': 402})
-        # If current password is valid, change user password with new-password
-        user.password = make_password(data['new-password'])
-        # user.save()
+        try:
+            user = await authenticate_async(username=username, password=data['password'])
+            if not user:
+                return JsonResponse(data={'msg': 'رمز عبور اشتباه است', 'status': 'nok', 'code': 402})
+            # If current password is valid, change user password with new-password
+            user.password = await hashing.run(make_password, data['new-password'])
+        except HashingPoolFull:
+            return busy_response()
+        await sync_to_async(save_password)(request, user)
         return JsonResponse(data={'msg': 'رمز عبور با موفقیت تغییر داده شد', 'status': 'ok', 'code': 200})
     # Any request method except for the 'POST" resulted in following error
     else:
         return JsonResponse(data={'msg': 'متد درخواستی اشتباه است', 'status': 'nok', 'code': 401})
 
 
+def hashing_metrics(request):
+    """Queue depth and counters of the password hashing pool of this process (for the staff)"""
+    if not request.user.is_staff:
+        return JsonResponse(data={'msg': 'دسترسی ندارید', 'status': 'nok', 'code': 403})
+    return JsonResponse(data={'msg': 'ok', 'status': 'ok', 'code': 200, 'metrics': hashing.metrics()})
+
+
 @login_required
 def edit_profile(request):
     """Edit user profile from dashboard"""
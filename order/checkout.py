@@ -0,0 +1,59 @@
+"""
+Turn the cart of a user into an order and reserve the stock of its products (see 'order.inventory').
+
+** The cart is priced with one query (see 'cart.pricing') and the prices are saved in the order as 'OrderLine'
+snapshots (one bulk insert) with the totals of the order. So later changes of the products never change the order.
+
+** Everything is written in one transaction. If there is not enough stock of any product nothing is saved. The first
+statement increases the cart version only if the cart is not changed after it's priced (and SQLite can not turn a
+read transaction into a write transaction when other writers are waiting, so writing first avoids 'database is
+locked' errors).
+"""
+from django.db import transaction
+from django.db.models import F
+
+from cart.models import Cart
+from .inventory import reserve_stock
+from .models import Order, OrderLine
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class CartChanged(Exception):
+    pass
+
+
+def create_order(user, cart, price):
+    """Save the order of the priced cart with its lines. Raise 'CartChanged' if the cart changed after the price"""
+    with transaction.atomic():
+        if not Cart.objects.filter(pk=cart.pk, version=price.version).update(version=F('version') + 1):
+            raise CartChanged(f'cart {cart.pk} is changed')
+        order = Order.objects.create(user=user, cart=cart, subtotal=price.subtotal,
+                                     product_discount=price.product_discount, user_discount=price.user_discount,
+                                     total=price.total)
+        OrderLine.objects.bulk_create([OrderLine(order=order, product_id=line.product_id, name=line.name,
+                                                 unit_price=line.unit_price, unit_discount=line.unit_discount,
+                                                 quantity=line.quantity, total=line.total)
+                                       for line in price.lines.values()])
+        reserve_stock(order, {line.product_id: line.quantity for line in price.lines.values()})
+    cart.version = price.version + 1
+    return order
+
+
+def checkout(user, cart, retries=3):
+    """
+    Make the order of the cart. Raise 'EmptyCart' or 'order.inventory.InsufficientStock' if it's not possible.
+    If the cart changes while it's being ordered (eg: in another tab) it's priced again
+    """
+    for attempt in range(retries):
+        price = cart.get_price(cached=False)
+        if not price.lines:
+            raise EmptyCart(f'cart {cart.pk} is empty')
+        try:
+            return create_order(user, cart, price)
+        except CartChanged:
+            if attempt == retries - 1:
+                raise
+            cart.refresh_from_db(fields=['version'])
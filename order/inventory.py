@@ -0,0 +1,104 @@
+"""
+Stock of the products for checkout.
+
+** Stock ('Product.quantity_available') is never read and saved. It's changed with conditional updates, so concurrent
+checkouts of a hot product never sell more than the stock: all the lines of an order are taken with one statement
+    UPDATE product SET quantity_available = quantity_available - CASE id WHEN .. THEN n .. END
+    WHERE id IN (..) AND quantity_available >= CASE id WHEN .. THEN n .. END
+and if fewer rows than the lines are updated the transaction is rolled back.
+
+** Taken stock is reserved for the order ('StockReservation') for 'ORDER_RESERVATION_TIMEOUT' seconds. Reservations
+of paid orders are confirmed (the stock is kept for good). Expired reservations are given back to the stock before
+every checkout of the same products and by 'manage.py release_reservations'.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, Value, F, Sum
+from django.utils import timezone
+
+from product.models import Product
+from .models import StockReservation
+
+
+class InsufficientStock(Exception):
+    """Stock of some products is less than the ordered quantities. 'products' is 'product id: available quantity'"""
+    def __init__(self, products):
+        super().__init__(f'not enough stock of the products: {", ".join(map(str, products))}')
+        self.products = products
+
+
+def by_product(quantities):
+    """'CASE id WHEN .. THEN quantity' of the quantities ('product id: quantity')"""
+    return Case(*[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()])
+
+
+def take_stock(quantities):
+    """
+    Take the quantities ('product id: quantity') from the stock with one statement. Nothing is taken and
+    'InsufficientStock' is raised if there is not enough stock of any product
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+    # Raising the error in the atomic block rolls back the products that are updated
+    with transaction.atomic():
+        updated = Product.objects.filter(pk__in=quantities, quantity_available__gte=by_product(quantities))\
+            .update(quantity_available=F('quantity_available') - by_product(quantities))
+        if updated != len(quantities):
+            available = dict(Product.objects.filter(pk__in=quantities).values_list('pk', 'quantity_available'))
+            raise InsufficientStock({product_id: available.get(product_id, 0) for product_id, quantity
+                                     in quantities.items() if available.get(product_id, 0) < quantity})
+
+
+def give_back_stock(quantities):
+    """Add the quantities ('product id: quantity') to the stock with one statement"""
+    if quantities:
+        Product.objects.filter(pk__in=quantities)\
+            .update(quantity_available=F('quantity_available') + by_product(quantities))
+
+
+def reserve_stock(order, quantities):
+    """Take the stock of the order lines and reserve it for the order. Raise 'InsufficientStock' if it's not enough"""
+    with transaction.atomic():
+        release_expired_reservations(products=list(quantities))
+        take_stock(quantities)
+        expires = timezone.now() + timedelta(seconds=settings.ORDER_RESERVATION_TIMEOUT)
+        StockReservation.objects.bulk_create([StockReservation(order=order, product_id=product_id,
+                                                               quantity=quantity, expires=expires)
+                                              for product_id, quantity in quantities.items() if quantity > 0])
+
+
+def release_expired_reservations(products=None):
+    """Give back stock of the expired reservations (only of the products if they are given). Return their number"""
+    with transaction.atomic():
+        expired = StockReservation.objects.filter(expires__lte=timezone.now())
+        if products is not None:
+            expired = expired.filter(product__in=products)
+        # Rows are locked in databases that support it, so a reservation is never given back twice
+        ids = list(expired.select_for_update(skip_locked=True).values_list('id', flat=True))
+        if not ids:
+            return 0
+        quantities = dict(StockReservation.objects.filter(id__in=ids).values('product')
+                          .annotate(total=Sum('quantity')).values_list('product', 'total'))
+        StockReservation.objects.filter(id__in=ids).delete()
+        give_back_stock(quantities)
+        return len(ids)
+
+
+def confirm_reservations(order):
+    """
+    Keep the reserved stock of the paid order. If its reservations are expired (and given back) the stock is taken
+    again. Return False if there is not enough stock anymore. It must run in a transaction
+    """
+    # Stock of the reservations that still exist is taken (even if they are expired), given back ones are deleted
+    reserved = dict(order.stock_reservation_order.select_for_update().values_list('product', 'quantity'))
+    order.stock_reservation_order.all().delete()
+    missing = {product_id: quantity - reserved.get(product_id, 0)
+               for product_id, quantity in order.get_quantities().items()}
+    try:
+        take_stock(missing)
+    except InsufficientStock:
+        return False
+    return True
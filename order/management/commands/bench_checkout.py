@@ -0,0 +1,87 @@
+"""
+Benchmark parallel checkouts of a few hot products (checkouts/sec) and check that stock is never oversold:
+    python manage.py bench_checkout --threads 16 --checkouts 50 --products 3 --stock 300
+Every checkout orders 1 or 2 of every hot product. At the end the sold quantities must be equal to the reserved
+quantities and to the stock that is taken. Benchmark objects are deleted at the end.
+"""
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.db.models import Sum
+
+from cart.models import Cart, CartItem
+from order.checkout import checkout
+from order.inventory import InsufficientStock
+from order.models import StockReservation
+from product.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent checkouts of hot products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--checkouts', type=int, default=50, help='Number of checkouts of every thread')
+        parser.add_argument('--products', type=int, default=3)
+        parser.add_argument('--stock', type=int, default=300, help='Stock of every product')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create_user(username='checkout-benchmark')
+        category = Category.objects.create(name='Checkout benchmark')
+        products = [Product.objects.create(category=category, name=f'Checkout benchmark {i}', price=100, discount=0,
+                                           quantity_available=options['stock'])
+                    for i in range(options['products'])]
+        try:
+            self.run(user, products, options)
+        finally:
+            category.delete()
+            user.delete()
+
+    def run(self, user, products, options):
+        carts = []
+        for i in range(options['threads'] * options['checkouts']):
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.add_quantities(cart.pk, {product.pk: random.randint(1, 2) for product in products})
+            carts.append(cart)
+        ordered = dict(CartItem.objects.filter(cart__in=carts).values('product').annotate(total=Sum('quantity'))
+                       .values_list('product', 'total'))
+        barrier = threading.Barrier(options['threads'])
+        results = {'ok': 0, 'insufficient': 0, 'errors': 0}
+
+        def worker(carts):
+            barrier.wait()
+            try:
+                for cart in carts:
+                    try:
+                        checkout(user, cart)
+                        results['ok'] += 1
+                    except InsufficientStock:
+                        results['insufficient'] += 1
+                    except OperationalError:    # 'database is locked' of SQLite
+                        results['errors'] += 1
+            finally:
+                connection.close()
+
+        chunk = options['checkouts']
+        threads = [threading.Thread(target=worker, args=(carts[i:i + chunk],)) for i in range(0, len(carts), chunk)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        stock = dict(Product.objects.filter(pk__in=ordered).values_list('pk', 'quantity_available'))
+        reserved = dict(StockReservation.objects.filter(product__in=ordered).values('product')
+                        .annotate(total=Sum('quantity')).values_list('product', 'total'))
+        oversold = [pk for pk in ordered if stock[pk] < 0 or options['stock'] - stock[pk] != reserved.get(pk, 0)]
+        self.stdout.write(f'{len(carts)} checkouts of {len(products)} products ({sum(ordered.values())} units ordered, '
+                          f'{len(products) * options["stock"]} in stock) from {options["threads"]} threads in '
+                          f'{elapsed:.2f}s: {len(carts) / elapsed:.0f} checkouts/s')
+        self.stdout.write(f'{results["ok"]} ordered, {results["insufficient"]} out of stock, {results["errors"]} errors, '
+                          f'sold {sum(reserved.values())} units, stock left {stock}, '
+                          f'{"OVERSOLD: " + str(oversold) if oversold else "no overselling"}')
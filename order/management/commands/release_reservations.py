@@ -0,0 +1,15 @@
+"""
+Give back stock of the expired reservations of the unpaid orders. It should run periodically (eg: every minute with
+cron), checkouts release expired reservations of their own products too.
+"""
+from django.core.management.base import BaseCommand
+
+from order.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Give back stock of the expired reservations'
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(f'{released} reservations released')
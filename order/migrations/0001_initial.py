@@ -0,0 +1,33 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('cart', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(blank=True, editable=False, max_length=10, verbose_name='order_id')),
+                ('slug', models.SlugField(blank=True, editable=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('is_paid', models.BooleanField(default=False, verbose_name='is paid')),
+                ('is_completed', models.BooleanField(default=False)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_cart', to='cart.cart', verbose_name='cart')),
+                ('items', models.ManyToManyField(to='cart.cartitem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_user', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+        ),
+    ]
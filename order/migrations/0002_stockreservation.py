@@ -0,0 +1,29 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_product_quantity_available'),
+        ('order', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='quantity')),
+                ('expires', models.DateTimeField(db_index=True, verbose_name='expires')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservation_order', to='order.order', verbose_name='order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservation_product', to='product.product', verbose_name='product')),
+            ],
+            options={
+                'verbose_name': 'StockReservation',
+                'verbose_name_plural': 'StockReservation',
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:38
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def snapshot_order_items(apps, schema_editor):
+    """Make lines of the existing orders from their cart items (with the current price of the products)"""
+    Order = apps.get_model('order', 'Order')
+    OrderLine = apps.get_model('order', 'OrderLine')
+    for order in Order.objects.prefetch_related('items__product'):
+        lines = [OrderLine(order=order, product=item.product, name=item.product.name, unit_price=item.product.price,
+                           unit_discount=min(item.product.discount, item.product.price), quantity=item.quantity,
+                           total=(item.product.price - min(item.product.discount, item.product.price)) * item.quantity)
+                 for item in order.items.all()]
+        OrderLine.objects.bulk_create(lines)
+        order.subtotal = order.total = sum(line.total for line in lines)
+        order.product_discount = sum(line.unit_discount * line.quantity for line in lines)
+        order.save(update_fields=['subtotal', 'product_discount', 'total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_product_quantity_available'),
+        ('order', '0002_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='product_discount',
+            field=models.DecimalField(decimal_places=0, default=0, max_digits=12, verbose_name='product discount'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=0, default=0, max_digits=12, verbose_name='subtotal'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=0, default=0, max_digits=12, verbose_name='total'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='user_discount',
+            field=models.DecimalField(decimal_places=0, default=0, max_digits=12, verbose_name='user discount'),
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='name')),
+                ('unit_price', models.DecimalField(decimal_places=0, max_digits=10, verbose_name='unit price')),
+                ('unit_discount', models.DecimalField(decimal_places=0, default=0, max_digits=10, verbose_name='unit discount')),
+                ('quantity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='quantity')),
+                ('total', models.DecimalField(decimal_places=0, max_digits=12, verbose_name='total')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_line_order', to='order.order', verbose_name='order')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_line_product', to='product.product', verbose_name='product')),
+            ],
+            options={
+                'verbose_name': 'OrderLine',
+                'verbose_name_plural': 'OrderLine',
+            },
+        ),
+        migrations.RunPython(snapshot_order_items, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='order',
+            name='items',
+        ),
+    ]
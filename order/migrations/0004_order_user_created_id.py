@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0003_order_lines'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created', 'id'], name='order_user_created_id'),
+        ),
+    ]
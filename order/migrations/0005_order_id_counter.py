@@ -0,0 +1,61 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:44
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils.text import slugify
+
+
+# A frozen copy of the order id format of 'order.numbers' when this migration was written
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+CHECK_SYMBOLS = ALPHABET + '*~$=U'
+FIRST_NUMBER = 32 ** 6
+
+
+def encode(number):
+    """Crockford base32 of the number with its check symbol"""
+    digits, value = '', number
+    while value:
+        value, digit = divmod(value, 32)
+        digits = ALPHABET[digit] + digits
+    return (digits or '0') + CHECK_SYMBOLS[number % 37]
+
+
+def number_orders(apps, schema_editor):
+    """Start the counter and give new ids to the orders without id or with a duplicate (random) id"""
+    Order = apps.get_model('order', 'Order')
+    OrderIdCounter = apps.get_model('order', 'OrderIdCounter')
+    duplicates = Order.objects.values('order_id').annotate(n=Count('id')).filter(n__gt=1).values('order_id')
+    number = FIRST_NUMBER
+    for order in Order.objects.filter(models.Q(order_id='') | models.Q(order_id__in=duplicates)).order_by('created', 'id'):
+        order.order_id = encode(number)
+        order.slug = slugify(order.order_id)
+        order.save(update_fields=['order_id', 'slug'])
+        number += 1
+    OrderIdCounter.objects.create(pk=1, value=number)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0004_order_user_created_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderIdCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(verbose_name='value')),
+            ],
+            options={
+                'verbose_name': 'OrderIdCounter',
+                'verbose_name_plural': 'OrderIdCounter',
+            },
+        ),
+        migrations.RunPython(number_orders, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='order_id',
+            field=models.CharField(blank=True, editable=False, max_length=10, unique=True, verbose_name='order_id'),
+        ),
+    ]
@@ -1,15 +1,26 @@
-from typing import Any
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
 from django.utils.text import slugify
 from django.urls import reverse
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
-from _resources.func import get_random_string
+
+
+class OrderManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Orders without 'order_id' get one before they are saved ('save' is not called)"""
+        from .numbers import next_order_id
+        objs = list(objs)
+        for order in objs:
+            if not order.order_id:
+                order.order_id = next_order_id()
+                order.slug = slugify(order.order_id)
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class Order(models.Model):
-    order_id = models.CharField(verbose_name=_('order_id'), max_length=10, blank=True, editable=False)
+    # Made by 'order.numbers.next_order_id' when the order is saved for the first time
+    order_id = models.CharField(verbose_name=_('order_id'), max_length=10, unique=True, blank=True, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              verbose_name=_('user'),
                              related_name='order_user',
@@ -18,43 +29,130 @@ class Order(models.Model):
                              verbose_name=_('cart'),
                              related_name='order_cart',
                              on_delete=models.CASCADE)
-    items = models.ManyToManyField('cart.CartItem')
     slug = models.SlugField(blank=True, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     is_paid = models.BooleanField(verbose_name=_('is paid'), default=False)
     is_completed = models.BooleanField(default=False)
-    
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs)
-        if not self.order_id:
-            self.order_id = get_random_string(length=6)
-    
+    # Totals of the lines at checkout (see 'OrderLine'), so order lists and invoices never join the products
+    subtotal = models.DecimalField(verbose_name=_('subtotal'), max_digits=12, decimal_places=0, default=0)
+    product_discount = models.DecimalField(verbose_name=_('product discount'), max_digits=12, decimal_places=0,
+                                           default=0)
+    user_discount = models.DecimalField(verbose_name=_('user discount'), max_digits=12, decimal_places=0, default=0)
+    total = models.DecimalField(verbose_name=_('total'), max_digits=12, decimal_places=0, default=0)
+
+    objects = OrderManager()
+
+    class Meta:
+        indexes = [
+            # Order history of the users is paginated on '(created, id)' (see 'order.views.OrderViewSet')
+            models.Index(fields=['user', 'created', 'id'], name='order_user_created_id'),
+        ]
+
     def save(self, *args, **kwargs) -> None:
-        self.slug = slugify(self.order_id)
-        return super().save(*args, **kwargs)
+        if self.order_id:
+            self.slug = slugify(self.order_id)
+            return super().save(*args, **kwargs)
+        from .numbers import next_order_id
+        for attempt in range(3):
+            self.order_id = next_order_id()
+            self.slug = slugify(self.order_id)
+            try:
+                # A savepoint, so a duplicate id does not break the transaction of the caller
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # The block of the id was rolled back and taken by another process (see 'order.numbers')
+                if attempt == 2 or not Order.objects.filter(order_id=self.order_id).exists():
+                    self.order_id = ''
+                    raise
+                next_order_id.drop_block()
 
     @property
     def get_total_price(self):
-        total_price = self.items.aggregate(total=models.Sum(models.F('quantity') * models.F('product__price')))['total']
-        return total_price or 0
+        return self.total
+
+    def get_quantities(self):
+        """Ordered quantity of every product as 'product id: quantity'"""
+        return dict(self.order_line_order.values_list('product', 'quantity'))
 
-    @property
     def complete_order(self):
-        if not self.is_completed:
-            with models.Model._meta.db_table_class.objects.select_for_update().filter(pk=self.pk):
-                self.refresh_from_db()
-                if self.is_completed:
-                    return False
-                for item in self.items.all():
-                    if item.product.reduce_quantity(item.quantity):
-                        item.save()
-                    else:
-                        return False
-                self.is_completed = True
-                self.save()
-                return True
-        return False
+        """
+        Complete the paid order: its reserved stock is kept for good. If the reservation expired the stock is taken
+        again. Return False if the order is completed before or there is not enough stock anymore
+        """
+        from .inventory import confirm_reservations
+        with transaction.atomic():
+            # Only one of the concurrent calls changes the row
+            if not Order.objects.filter(pk=self.pk, is_completed=False).update(is_completed=True):
+                return False
+            if not confirm_reservations(self):
+                transaction.set_rollback(True)
+                return False
+        self.is_completed = True
+        return True
 
     def __str__(self):
         return f"Order - {self.user.username}"
+
+
+class OrderLine(models.Model):
+    """Snapshot of an ordered product at checkout. Later changes of the product never change the order"""
+    order = models.ForeignKey('Order',
+                              verbose_name=_('order'),
+                              related_name='order_line_order',
+                              on_delete=models.CASCADE)
+    product = models.ForeignKey('product.Product',
+                                verbose_name=_('product'),
+                                related_name='order_line_product',
+                                on_delete=models.SET_NULL,
+                                null=True,
+                                blank=True)
+    name = models.CharField(verbose_name=_('name'), max_length=200)
+    unit_price = models.DecimalField(verbose_name=_('unit price'), max_digits=10, decimal_places=0)
+    unit_discount = models.DecimalField(verbose_name=_('unit discount'), max_digits=10, decimal_places=0, default=0)
+    quantity = models.PositiveIntegerField(verbose_name=_('quantity'), validators=[MinValueValidator(1)])
+    total = models.DecimalField(verbose_name=_('total'), max_digits=12, decimal_places=0)
+
+    class Meta:
+        verbose_name = 'OrderLine'
+        verbose_name_plural = 'OrderLine'
+
+    def __str__(self):
+        return f"{self.name} ({self.quantity})"
+
+
+class OrderIdCounter(models.Model):
+    """Last number given to the blocks of order ids (one row, see 'order.numbers')"""
+    value = models.BigIntegerField(verbose_name=_('value'))
+
+    class Meta:
+        verbose_name = 'OrderIdCounter'
+        verbose_name_plural = 'OrderIdCounter'
+
+    def __str__(self):
+        return str(self.value)
+
+
+class StockReservation(models.Model):
+    """
+    Stock of a product taken for an order until it's paid. Expired reservations are given back to the stock
+    (see 'order.inventory.release_expired_reservations')
+    """
+    order = models.ForeignKey('Order',
+                              verbose_name=_('order'),
+                              related_name='stock_reservation_order',
+                              on_delete=models.CASCADE)
+    product = models.ForeignKey('product.Product',
+                                verbose_name=_('product'),
+                                related_name='stock_reservation_product',
+                                on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(verbose_name=_('quantity'))
+    expires = models.DateTimeField(verbose_name=_('expires'), db_index=True)
+
+    class Meta:
+        verbose_name = 'StockReservation'
+        verbose_name_plural = 'StockReservation'
+
+    def __str__(self):
+        return f'{self.order_id}: {self.product_id} ({self.quantity})'
@@ -0,0 +1,116 @@
+"""
+Order ids: short, human friendly, time ordered and unique.
+
+** An order id is a number of a database counter ('OrderIdCounter') written in Crockford base32 (digits and upper case
+letters without I, L, O and U, so it's easy to read on the phone) with a check symbol at the end that catches typos:
+'1000000' + 'B' -> '1000000B'. Numbers start at 32 ** 6, so all the ids have 8 characters for the next 34 billion
+orders and their string order is the same as their creation order.
+
+** Every process takes a block of 'ORDER_ID_BLOCK_SIZE' numbers from the counter with one query and hands them out from
+memory, so making an id needs no database round trip. Numbers of a block are never used by other processes (ids of
+diffrent processes are ordered by their block, not exactly by time). Unused numbers of a block are lost when the
+process stops, it makes gaps but never duplicates.
+
+** If the transaction (or the savepoint) that took the block is rolled back, the counter is rolled back too and the
+block may be taken by another process. So a block is shared by the threads only after its transaction is committed,
+before that it's used only by the thread that took it and only while its commit hook is not dropped by a rollback.
+The unique index on 'Order.order_id' catches the rest ('Order.save' takes a new block and tries again).
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction, connection, connections, DEFAULT_DB_ALIAS
+
+from .models import OrderIdCounter
+
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+CHECK_SYMBOLS = ALPHABET + '*~$=U'
+FIRST_NUMBER = 32 ** 6
+
+
+def encode(number):
+    """Crockford base32 of the number with its check symbol"""
+    digits, value = '', number
+    while value:
+        value, digit = divmod(value, 32)
+        digits = ALPHABET[digit] + digits
+    return (digits or '0') + CHECK_SYMBOLS[number % 37]
+
+
+def decode(order_id):
+    """Number of the order id. Raise 'ValueError' if it's not valid (eg: a typo)"""
+    order_id = order_id.upper().replace('O', '0').replace('I', '1').replace('L', '1').replace('-', '')
+    if len(order_id) < 2:
+        raise ValueError(f'invalid order id: {order_id}')
+    number = 0
+    for symbol in order_id[:-1]:
+        if symbol not in ALPHABET:
+            raise ValueError(f'invalid order id: {order_id}')
+        number = number * 32 + ALPHABET.index(symbol)
+    if CHECK_SYMBOLS[number % 37] != order_id[-1]:
+        raise ValueError(f'invalid check symbol: {order_id}')
+    return number
+
+
+def allocate_block(size):
+    """Take 'size' numbers from the counter with one statement. Return the first number"""
+    table = OrderIdCounter._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'UPDATE "{table}" SET "value" = "value" + %s WHERE "id" = 1 RETURNING "value"', [size])
+        row = cursor.fetchone()
+    if row is None:
+        # The counter is made by the migrations, this is only for databases that are made without them
+        OrderIdCounter.objects.get_or_create(pk=1, defaults={'value': FIRST_NUMBER})
+        return allocate_block(size)
+    return row[0] - size
+
+
+class Block:
+    def __init__(self, first, size):
+        self.next = first
+        self.end = first + size
+        # A block taken in a transaction is committed only when the transaction is committed
+        self.connection = connections[DEFAULT_DB_ALIAS]
+        self.committed = not self.connection.in_atomic_block
+        if not self.committed:
+            transaction.on_commit(self.commit)
+
+    def commit(self):
+        self.committed = True
+
+    def usable(self):
+        """True if the block is committed or it's taken in the open transaction of this thread"""
+        if self.committed:
+            return True
+        # Rolling back the transaction or the savepoint of the block drops its hook from the connection
+        current = connections[DEFAULT_DB_ALIAS]
+        return current is self.connection and any(hook == self.commit for _, hook, _ in current.run_on_commit)
+
+
+class OrderIdGenerator:
+    """Hands out order ids from the blocks of this process (thread safe)"""
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self.block = None
+        self.lock = threading.Lock()
+
+    def drop_block(self):
+        with self.lock:
+            self.block = None
+
+    def __call__(self):
+        with self.lock:
+            block = self.block
+            # The block is rolled back (it may be taken by other processes) or it's not committed by another thread
+            if block and not block.usable():
+                block = None
+            if block is None or block.next >= block.end:
+                size = self.block_size or settings.ORDER_ID_BLOCK_SIZE
+                block = self.block = Block(allocate_block(size), size)
+            number = block.next
+            block.next += 1
+        return encode(number)
+
+
+next_order_id = OrderIdGenerator()
@@ -0,0 +1,19 @@
+from rest_framework import serializers
+
+from .models import Order, OrderLine
+
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLine
+        fields = ['product', 'name', 'unit_price', 'unit_discount', 'quantity', 'total']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    """Order with its line snapshots. Lines must be prefetched ('order_line_order')"""
+    lines = OrderLineSerializer(source='order_line_order', many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['order_id', 'created', 'is_paid', 'is_completed', 'subtotal', 'product_discount', 'user_discount',
+                  'total', 'lines']
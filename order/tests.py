@@ -1,3 +1,246 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cart.models import Cart
+from product.models import Category, Product
+from .checkout import checkout, create_order, CartChanged
+from .inventory import InsufficientStock, release_expired_reservations
+from .models import Order, StockReservation
+from .numbers import OrderIdGenerator, encode, decode, FIRST_NUMBER
+from . import numbers
+
+
+User = get_user_model()
+
+
+class TestCheckout(TestCase):
+
+    def setUp(self) -> None:
+        category = Category.objects.create(name='Giyim')
+        self.dress = Product.objects.create(category=category, name='Elbise', price=1000, discount=0,
+                                            quantity_available=5)
+        self.shirt = Product.objects.create(category=category, name='Gomlek', price=500, discount=0,
+                                            quantity_available=1)
+        self.user = User.objects.create_user(username='ehsan', password='123456')
+
+    def cart(self, dresses=2, shirts=1):
+        cart = Cart.objects.create(user=self.user)
+        cart.set_quantities({self.dress.pk: dresses, self.shirt.pk: shirts})
+        return cart
+
+    def stock(self):
+        return dict(Product.objects.values_list('pk', 'quantity_available'))
+
+    def expire_reservations(self):
+        StockReservation.objects.update(expires=timezone.now() - timedelta(seconds=1))
+
+    def test_checkout_reserves_stock(self):
+        """Test if stock of all the order lines is taken and reserved"""
+        order = checkout(self.user, self.cart())
+
+        self.assertEqual(self.stock(), {self.dress.pk: 3, self.shirt.pk: 0})
+        self.assertEqual(dict(order.stock_reservation_order.values_list('product', 'quantity')),
+                         {self.dress.pk: 2, self.shirt.pk: 1})
+
+    def test_insufficient_stock(self):
+        """Test if nothing is taken or saved when stock of one of the products is not enough"""
+        with self.assertRaises(InsufficientStock) as error:
+            checkout(self.user, self.cart(shirts=2))
+
+        self.assertEqual(error.exception.products, {self.shirt.pk: 1})
+        self.assertEqual(self.stock(), {self.dress.pk: 5, self.shirt.pk: 1})
+        self.assertFalse(Order.objects.exists())
+
+    def test_expired_reservations_released(self):
+        """Test if stock of the expired reservations is given back before the next checkout"""
+        checkout(self.user, self.cart())
+        self.expire_reservations()
+        checkout(self.user, self.cart(dresses=1))
+
+        self.assertEqual(self.stock(), {self.dress.pk: 4, self.shirt.pk: 0})
+        self.assertEqual(StockReservation.objects.count(), 2)
+        self.assertEqual(release_expired_reservations(), 0)
+
+    def test_complete_order(self):
+        """Test if reservations of a completed order are kept for good and it's completed only once"""
+        order = checkout(self.user, self.cart())
+        self.expire_reservations()
+
+        self.assertTrue(order.complete_order())
+        self.assertFalse(order.complete_order())
+        self.assertEqual(release_expired_reservations(), 0)
+        self.assertEqual(self.stock(), {self.dress.pk: 3, self.shirt.pk: 0})
+
+    def test_complete_order_after_release(self):
+        """Test if stock is taken again for an order whose reservations are given back"""
+        order = checkout(self.user, self.cart(dresses=1, shirts=1))
+        self.expire_reservations()
+        release_expired_reservations()
+        checkout(self.user, self.cart(dresses=1, shirts=1))
+
+        self.assertFalse(order.complete_order())
+        self.assertFalse(Order.objects.get(pk=order.pk).is_completed)
+        self.assertEqual(self.stock(), {self.dress.pk: 4, self.shirt.pk: 0})
+
+    def test_order_lines_snapshot(self):
+        """Test if order lines and totals do not change when products change after checkout"""
+        User.objects.filter(pk=self.user.pk).update(discount_percent=10)
+        order = checkout(self.user, self.cart())
+        Product.objects.update(price=2000, name='Changed')
+
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual((order.subtotal, order.user_discount, order.total), (2500, 250, 2250))
+        self.assertEqual(list(order.order_line_order.order_by('id').values_list('name', 'unit_price', 'total')),
+                         [('Elbise', 1000, 2000), ('Gomlek', 500, 500)])
+
+    def test_one_insert_for_lines(self):
+        """Test if all the lines are saved with one insert and order list is read from one table"""
+        cart = self.cart()
+        with CaptureQueriesContext(connection) as queries:
+            checkout(self.user, cart)
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "order_orderline"')]
+
+        self.assertEqual(len(inserts), 1)
+        with self.assertNumQueries(1):
+            totals = [order.total for order in Order.objects.filter(user=self.user)]
+        self.assertEqual(totals, [2500])
+
+    def test_cart_changed_during_checkout(self):
+        """Test if a cart changed after it's priced is not ordered with the old price"""
+        cart = self.cart()
+        price = cart.get_price(cached=False)
+        cart.add_to_cart(self.dress)
+
+        with self.assertRaises(CartChanged):
+            create_order(self.user, cart, price)
+        self.assertEqual(checkout(self.user, cart).total, 3500)
+
+
+class TestOrderHistory(TestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='ehsan', password='123456')
+        other = User.objects.create_user(username='reza', password='123456')
+        cart = Cart.objects.create(user=self.user)
+        # Many orders have the same 'created' so pages must be split on 'id' too
+        created = timezone.now()
+        self.orders = Order.objects.bulk_create([Order(user=self.user if i % 5 else other, cart=cart, total=i)
+                                                 for i in range(30)])
+        Order.objects.filter(id__in=[o.id for o in self.orders[:10]]).update(created=created - timedelta(days=1))
+        Order.objects.filter(id__in=[o.id for o in self.orders[10:]]).update(created=created)
+        for order in Order.objects.filter(user=self.user):
+            order.order_line_order.create(name='Elbise', unit_price=order.total, quantity=1, total=order.total)
+
+    def test_user_orders(self):
+        """Test if orders of the user are read with one query, newest first"""
+        with self.assertNumQueries(1):
+            totals = [order.total for order in self.user.orders]
+        self.assertEqual(totals, [29, 28, 27, 26, 24, 23, 22, 21, 19, 18, 17, 16, 14, 13, 12, 11, 9, 8, 7, 6, 4, 3, 2, 1])
+
+    def test_keyset_pages(self):
+        """Test if all the orders are paged without duplicates and deep pages cost the same queries"""
+        self.client.force_login(self.user)
+        url, totals, queries = reverse('order:history-list') + '?page_size=5', [], []
+        while url:
+            with CaptureQueriesContext(connection) as captured:
+                data = self.client.get(url).json()
+            # Only the queries of the orders (not the session and user queries)
+            queries.append(len([q for q in captured.captured_queries if q['sql'].startswith('SELECT "order_')]))
+            totals += [int(order['total']) for order in data['results']]
+            self.assertTrue(all(len(order['lines']) == 1 for order in data['results']))
+            url = data['next']
+
+        self.assertEqual(totals, [o.total for o in self.user.orders])
+        self.assertEqual(len(queries), 5)
+        self.assertEqual(set(queries), {2})
+
+    def test_invalid_cursor(self):
+        """Test if a broken cursor is not found"""
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.client.get(reverse('order:history-list') + '?cursor=broken').status_code, 404)
+
+
+class TestOrderIds(TestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='ehsan', password='123456')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def test_format(self):
+        """Test if ids are short, ordered like their numbers and typos are found"""
+        self.assertEqual(encode(FIRST_NUMBER), '1000000B')
+        ids = [encode(number) for number in range(FIRST_NUMBER, FIRST_NUMBER + 2000, 7)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual({len(order_id) for order_id in ids}, {8})
+        self.assertEqual(decode(encode(FIRST_NUMBER + 12345).lower()), FIRST_NUMBER + 12345)
+        order_id = encode(FIRST_NUMBER + 12345)
+        with self.assertRaises(ValueError):
+            decode(order_id[:3] + ('X' if order_id[3] != 'X' else 'Y') + order_id[4:])
+
+    def test_blocks(self):
+        """Test if the database is read once for every block and generators never give the same id"""
+        first, second = OrderIdGenerator(block_size=10), OrderIdGenerator(block_size=10)
+        with self.assertNumQueries(1):
+            ids = [first() for _ in range(10)]
+        with self.assertNumQueries(2):
+            ids += [second() for _ in range(5)] + [first() for _ in range(5)]
+        self.assertEqual(len(set(ids)), 20)
+        self.assertEqual(ids[:10], sorted(ids[:10]))
+
+    def test_rolled_back_block(self):
+        """Test if a block taken in a savepoint that is rolled back is not handed out again"""
+        generator = OrderIdGenerator(block_size=10)
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                rolled_back = generator()
+                raise ValueError
+        with self.assertNumQueries(1):
+            order_id = generator()
+        # The counter is rolled back too, so the same numbers are taken again
+        self.assertEqual(order_id, rolled_back)
+        self.assertEqual(decode(generator()), decode(order_id) + 1)
+
+    def test_block_of_other_thread(self):
+        """Test if a block taken in the open transaction of another thread is not used by this thread"""
+        generator, taken, done = OrderIdGenerator(block_size=10), threading.Event(), threading.Event()
+        other_ids = []
+
+        def take_block():
+            try:
+                with transaction.atomic():
+                    with mock.patch.object(numbers, 'allocate_block', return_value=FIRST_NUMBER - 100):
+                        other_ids.append(generator())
+                    taken.set()
+                    done.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=take_block)
+        thread.start()
+        taken.wait(5)
+        with self.assertNumQueries(1):
+            order_id = generator()
+        done.set()
+        thread.join()
+        self.assertEqual(other_ids, [encode(FIRST_NUMBER - 100)])
+        self.assertGreaterEqual(decode(order_id), FIRST_NUMBER)
+
+    def test_orders(self):
+        """Test if orders get unique ids when they are saved, not when they are loaded"""
+        orders = [Order.objects.create(user=self.user, cart=self.cart) for _ in range(3)]
+        orders += Order.objects.bulk_create([Order(user=self.user, cart=self.cart) for _ in range(3)])
 
-# Create your tests here.
+        self.assertEqual(len({order.order_id for order in orders}), 6)
+        self.assertTrue(all(order.slug == order.order_id.lower() for order in orders))
+        self.assertEqual(Order(user=self.user, cart=self.cart).order_id, '')
+        self.assertEqual(sorted(Order.objects.values_list('order_id', flat=True)),
+                         sorted(order.order_id for order in orders))
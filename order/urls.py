@@ -1,9 +1,15 @@
-from django.urls import path
+from django.urls import path, include
+from rest_framework import routers
+
 from . import views
 
 
 app_name = 'order'
 
+router = routers.DefaultRouter()
+
+router.register('history', views.OrderViewSet, 'history')
+
 urlpatterns = [
-    
-]
\ No newline at end of file
+    path('', include(router.urls)),
+]
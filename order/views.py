@@ -1,3 +1,21 @@
-from django.shortcuts import render
+from rest_framework import authentication, permissions
+from rest_framework.viewsets import ReadOnlyModelViewSet
 
-# Create your views here.
+from _resources.pagination import KeysetPagination
+from .serializers import OrderSerializer
+
+
+class OrderViewSet(ReadOnlyModelViewSet):
+    """
+    Order history of the current user, newest first. Pages are read with keyset pagination on '(created, id)' so
+    deep pages cost the same as the first one. Every page is two queries: orders and their lines
+    """
+    serializer_class = OrderSerializer
+    permission_classes = [permissions.IsAuthenticated, ]
+    authentication_classes = [authentication.TokenAuthentication, authentication.SessionAuthentication, ]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created', '-id')
+    lookup_field = 'order_id'
+
+    def get_queryset(self):
+        return self.request.user.orders.prefetch_related('order_line_order')
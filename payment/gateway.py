@@ -0,0 +1,158 @@
+"""
+Async client of the payment gateway api.
+
+** The gateway has two json endpoints (like most of the Iranian gateways):
+    POST /request {"merchant", "amount", "callback_url", "description"} -> {"code": 100, "authority": "..."}
+    POST /verify {"merchant", "amount", "authority"} -> {"code": 100 or 101, "ref_id": "..."}
+The customer pays in '/pay/<authority>' and is redirected to the callback url with 'Authority' and 'Status'.
+Code 101 means the payment is verified before, any other code except 100 is a failed payment.
+
+** Gateways may be slow, so the requests are sent from one event loop thread of the process ('GatewayPool') with one
+'aiohttp.ClientSession': connections are kept alive and reused, and at most 'PAYMENT_GATEWAY_CONCURRENCY' requests
+are in flight. Async views wait for the requests without holding a worker thread (under ASGI) and WSGI processes
+share the same pool too (every WSGI request runs async views in a new event loop, so a session of the view loop
+could not be reused).
+"""
+import asyncio
+import random
+import threading
+from urllib.parse import urljoin
+
+import aiohttp
+from django.conf import settings
+
+
+# Codes of a successful verification: verified now or before
+VERIFIED_CODES = {100, 101}
+
+
+class GatewayError(Exception):
+    """The gateway did not answer (after the retries) or its answer is not valid"""
+
+
+class Verification:
+    def __init__(self, code, reference=''):
+        self.code = code
+        self.reference = reference
+
+    @property
+    def ok(self):
+        return self.code in VERIFIED_CODES
+
+
+class GatewayClient:
+    """
+    Pooled keep-alive client of the gateway with bounded concurrency and retry. Must be used as an async context
+    manager (or 'open' and 'close' must be called in the same event loop):
+        async with GatewayClient(url, merchant) as client:
+            verification = await client.verify(authority, amount)
+    """
+    def __init__(self, base_url, merchant, concurrency=32, timeout=10, retries=2, backoff=0.2):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.merchant = merchant
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.requests = 0
+        self._session = None
+        self._semaphore = None
+
+    async def open(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                              headers={'Accept': 'application/json'})
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def close(self):
+        await self._session.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def payment_url(self, authority):
+        """Page of the gateway that the customer pays in"""
+        return urljoin(self.base_url, f'pay/{authority}')
+
+    async def post(self, path, payload):
+        """Send the payload and return the json answer. Raise 'GatewayError' if all the retries failed"""
+        last_error = None
+        for attempt in range(self.retries + 1):
+            async with self._semaphore:
+                self.requests += 1
+                try:
+                    async with self._session.post(urljoin(self.base_url, path),
+                                                  json={'merchant': self.merchant, **payload}) as response:
+                        if response.status < 500:
+                            return await response.json(content_type=None)
+                        last_error = f'status {response.status}'
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    last_error = repr(e)
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+        raise GatewayError(f'{path} failed after {self.retries + 1} attempts: {last_error}')
+
+    async def request_payment(self, amount, callback_url, description=''):
+        """Register a payment in the gateway and return its authority"""
+        data = await self.post('request', {'amount': int(amount), 'callback_url': callback_url,
+                                           'description': description})
+        if data.get('code') != 100 or not data.get('authority'):
+            raise GatewayError(f'payment is not registered: {data}')
+        return str(data['authority'])
+
+    async def verify(self, authority, amount):
+        """Verify the paid amount of the payment. Verifying a payment again is safe (code 101)"""
+        data = await self.post('verify', {'amount': int(amount), 'authority': authority})
+        if 'code' not in data:
+            raise GatewayError(f'invalid answer of verify: {data}')
+        return Verification(data['code'], str(data.get('ref_id') or ''))
+
+
+class GatewayPool:
+    """One 'GatewayClient' for the whole process that runs in its own event loop thread"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loop = None
+        self.client = None
+
+    def start(self):
+        with self.lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='payment-gateway', daemon=True).start()
+                client = GatewayClient(settings.PAYMENT_GATEWAY_URL, settings.PAYMENT_GATEWAY_MERCHANT,
+                                       concurrency=settings.PAYMENT_GATEWAY_CONCURRENCY,
+                                       timeout=settings.PAYMENT_GATEWAY_TIMEOUT)
+                asyncio.run_coroutine_threadsafe(client.open(), loop).result()
+                self.loop, self.client = loop, client
+        return self.client
+
+    def stop(self):
+        """Close the client (eg: when settings of the gateway are changed in tests)"""
+        with self.lock:
+            if self.loop is not None:
+                asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result()
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.loop, self.client = None, None
+
+    async def call(self, method, *args):
+        """Await a method of the client from any event loop"""
+        client = self.start()
+        future = asyncio.run_coroutine_threadsafe(getattr(client, method)(*args), self.loop)
+        return await asyncio.wrap_future(future)
+
+    async def request_payment(self, amount, callback_url, description=''):
+        return await self.call('request_payment', amount, callback_url, description)
+
+    async def verify(self, authority, amount):
+        return await self.call('verify', authority, amount)
+
+    def payment_url(self, authority):
+        return self.start().payment_url(authority)
+
+
+gateway = GatewayPool()
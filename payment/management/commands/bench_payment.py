@@ -0,0 +1,71 @@
+"""
+Benchmark callbacks of the payment gateway (callbacks/sec) against the local fake gateway:
+    python manage.py bench_payment --payments 500 --retries 2 --delay 0.05 --concurrency 32
+Every payment gets '1 + retries' callbacks at the same time (like a gateway that retries its callbacks). Every
+payment must be verified only once and every order must be paid. Benchmark objects are deleted at the end.
+"""
+import asyncio
+import random
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from cart.models import Cart
+from order.models import Order
+from payment.gateway import gateway
+from payment.models import Payment
+from payment.processing import process_callback
+from payment.standin import FakeGatewayServer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark idempotent payment callbacks against the local fake gateway'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=500)
+        parser.add_argument('--retries', type=int, default=2, help='Extra callbacks of every payment')
+        parser.add_argument('--delay', type=float, default=0.05, help='Seconds that every answer of the gateway takes')
+        parser.add_argument('--concurrency', type=int, default=settings.PAYMENT_GATEWAY_CONCURRENCY)
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create_user(username='payment-benchmark')
+        try:
+            with FakeGatewayServer(delay=options['delay']) as server, \
+                    override_settings(PAYMENT_GATEWAY_URL=server.url,
+                                      PAYMENT_GATEWAY_CONCURRENCY=options['concurrency']):
+                gateway.stop()
+                try:
+                    self.run(user, server, options)
+                finally:
+                    gateway.stop()
+        finally:
+            user.delete()
+
+    def run(self, user, server, options):
+        cart = Cart.objects.create(user=user)
+        orders = Order.objects.bulk_create([Order(user=user, cart=cart, total=1000) for _ in range(options['payments'])])
+        payments = Payment.objects.bulk_create([Payment(user=user, order=order, price=order.total,
+                                                        authority=server.register(order.total)) for order in orders])
+        callbacks = [payment.authority for payment in payments] * (1 + options['retries'])
+        random.shuffle(callbacks)
+
+        async def send():
+            return await asyncio.gather(*[process_callback(authority) for authority in callbacks],
+                                        return_exceptions=True)
+
+        started = time.perf_counter()
+        results = async_to_sync(send)()
+        elapsed = time.perf_counter() - started
+
+        errors = [result for result in results if isinstance(result, Exception)]
+        verified_twice = [authority for authority, n in server.verifications.items() if n > 1]
+        paid = Order.objects.filter(pk__in=[order.pk for order in orders], is_paid=True).count()
+        self.stdout.write(f'{len(callbacks)} callbacks of {len(payments)} payments (gateway answers in '
+                          f'{options["delay"]}s, {options["concurrency"]} connections) in {elapsed:.2f}s: '
+                          f'{len(callbacks) / elapsed:.0f} callbacks/s')
+        self.stdout.write(f'{sum(server.verifications.values())} verify requests over {server.connections} connections, '
+                          f'{len(verified_twice)} payments verified twice, {paid} orders paid, {len(errors)} errors')
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('order', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_id', models.UUIDField(default=uuid.uuid4, editable=False, verbose_name='payment id')),
+                ('price', models.DecimalField(decimal_places=0, max_digits=10, verbose_name='price')),
+                ('is_paid', models.BooleanField(default=False, verbose_name='is paid')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_order', to='order.order', verbose_name='order')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_user', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'Payment',
+                'verbose_name_plural': 'Payment',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:47
+
+from django.db import migrations, models
+import uuid
+
+
+def fill_status(apps, schema_editor):
+    """Payments that are paid before"""
+    Payment = apps.get_model('payment', 'Payment')
+    Payment.objects.filter(is_paid=True).update(status='paid')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='authority',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='authority'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='reference',
+            field=models.CharField(blank=True, max_length=64, verbose_name='reference'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'pending'), ('verifying', 'verifying'), ('paid', 'paid'), ('failed', 'failed')], default='pending', max_length=10, verbose_name='status'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='payment_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='payment id'),
+        ),
+        migrations.RunPython(fill_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0002_payment_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='needs_refund',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='needs refund'),
+        ),
+    ]
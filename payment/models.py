@@ -5,7 +5,17 @@ import uuid
 
 
 class Payment(models.Model):
-    payment_id = models.UUIDField(verbose_name=_('payment id'), default=uuid.uuid4, editable=False)
+    PENDING = 'pending'
+    VERIFYING = 'verifying'
+    PAID = 'paid'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, _('pending')),
+        (VERIFYING, _('verifying')),
+        (PAID, _('paid')),
+        (FAILED, _('failed')),
+    ]
+    payment_id = models.UUIDField(verbose_name=_('payment id'), default=uuid.uuid4, unique=True, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              verbose_name=_('user'),
                              related_name='payment_user',
@@ -16,7 +26,13 @@ class Payment(models.Model):
                               on_delete=models.CASCADE)
     price = models.DecimalField(verbose_name=_('price'), max_digits=10, decimal_places=0)
     is_paid = models.BooleanField(verbose_name=_('is paid'), default=False)
-    # Payment choices will be put here
+    status = models.CharField(verbose_name=_('status'), max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Token of the payment in the gateway. Callbacks are keyed by it, so retried callbacks do nothing (see 'payment.processing')
+    authority = models.CharField(verbose_name=_('authority'), max_length=64, unique=True, null=True, blank=True)
+    # Reference id of the verified payment in the gateway (for the customer and refunds)
+    reference = models.CharField(verbose_name=_('reference'), max_length=64, blank=True)
+    # Paid payments whose order is not completed (its stock is sold out or it's paid by another payment)
+    needs_refund = models.BooleanField(verbose_name=_('needs refund'), default=False, db_index=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     
@@ -0,0 +1,98 @@
+"""
+Payments of the orders and callbacks of the gateway (see 'payment.gateway').
+
+** Callbacks are keyed by the authority of the payment (the idempotency key). Gateways and customers send the same
+callback many times (refresh, back button, retries of the gateway), so only the first one verifies the payment: it
+claims the payment with a conditional update ('pending' -> 'verifying') and all the other callbacks return the state
+of the payment without any request to the gateway. 'Status' of the callback is not trusted (anyone can send a
+callback with 'Status=NOK'), every payment is failed or paid by the gateway. If the gateway does not answer, the
+payment goes back to
+'pending' so the next callback verifies it again. A claim older than 'PAYMENT_VERIFY_TIMEOUT' seconds (the process
+is killed while verifying) may be taken again.
+
+** The slow part (verify request) is done outside of any transaction. 'Payment', 'Order.is_paid' and
+'Order.is_completed' (with the reserved stock, see 'order.inventory') are marked in one short transaction. A paid
+payment whose order can't be completed is marked 'needs_refund' (and logged).
+"""
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from order.models import Order
+from .gateway import gateway
+from .models import Payment
+
+
+logger = logging.getLogger(__name__)
+
+def mark_paid(payment, reference):
+    """Mark the verified payment and its order as paid and complete the order in one transaction"""
+    now = timezone.now()
+    with transaction.atomic():
+        if not Payment.objects.filter(pk=payment.pk, status=Payment.VERIFYING)\
+                .update(status=Payment.PAID, is_paid=True, reference=reference, updated=now):
+            return False
+        Order.objects.filter(pk=payment.order_id).update(is_paid=True, updated=now)
+        # Not completed orders (stock is sold out after the reservation expired) are paid and must be refunded
+        if not Order(pk=payment.order_id).complete_order():
+            Payment.objects.filter(pk=payment.pk).update(needs_refund=True)
+            logger.error('payment %s (reference %s) is paid but its order %s is not completed, it needs a refund',
+                         payment.payment_id, reference, payment.order_id)
+    return True
+
+
+def mark_failed(payment):
+    return bool(Payment.objects.filter(pk=payment.pk, status=Payment.VERIFYING)
+                .update(status=Payment.FAILED, updated=timezone.now()))
+
+
+def claim(payment):
+    """Take the payment for verification. Only one of the concurrent callbacks could take it"""
+    stuck = timezone.now() - timedelta(seconds=settings.PAYMENT_VERIFY_TIMEOUT)
+    return bool(Payment.objects.filter(Q(status=Payment.PENDING) | Q(status=Payment.VERIFYING, updated__lt=stuck),
+                                       pk=payment.pk).update(status=Payment.VERIFYING, updated=timezone.now()))
+
+
+def release(payment):
+    Payment.objects.filter(pk=payment.pk, status=Payment.VERIFYING).update(status=Payment.PENDING,
+                                                                           updated=timezone.now())
+
+
+async def process_callback(authority):
+    """
+    Verify the payment of the callback and return it with its new status. Raise 'Payment.DoesNotExist' for unknown
+    authorities and 'payment.gateway.GatewayError' if the gateway does not answer
+    """
+    payment = await Payment.objects.aget(authority=authority)
+    if payment.status in (Payment.PAID, Payment.FAILED):
+        return payment
+    if await sync_to_async(claim)(payment):
+        try:
+            verification = await gateway.verify(authority, payment.price)
+        except BaseException:
+            await sync_to_async(release)(payment)
+            raise
+        if verification.ok:
+            await sync_to_async(mark_paid)(payment, verification.reference)
+        else:
+            await sync_to_async(mark_failed)(payment)
+    return await Payment.objects.aget(pk=payment.pk)
+
+
+async def start_payment(order, callback_url):
+    """
+    Payment of the unpaid order with its authority in the gateway. A pending payment of the order is reused, so
+    pressing the pay button again never registers another payment
+    """
+    payment = await Payment.objects.filter(order=order, status=Payment.PENDING, authority__isnull=False)\
+        .order_by('-created').afirst()
+    if payment is None:
+        authority = await gateway.request_payment(order.total, callback_url, f'order {order.order_id}')
+        payment = await Payment.objects.acreate(user_id=order.user_id, order=order, price=order.total,
+                                                authority=authority)
+    return payment
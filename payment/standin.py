@@ -0,0 +1,101 @@
+"""
+Local stand-in of the payment gateway (see 'payment.gateway') to test and benchmark payments without a real gateway.
+
+** Every registered payment is paid at once. 'delay' is the seconds that every answer takes (a slow gateway) and
+'fail_first' makes the server answer with '503' to the first n requests to test the retries. Authorities in
+'declined' are not verified (code -51, like a payment that the customer did not pay).
+
+** 'verifications' counts the verify requests of every authority, so tests could check that retried callbacks do
+not verify the payment again.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with server.lock:
+            server.requests += 1
+            fail = server.requests <= server.fail_first
+        if server.delay:
+            time.sleep(server.delay)
+        if fail:
+            return self.send_json(503, {'error': 'unavailable'})
+        if self.path == '/request':
+            authority = uuid.uuid4().hex
+            with server.lock:
+                server.payments[authority] = int(payload['amount'])
+            return self.send_json(200, {'code': 100, 'authority': authority})
+        if self.path == '/verify':
+            authority = payload.get('authority')
+            with server.lock:
+                server.verifications[authority] += 1
+                amount = server.payments.get(authority)
+                first = server.verifications[authority] == 1
+            if amount is None or amount != int(payload.get('amount', 0)) or authority in server.declined:
+                return self.send_json(200, {'code': -51})
+            return self.send_json(200, {'code': 100 if first else 101, 'ref_id': str(abs(hash(authority)) % 10 ** 10)})
+        self.send_json(404, {'error': 'not found'})
+
+
+class FakeGatewayServer(ThreadingHTTPServer):
+    """
+    Run the server in a background thread:
+        with FakeGatewayServer(delay=0.05) as server:
+            settings.PAYMENT_GATEWAY_URL = server.url
+    """
+    daemon_threads = True
+
+    def __init__(self, delay=0, fail_first=0, declined=()):
+        super().__init__(('127.0.0.1', 0), GatewayHandler)
+        self.delay = delay
+        self.fail_first = fail_first
+        self.declined = set(declined)
+        self.payments = dict()
+        self.verifications = Counter()
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def register(self, amount):
+        """Register a payment without a request (eg: payments of the benchmark). Return its authority"""
+        authority = uuid.uuid4().hex
+        with self.lock:
+            self.payments[authority] = int(amount)
+        return authority
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -1,3 +1,124 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from cart.models import Cart
+from order.checkout import checkout
+from order.models import Order
+from product.models import Category, Product
+from .gateway import gateway
+from .models import Payment
+from .processing import process_callback
+from .standin import FakeGatewayServer
+
+
+User = get_user_model()
+
+
+class TestPayment(TestCase):
+
+    def setUp(self) -> None:
+        self.server = FakeGatewayServer().__enter__()
+        self.settings = override_settings(PAYMENT_GATEWAY_URL=self.server.url)
+        self.settings.enable()
+        gateway.stop()
+        category = Category.objects.create(name='Giyim')
+        self.dress = Product.objects.create(category=category, name='Elbise', price=1000, discount=0,
+                                            quantity_available=5)
+        self.user = User.objects.create_user(username='ehsan', password='123456')
+        cart = Cart.objects.create(user=self.user)
+        cart.set_quantities({self.dress.pk: 2})
+        self.order = checkout(self.user, cart)
+        self.client.force_login(self.user)
+
+    def tearDown(self) -> None:
+        gateway.stop()
+        self.settings.disable()
+        self.server.__exit__()
+
+    def start(self):
+        return self.client.post(reverse('payment:payment-start', args=[self.order.order_id])).json()
+
+    def callback(self, authority, status='OK'):
+        return self.client.get(reverse('payment:payment-callback'), {'Authority': authority, 'Status': status}).json()
+
+    def test_payment(self):
+        """Test if the verified payment marks the order paid and completed and keeps its stock"""
+        data = self.start()
+        payment = Payment.objects.get(payment_id=data['payment_id'])
+        self.assertTrue(data['url'].endswith(f'/pay/{payment.authority}'))
+
+        data = self.callback(payment.authority)
+        self.assertEqual((data['code'], data['payment_status']), (200, Payment.PAID))
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertTrue(order.is_paid and order.is_completed)
+        self.assertTrue(Payment.objects.get(pk=payment.pk).is_paid)
+        self.assertFalse(Payment.objects.get(pk=payment.pk).needs_refund)
+        self.assertFalse(order.stock_reservation_order.exists())
+        self.assertEqual(Product.objects.get(pk=self.dress.pk).quantity_available, 3)
+
+    def test_not_completed_order(self):
+        """Test if a paid payment of an order that is not completed (eg: sold out) needs a refund"""
+        authority = Payment.objects.get(payment_id=self.start()['payment_id']).authority
+        with mock.patch.object(Order, 'complete_order', return_value=False), \
+                self.assertLogs('payment.processing', 'ERROR'):
+            self.assertEqual(self.callback(authority)['code'], 200)
+        self.assertTrue(Payment.objects.get(authority=authority).needs_refund)
+
+    def test_retried_callbacks(self):
+        """Test if the same callback verifies the payment only once"""
+        authority = Payment.objects.get(payment_id=self.start()['payment_id']).authority
+        codes = [self.callback(authority)['code'] for _ in range(3)]
+
+        self.assertEqual(codes, [200, 200, 200])
+        self.assertEqual(self.server.verifications[authority], 1)
+
+    def test_concurrent_callbacks(self):
+        """Test if only one of the concurrent callbacks verifies the payment"""
+        authority = Payment.objects.get(payment_id=self.start()['payment_id']).authority
+
+        async def callbacks():
+            return await asyncio.gather(*[process_callback(authority) for _ in range(10)])
+
+        async_to_sync(callbacks)()
+        self.assertEqual(self.server.verifications[authority], 1)
+        self.assertEqual(Payment.objects.get(authority=authority).status, Payment.PAID)
+
+    def test_start_again(self):
+        """Test if pressing the pay button again does not register another payment"""
+        self.assertEqual(self.start()['payment_id'], self.start()['payment_id'])
+        self.assertEqual(self.server.requests, 1)
+
+    def test_gateway_down(self):
+        """Test if a payment that is not verified because of the gateway is verified with the next callback"""
+        authority = Payment.objects.get(payment_id=self.start()['payment_id']).authority
+        self.server.fail_first = self.server.requests + 3
+
+        self.assertEqual(self.callback(authority)['code'], 503)
+        self.assertEqual(Payment.objects.get(authority=authority).status, Payment.PENDING)
+        self.assertEqual(self.callback(authority)['code'], 200)
+        self.assertTrue(Order.objects.get(pk=self.order.pk).is_paid)
+
+    def test_forged_cancel(self):
+        """Test if a callback with 'Status=NOK' of a payment that is paid in the gateway does not fail it"""
+        authority = Payment.objects.get(payment_id=self.start()['payment_id']).authority
+        self.assertEqual(self.callback(authority, status='NOK')['code'], 200)
+        self.assertEqual(self.callback(authority)['payment_status'], Payment.PAID)
+        self.assertTrue(Order.objects.get(pk=self.order.pk).is_paid)
+
+    def test_failed_payment(self):
+        """Test if canceled and declined payments do not change the order"""
+        canceled = Payment.objects.get(payment_id=self.start()['payment_id']).authority
+        self.server.declined.add(canceled)
+        self.assertEqual(self.callback(canceled, status='NOK')['code'], 402)
+        declined = Payment.objects.get(payment_id=self.start()['payment_id']).authority
+        self.server.declined.add(declined)
+        self.assertEqual(self.callback(declined)['code'], 402)
+
+        self.assertNotEqual(canceled, declined)
+        self.assertFalse(Order.objects.get(pk=self.order.pk).is_paid)
+        self.assertEqual(self.callback('unknown')['code'], 404)
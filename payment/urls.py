@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+
+app_name = 'payment'
+
+urlpatterns = [
+    path('start/<str:order_id>/', views.payment_start, name='payment-start'),
+    path('callback/', views.payment_callback, name='payment-callback'),
+]
@@ -1,3 +1,58 @@
-from django.shortcuts import render
+"""
+Json views of the payments (same response style of 'login.views').
 
-# Create your views here.
+** Views are async: they wait for the gateway (see 'payment.gateway') without holding a worker thread under ASGI, and
+database queries are run with 'sync_to_async'. 'require_POST' and 'require_GET' of Django 4.2 do not support async
+views, so the methods are checked in the views.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponseNotAllowed
+from django.urls import reverse
+
+from order.models import Order
+from .gateway import gateway, GatewayError
+from .models import Payment
+from .processing import process_callback, start_payment
+
+
+async def payment_start(request, order_id):
+    """Register the payment of the unpaid order of the user in the gateway and return the url of the gateway"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    user_id = await sync_to_async(lambda: request.user.pk)()
+    if user_id is None:
+        return JsonResponse(data={'msg': 'ابتدا وارد حساب کاربری شوید', 'status': 'nok', 'code': 401})
+    try:
+        order = await Order.objects.aget(order_id=order_id, user_id=user_id, is_paid=False)
+    except Order.DoesNotExist:
+        return JsonResponse(data={'msg': 'سفارش پیدا نشد', 'status': 'nok', 'code': 404})
+    try:
+        payment = await start_payment(order, request.build_absolute_uri(reverse('payment:payment-callback')))
+    except GatewayError:
+        return JsonResponse(data={'msg': 'درگاه پرداخت پاسخ نداد', 'status': 'nok', 'code': 503})
+    return JsonResponse(data={'msg': 'به درگاه پرداخت منتقل شوید', 'status': 'ok', 'code': 200,
+                              'payment_id': payment.payment_id, 'url': gateway.payment_url(payment.authority)})
+
+
+async def payment_callback(request):
+    """
+    Callback of the gateway with 'Authority' and 'Status'. The payment is verified with the gateway whatever the
+    'Status' is. Sending the same callback again changes nothing
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    authority = request.GET.get('Authority')
+    if not authority:
+        return JsonResponse(data={'msg': 'داده ای دریافت نشد', 'status': 'nok', 'code': 400})
+    try:
+        payment = await process_callback(authority)
+    except Payment.DoesNotExist:
+        return JsonResponse(data={'msg': 'پرداخت پیدا نشد', 'status': 'nok', 'code': 404})
+    except GatewayError:
+        return JsonResponse(data={'msg': 'درگاه پرداخت پاسخ نداد', 'status': 'nok', 'code': 503})
+    data = {'payment_id': payment.payment_id, 'payment_status': payment.status, 'reference': payment.reference}
+    if payment.status == Payment.PAID:
+        return JsonResponse(data={'msg': 'پرداخت با موفقیت انجام شد', 'status': 'ok', 'code': 200, **data})
+    if payment.status == Payment.VERIFYING:
+        return JsonResponse(data={'msg': 'پرداخت در حال بررسی است', 'status': 'ok', 'code': 202, **data})
+    return JsonResponse(data={'msg': 'پرداخت انجام نشد', 'status': 'nok', 'code': 402, **data})
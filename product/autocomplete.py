@@ -0,0 +1,294 @@
+"""
+Search-as-you-type suggestions of product, brand and category names from the memory of the process.
+
+** Suggestions are phrases: distinct normalized product names (see 'product.search.normalize'), brand names and
+category names with a popularity score (sold quantity of the products with the name, active products of the brand
+and of the category subtree). Every word of a phrase could be the start of the prefix ('elb' finds 'siyah elbise').
+
+** The index is a sorted array of the keys (every phrase from each of its first words) with the phrase of every key,
+so the keys of a prefix are one range found with binary search. Ranges bigger than 'SCAN_LIMIT' keys (short and
+common prefixes) have their best phrases precomputed, so a lookup never scans more than 'SCAN_LIMIT' keys. Only the
+'AUTOCOMPLETE_MAX_PHRASES' most popular phrases are kept, so the memory is bounded.
+
+** Building the index is slow, so it's built by 'manage.py build_autocomplete' and saved in a snapshot file
+('AUTOCOMPLETE_SNAPSHOT', a 'marshal' dump of the arrays) that workers load in a background thread at startup (see
+'config.wsgi', requests get no suggestions until it's loaded). Then products changed after the snapshot (the crawler
+sets 'Product.updated') are read by the same thread every 'AUTOCOMPLETE_REFRESH' seconds and their names are added to
+a small second index that is merged into the main one when it has 'AUTOCOMPLETE_OVERLAY_SIZE' phrases. Deleted and
+deactivated products are removed with the next snapshot.
+"""
+import bisect
+import heapq
+import logging
+import marshal
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, DatabaseError
+from django.db.models import Sum, Count, Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Product, Brand, FacetCount
+from .search import normalize
+from .tree import get_category_tree
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+PRODUCT, BRAND, CATEGORY = 'product', 'brand', 'category'
+# Phrases are found from their first words only (the last words of long names are details like sizes)
+MAX_WORDS = 4
+SCAN_LIMIT = 256
+# Kept suggestions of every big range (more than the suggestions of a page)
+TOP_SIZE = 20
+# Greater than every character of the keys, 'prefix + END' is the end of the range of the prefix
+END = '\uffff'
+
+
+def phrase_keys(text):
+    """Keys of the normalized text: the text from the start of each of its first words"""
+    words = text.split(' ')
+    return [' '.join(words[i:]) for i in range(min(len(words), MAX_WORDS))]
+
+
+class AutocompleteIndex:
+    """
+    Sorted keys of the phrases. 'phrases' are '(text, kind, id, score)' with normalized texts. 'top' is the best
+    phrases of the prefixes with more than 'SCAN_LIMIT' keys
+    """
+    def __init__(self, phrases, keys=None, refs=None, top=None):
+        self.phrases = phrases
+        if keys is None:
+            pairs = sorted((key, i) for i, phrase in enumerate(phrases) for key in phrase_keys(phrase[0]))
+            keys, refs = [key for key, i in pairs], [i for key, i in pairs]
+        self.keys = keys
+        self.refs = refs
+        self.top = self.build_top() if top is None else top
+
+    def best(self, refs, limit):
+        """Best distinct phrases of the refs"""
+        return heapq.nlargest(limit, set(refs), key=lambda i: self.phrases[i][3])
+
+    def build_top(self):
+        top = dict()
+        if len(self.keys) > SCAN_LIMIT:
+            self.collect_top(top, 0, len(self.keys), 0)
+        return top
+
+    def collect_top(self, top, start, end, length):
+        """
+        Best phrases of the keys from 'start' to 'end' (they have the same first 'length' characters). Best phrases of
+        a big range are made from the best phrases of its big subranges, so every key is read once
+        """
+        candidates = []
+        position = start
+        while position < end:
+            key = self.keys[position]
+            if len(key) <= length:
+                candidates.append(self.refs[position])
+                position += 1
+                continue
+            prefix = key[:length + 1]
+            group_end = bisect.bisect_left(self.keys, prefix + END, position, end)
+            if group_end - position > SCAN_LIMIT:
+                candidates += self.collect_top(top, position, group_end, length + 1)
+            else:
+                candidates += self.refs[position:group_end]
+            position = group_end
+        best = self.best(candidates, TOP_SIZE)
+        if length:
+            top[self.keys[start][:length]] = best
+        return best
+
+    def lookup(self, key, limit):
+        """'(score, phrase index)' of the best phrases with a key that starts with 'key'"""
+        refs = self.top.get(key)
+        if refs is None:
+            start = bisect.bisect_left(self.keys, key)
+            end = bisect.bisect_left(self.keys, key + END, start, min(len(self.keys), start + SCAN_LIMIT + 1))
+            refs = self.best(self.refs[start:end], limit)
+        return [(self.phrases[i][3], i) for i in refs[:limit]]
+
+    def dump(self):
+        return marshal.dumps((SNAPSHOT_VERSION, self.phrases, self.keys, self.refs, self.top))
+
+    @classmethod
+    def load(cls, data):
+        version, phrases, keys, refs, top = marshal.loads(data)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f'autocomplete snapshot version {version} is not supported')
+        return cls(phrases, keys, refs, top)
+
+
+def bounded(phrases):
+    """The most popular 'AUTOCOMPLETE_MAX_PHRASES' phrases (one phrase for every text and kind)"""
+    unique = dict()
+    for text, kind, pk, score in phrases:
+        if text and ((text, kind) not in unique or unique[(text, kind)][3] < score):
+            unique[(text, kind)] = (text, kind, pk, score)
+    return heapq.nlargest(settings.AUTOCOMPLETE_MAX_PHRASES, unique.values(), key=lambda phrase: phrase[3])
+
+
+def read_phrases():
+    """Phrases of the active products, brands and categories with their popularity (four queries)"""
+    from order.models import OrderLine
+    sold = dict(OrderLine.objects.filter(product__isnull=False).values('product')
+                .annotate(total=Sum('quantity')).values_list('product', 'total'))
+    names = dict()
+    for pk, name in Product.objects.filter(is_active=True).values_list('id', 'name').iterator(chunk_size=5000):
+        text = normalize(name)
+        score = names.get(text, (0, 0))[1] + 1 + sold.get(pk, 0)
+        names[text] = (pk, score)
+    phrases = [(text, PRODUCT, pk, score) for text, (pk, score) in names.items()]
+    brands = dict(Product.objects.filter(is_active=True, brand__isnull=False).values('brand')
+                  .annotate(total=Count('id')).values_list('brand', 'total'))
+    phrases += [(normalize(name), BRAND, pk, brands.get(pk, 0))
+                for pk, name in Brand.objects.values_list('id', 'name')]
+    tree = get_category_tree()
+    counts = dict(FacetCount.objects.filter(facet=FacetCount.ACTIVE, value=1).values_list('category', 'count'))
+    phrases += [(normalize(node.name), CATEGORY, node.id, sum(counts.get(pk, 0) for pk in tree.subtree_ids(node.id)))
+                for node in tree.nodes.values()]
+    return phrases
+
+
+class Autocomplete:
+    """Main index (from the snapshot) and the index of the phrases that are added after it"""
+    def __init__(self, index, watermark=None):
+        """'watermark' is '(updated, id)' of the last product that is read (products are read in this order)"""
+        self.index = index
+        self.overlay = AutocompleteIndex([])
+        self.added = []
+        self.watermark = watermark
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls):
+        """Build the index from the database (slow, see 'manage.py build_autocomplete')"""
+        watermark = Product.objects.order_by('-updated', '-id').values_list('updated', 'id').first()
+        return cls(AutocompleteIndex(bounded(read_phrases())), watermark)
+
+    def save(self, path):
+        """Write the snapshot (the file is replaced at once, so workers never read a half written file)"""
+        with open(path + '.tmp', 'wb') as f:
+            watermark = (self.watermark[0].isoformat(), self.watermark[1]) if self.watermark else None
+            f.write(marshal.dumps((watermark, self.index.dump())))
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            watermark, index = marshal.loads(f.read())
+        if watermark:
+            updated, pk = watermark
+            watermark = (parse_datetime(updated), pk)
+        return cls(AutocompleteIndex.load(index), watermark)
+
+    def suggest(self, query, limit=10):
+        """The best suggestions of the query: '[{"text", "kind", "id"}]'"""
+        key = normalize(query)
+        if not key:
+            return []
+        index, overlay = self.index, self.overlay
+        found = index.lookup(key, limit) + [(score, -i - 1) for score, i in overlay.lookup(key, limit)]
+        results, seen = [], set()
+        for score, i in sorted(found, reverse=True):
+            text, kind, pk, score = index.phrases[i] if i >= 0 else overlay.phrases[-i - 1]
+            if (text, kind) not in seen:
+                seen.add((text, kind))
+                results.append({'text': text, 'kind': kind, 'id': pk})
+        return results[:limit]
+
+    def add(self, phrases):
+        """
+        Add new phrases. The second index is built again (it's small) and merged when it's full. Phrases that are in
+        the main index too are shown once (see 'suggest')
+        """
+        with self.lock:
+            known = {(phrase[0], phrase[1]) for phrase in self.added}
+            self.added += [phrase for phrase in phrases if phrase[0] and (phrase[0], phrase[1]) not in known]
+            if len(self.added) >= settings.AUTOCOMPLETE_OVERLAY_SIZE:
+                self.index = AutocompleteIndex(bounded(self.index.phrases + self.added))
+                self.added = []
+            self.overlay = AutocompleteIndex(list(self.added))
+
+    def refresh(self):
+        """Add names of the products (and their brands) that are changed after the last refresh"""
+        products = Product.objects.filter(is_active=True).order_by('updated', 'id')
+        if self.watermark:
+            # Many products have the same 'updated' (crawled together), so rows after a page are found by 'id' too
+            updated, pk = self.watermark
+            products = products.filter(Q(updated__gt=updated) | Q(updated=updated, id__gt=pk))
+        rows = list(products.values_list('id', 'name', 'brand', 'brand__name', 'updated')
+                    [:settings.AUTOCOMPLETE_OVERLAY_SIZE])
+        if rows:
+            phrases = [(normalize(name), PRODUCT, pk, 1) for pk, name, brand, brand_name, updated in rows]
+            phrases += [(normalize(brand_name), BRAND, brand, 1) for pk, name, brand, brand_name, updated in rows
+                        if brand]
+            self.add(phrases)
+            self.watermark = (rows[-1][4], rows[-1][0])
+        return len(rows)
+
+
+_autocomplete = None
+_lock = threading.Lock()
+
+
+def load_autocomplete():
+    """Index from the snapshot, or built from the database if there is no snapshot (empty if the database fails)"""
+    path = settings.AUTOCOMPLETE_SNAPSHOT
+    try:
+        return Autocomplete.load(path)
+    except (OSError, ValueError, EOFError, TypeError) as e:
+        logger.warning('autocomplete snapshot %s is not loaded (%r), building it from the database', path, e)
+    try:
+        return Autocomplete.build()
+    except DatabaseError:
+        # eg: a database that is not migrated yet. Products are added by the next refreshes
+        logger.exception('autocomplete index is not built, starting with an empty index')
+        return Autocomplete(AutocompleteIndex([]))
+
+
+def get_autocomplete():
+    """Index of this process. It's loaded on the first call, other calls get an empty index until it's loaded"""
+    global _autocomplete
+    if _autocomplete is None:
+        # Requests don't wait for the index that is loaded by the refresher thread (or another request)
+        if not _lock.acquire(blocking=False):
+            return Autocomplete(AutocompleteIndex([]))
+        try:
+            if _autocomplete is None:
+                _autocomplete = load_autocomplete()
+        finally:
+            _lock.release()
+    return _autocomplete
+
+
+def reset_autocomplete():
+    global _autocomplete
+    _autocomplete = None
+
+
+def start_refresher():
+    """
+    Load the index and add changed products in a background thread (called once by every worker at startup), so
+    starting the worker doesn't wait for the index or the database
+    """
+    def run():
+        try:
+            get_autocomplete()
+        finally:
+            connection.close()
+        while settings.AUTOCOMPLETE_REFRESH:
+            time.sleep(settings.AUTOCOMPLETE_REFRESH)
+            try:
+                if _autocomplete is not None:
+                    _autocomplete.refresh()
+            except Exception:
+                logger.exception('autocomplete refresh failed')
+            finally:
+                connection.close()
+
+    threading.Thread(target=run, name='autocomplete-refresher', daemon=True).start()
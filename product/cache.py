@@ -0,0 +1,60 @@
+"""
+Cache of the catalog reads: product details, category listings and brand pages of the catalog api.
+
+** Pages are cached in 'catalog_cache' (see '_resources.cache') by the hash of their parameters (see
+'ProductViewSet.cache_name') with the versions of these groups:
+    product detail:     'product:<slug>', 'categories', 'brands'
+    category listing:   'category:<id>', 'categories', 'brands'
+    brand page:         'brand:<id>', 'categories', 'brands'
+A product that is saved, deleted, activated, deactivated or upserted by the crawler invalidates its detail, the
+listings of its category and all the ancestors of the category (listings have the products of the subtree) and its
+brand page, before and after the change. Categories and brands change rarely and their names are in every page, so
+saving or deleting any of them invalidates all the pages ('categories' or 'brands' group). Versions are increased at
+once and again when the transaction commits: a page that is read before the commit has the old rows.
+
+** A popular product that the crawler changes is read by many requests at the same time. Its page is computed by one
+of them, the others get the old page until the new one is cached (see '_resources.cache').
+"""
+from django.db import transaction
+
+from _resources.cache import TieredCache
+from .tree import get_category_tree
+
+
+CATEGORIES = 'categories'
+BRANDS = 'brands'
+
+catalog_cache = TieredCache('catalog')
+
+
+def detail_groups(slug):
+    return [f'product:{slug}', CATEGORIES, BRANDS]
+
+
+def listing_groups(category_id=None, brand_id=None):
+    groups = [f'category:{category_id}'] if category_id is not None else []
+    groups += [f'brand:{brand_id}'] if brand_id is not None else []
+    return groups + [CATEGORIES, BRANDS]
+
+
+def product_groups(slugs, states):
+    """Groups of the products with the slugs and their facet states (see 'product.facets.facet_state')"""
+    tree = get_category_tree()
+    groups = {f'product:{slug}' for slug in slugs}
+    for state in states:
+        groups.update(f'category:{node.id}' for node in tree.breadcrumbs(state.category))
+        if state.brand:
+            groups.add(f'brand:{state.brand}')
+    return groups
+
+
+def invalidate(groups):
+    groups = set(groups)
+    catalog_cache.invalidate(groups)
+    transaction.on_commit(lambda: catalog_cache.invalidate(groups))
+
+
+def invalidate_products(slugs, *states):
+    """Invalidate the pages of the products. 'states' are 'product id: FacetState' before and after the change"""
+    invalidate(product_groups(slugs, [state for changes in states for state in changes.values()]))
+
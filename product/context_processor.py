@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .tree import get_category_tree
+
+
+def category_tree(request):
+    """Category tree for menus and breadcrumbs of all the templates. It's read from memory and not from database"""
+    return {'category_tree': SimpleLazyObject(get_category_tree)}
@@ -0,0 +1,317 @@
+"""
+Facet counts of the catalog pages: 'Brand (123)', 'Price 0-500 (456)', 'Active (789)'.
+
+** Counts of every category (only its own products) are kept in 'FacetCount' and changed with deltas when products
+are upserted, saved, deleted, activated or deactivated ('record_changes', one statement for a batch). Counts of a
+category page (the category and all of its subcategories) without any selection are the sum of the rows of the
+subtree: one query over a small table instead of 'COUNT(*) GROUP BY' over the products.
+
+** Counts with selections (eg: brand 3 or 7 and price 500-1000) are computed with 'FacetIndex': bitmaps (python ints,
+bit n is the n-th product of the page) of every brand, price bucket and active flag. Selected values of a facet are
+'or'ed, facets are 'and'ed and counts are 'int.bit_count'. Counts of every facet are computed with the selections of
+the other facets only, so selecting a brand does not hide the other brands. A bitmap takes a bit for every product of
+the page, so rare values (most of the brands of a big page) are kept as sorted positions instead (4 bytes for every
+product of the value) and they are counted by reading the bits of the masks at their positions.
+
+** Bitmaps of the pages that are requested 'FACET_INDEX_WARM_HITS' times are built (one query) and every process keeps
+the last 'FACET_INDEX_SIZE' of them for 'FACET_INDEX_TIMEOUT' seconds. Changes made in the process update them
+incrementally when their transaction commits, other processes see the changes after the timeout. Selections of the
+cold pages are counted with SQL.
+"""
+import bisect
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, F, Sum, Count, Case, When, Value
+
+from .models import Product, FacetCount
+from .tree import get_category_tree
+
+
+# Facet values of a product: brand 0 is no brand and 'bucket' is the index of the price bucket
+FacetState = namedtuple('FacetState', ['category', 'brand', 'bucket', 'is_active'])
+STATE_FIELDS = ['id', 'category_id', 'brand_id', 'price', 'discount', 'is_active']
+
+
+def price_bucket(price, discount):
+    """Index of the bucket of the selling price in 'FACET_PRICE_BUCKETS'"""
+    return max(0, bisect.bisect_right(settings.FACET_PRICE_BUCKETS, price - min(discount, price)) - 1)
+
+
+def price_ranges():
+    """'(low, high)' of every price bucket. 'high' of the last bucket is None"""
+    bounds = settings.FACET_PRICE_BUCKETS
+    return [(low, bounds[i + 1] if i + 1 < len(bounds) else None) for i, low in enumerate(bounds)]
+
+
+def facet_state(category_id, brand_id, price, discount, is_active):
+    return FacetState(category_id, brand_id or 0, price_bucket(price, discount), bool(is_active))
+
+
+def read_states(queryset):
+    """'product id: FacetState' of the products of the queryset with one query"""
+    return {pk: facet_state(*values) for pk, *values in queryset.values_list(*STATE_FIELDS).iterator(chunk_size=2000)}
+
+
+def state_keys(state):
+    """Facet values of the state. Brand and price are counted for active products only"""
+    keys = [(FacetCount.ACTIVE, int(state.is_active))]
+    if state.is_active:
+        keys += [(FacetCount.BRAND, state.brand), (FacetCount.PRICE, state.bucket)]
+    return keys
+
+
+def record_changes(old, new):
+    """
+    Change the facet counts and the bitmaps of this process. 'old' and 'new' are 'product id: FacetState' before and
+    after the change (missing products are new or deleted ones)
+    """
+    deltas = Counter()
+    for pk in set(old) | set(new):
+        if old.get(pk) == new.get(pk):
+            continue
+        if pk in old:
+            deltas.subtract({(old[pk].category, *key): 1 for key in state_keys(old[pk])})
+        if pk in new:
+            deltas.update({(new[pk].category, *key): 1 for key in state_keys(new[pk])})
+    FacetCount.objects.add_counts(deltas)
+    if deltas:
+        # Bitmaps of a rolled back transaction are not changed
+        changes = {pk: new.get(pk) for pk in set(old) | set(new) if old.get(pk) != new.get(pk)}
+        transaction.on_commit(lambda: indexes.apply(changes))
+
+
+def selection_filter(brands=(), prices=()):
+    """Filter of the products of the selected brands and price buckets"""
+    condition = Q()
+    if brands:
+        condition &= Q(brand__in=[brand for brand in brands if brand]) | (Q(brand__isnull=True) if 0 in brands else Q())
+    if prices:
+        ranges = price_ranges()
+        price = Q()
+        for bucket in prices:
+            low, high = ranges[bucket]
+            price |= Q(selling__gte=low, selling__lt=high) if high is not None else Q(selling__gte=low)
+        condition &= price
+    return condition
+
+
+# Values of less than 1/'SPARSE_RATIO' of the products of the page are kept as positions (32 bits for every product)
+SPARSE_RATIO = 32
+
+
+def make_bitmap(positions, size):
+    """Int with the bits of the positions"""
+    data = bytearray((size + 7) // 8)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+def compact(positions, size):
+    """Sorted positions of a rare value, bitmap of the others"""
+    if len(positions) * SPARSE_RATIO < size:
+        return array('I', positions)
+    return make_bitmap(positions, size)
+
+
+def to_bitmap(value):
+    return make_bitmap(value, value[-1] + 1 if value else 0) if isinstance(value, array) else value
+
+
+class FacetIndex:
+    """Bitmaps (or sorted positions, see 'compact') of the facet values of the products of a category page"""
+    def __init__(self, category_ids, states):
+        self.category_ids = set(category_ids)
+        states = {pk: state for pk, state in states.items() if state.category in self.category_ids}
+        self.ids = list(states)
+        self.positions = {pk: position for position, pk in enumerate(self.ids)}
+        self.states = list(states.values())
+        # Setting bits of a big int one by one copies it every time, so bitmaps are made from bytes
+        positions = dict()
+        for position, state in enumerate(self.states):
+            for key in state_keys(state):
+                positions.setdefault(key, []).append(position)
+        self.bitmaps = {key: compact(values, len(self.ids)) for key, values in positions.items()}
+        self.loaded = time.monotonic()
+
+    @classmethod
+    def load(cls, category_ids):
+        return cls(category_ids, read_states(Product.objects.filter(category__in=category_ids).order_by('id')))
+
+    def apply(self, pk, state):
+        """Set the new state of the product (None if it's deleted)"""
+        if state is not None and state.category not in self.category_ids:
+            state = None
+        position = self.positions.get(pk)
+        if position is None:
+            if state is None:
+                return
+            position = self.positions[pk] = len(self.ids)
+            self.ids.append(pk)
+            self.states.append(None)
+        if self.states[position] is not None:
+            for key in state_keys(self.states[position]):
+                self.remove(key, position)
+        if state is not None:
+            for key in state_keys(state):
+                self.add(key, position)
+        self.states[position] = state
+
+    def add(self, key, position):
+        value = self.bitmaps.get(key, 0)
+        if not isinstance(value, array):
+            self.bitmaps[key] = value | 1 << position if value else compact([position], len(self.ids))
+            return
+        value.insert(bisect.bisect_left(value, position), position)
+        if len(value) * SPARSE_RATIO >= len(self.ids):
+            self.bitmaps[key] = make_bitmap(value, len(self.ids))
+
+    def remove(self, key, position):
+        value = self.bitmaps[key]
+        if not isinstance(value, array):
+            self.bitmaps[key] = value & ~(1 << position)
+            return
+        i = bisect.bisect_left(value, position)
+        if i < len(value) and value[i] == position:
+            del value[i]
+
+    def union(self, facet, values):
+        """Bitmap of the products with any of the values of the facet ('all the active products' if it's empty)"""
+        if not values:
+            return to_bitmap(self.bitmaps.get((FacetCount.ACTIVE, 1), 0))
+        bitmap = 0
+        for value in values:
+            bitmap |= to_bitmap(self.bitmaps.get((facet, value), 0))
+        return bitmap
+
+    def counts(self, brands=(), prices=()):
+        brand_mask = self.union(FacetCount.BRAND, brands)
+        price_mask = self.union(FacetCount.PRICE, prices)
+        # Bits of the masks are read at the positions of the rare values
+        size = (len(self.ids) + 7) // 8
+        brand_bytes, price_bytes = brand_mask.to_bytes(size, 'little'), price_mask.to_bytes(size, 'little')
+        counts = {FacetCount.BRAND: dict(), FacetCount.PRICE: dict(), FacetCount.ACTIVE: dict()}
+        for (facet, value), bitmap in self.bitmaps.items():
+            mask, data = (price_mask, price_bytes) if facet == FacetCount.BRAND else \
+                (brand_mask, brand_bytes) if facet == FacetCount.PRICE else (-1, None)
+            if not isinstance(bitmap, array):
+                count = (bitmap & mask).bit_count()
+            elif data is None:
+                count = len(bitmap)
+            else:
+                count = sum(data[position >> 3] >> (position & 7) & 1 for position in bitmap)
+            if count:
+                counts[facet][value] = count
+        counts['total'] = (brand_mask & price_mask).bit_count()
+        return counts
+
+    def product_ids(self, brands=(), prices=()):
+        """Ids of the active products of the selections (in the order of the ids)"""
+        bitmap = self.union(FacetCount.BRAND, brands) & self.union(FacetCount.PRICE, prices)
+        return [self.ids[position] for position, bit in enumerate(reversed(bin(bitmap)[2:])) if bit == '1']
+
+
+class FacetIndexes:
+    """
+    Bitmaps of the warm category pages of this process (LRU). Changes that are applied while a page is loaded are
+    kept and applied to it after it's loaded (its products may be read before the change)
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indexes = OrderedDict()
+        self.hits = Counter()
+        self.loading = dict()
+
+    def get(self, category_id):
+        """Bitmaps of the page. None if the page is cold (it's built after 'FACET_INDEX_WARM_HITS' requests)"""
+        with self.lock:
+            index = self.indexes.get(category_id)
+            if index is not None and time.monotonic() - index.loaded < settings.FACET_INDEX_TIMEOUT:
+                self.indexes.move_to_end(category_id)
+                return index
+            self.indexes.pop(category_id, None)
+            self.hits[category_id] += 1
+            if self.hits[category_id] < settings.FACET_INDEX_WARM_HITS:
+                if len(self.hits) > settings.FACET_INDEX_SIZE * 100:
+                    self.hits.clear()
+                return None
+            del self.hits[category_id]
+            load, changes = object(), []
+            self.loading[load] = changes
+        try:
+            index = FacetIndex.load(get_category_tree().subtree_ids(category_id))
+        except BaseException:
+            with self.lock:
+                del self.loading[load]
+            raise
+        with self.lock:
+            del self.loading[load]
+            for states in changes:
+                for pk, state in states.items():
+                    index.apply(pk, state)
+            self.indexes[category_id] = index
+            while len(self.indexes) > settings.FACET_INDEX_SIZE:
+                self.indexes.popitem(last=False)
+        return index
+
+    def apply(self, states):
+        with self.lock:
+            for changes in self.loading.values():
+                changes.append(states)
+            for index in self.indexes.values():
+                for pk, state in states.items():
+                    index.apply(pk, state)
+
+    def reset(self):
+        with self.lock:
+            self.indexes.clear()
+            self.hits.clear()
+
+
+indexes = FacetIndexes()
+
+
+def subtree_counts(category):
+    """Precomputed counts of the page without any selection (one query)"""
+    rows = FacetCount.objects.filter(category__in=get_category_tree().subtree_ids(category.id), count__gt=0)\
+        .values('facet', 'value').annotate(total=Sum('count')).values_list('facet', 'value', 'total')
+    counts = {FacetCount.BRAND: dict(), FacetCount.PRICE: dict(), FacetCount.ACTIVE: dict()}
+    for facet, value, total in rows:
+        if total:
+            counts[facet][value] = total
+    counts['total'] = counts[FacetCount.ACTIVE].get(1, 0)
+    return counts
+
+
+def sql_counts(category, brands=(), prices=()):
+    """Counts of the selections of a cold page with SQL"""
+    ranges = price_ranges()
+    products = Product.objects.in_category(category).filter(is_active=True).annotate(selling=F('price') - F('discount'))
+    by_brand = products.filter(selection_filter(prices=prices)).values('brand').annotate(total=Count('id'))
+    by_price = products.filter(selection_filter(brands=brands))\
+        .annotate(bucket=Case(*[When(selling__gte=low, then=Value(i)) for i, (low, high) in reversed(list(enumerate(ranges)))],
+                              default=Value(0)))\
+        .values('bucket').annotate(total=Count('id'))
+    counts = {FacetCount.BRAND: {row['brand'] or 0: row['total'] for row in by_brand},
+              FacetCount.PRICE: {row['bucket']: row['total'] for row in by_price},
+              FacetCount.ACTIVE: subtree_counts(category)[FacetCount.ACTIVE]}
+    counts['total'] = products.filter(selection_filter(brands, prices)).count()
+    return counts
+
+
+def facet_counts(category, brands=(), prices=()):
+    """
+    Facet counts of the category page: '{"brand": {brand id: n}, "price": {bucket: n}, "active": {1: n, 0: n},
+    "total": n}'. Counts of every facet are filtered by the selections of the other facets
+    """
+    if not brands and not prices:
+        return subtree_counts(category)
+    index = indexes.get(category.id)
+    if index is not None:
+        return index.counts(brands, prices)
+    return sql_counts(category, brands, prices)
@@ -0,0 +1,79 @@
+"""
+Benchmark the autocomplete index (see 'product.autocomplete') over synthetic phrases:
+    python manage.py bench_autocomplete --phrases 500000 --lookups 20000
+Phrases are made like the crawled product names (see 'bench_search') without the database. Time of building the
+index, writing and loading the snapshot, memory of the index and latency percentiles of every kind of prefix are
+reported.
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from product.autocomplete import Autocomplete, AutocompleteIndex, PRODUCT, BRAND
+from product.search import normalize
+from .bench_search import COLORS, FABRICS, STYLES, TYPES
+
+
+PREFIXES = {
+    'one letter': ['s', 'k', 'e', 'm', 'p'],
+    'short': ['si', 'elb', 'gom', 'kaz', 'pam'],
+    'word': ['siyah', 'elbise', 'pamuklu', 'kadife', 'sneaker'],
+    'two words': ['siyah pam', 'deri cek', 'mavi denim', 'oversize ka', 'keten gomlek'],
+    'rare': ['brand 777', 'model 4242', 'kirmizi saten kruvaze', 'haki polar fermuarli bot', 'yok'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark autocomplete lookups over synthetic phrases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--phrases', type=int, default=500000)
+        parser.add_argument('--lookups', type=int, default=20000, help='Lookups of every kind of prefix')
+
+    def phrases(self, count):
+        rng = random.Random(count)
+        phrases = [(normalize(f'Brand {pk}'), BRAND, pk, rng.randint(0, 5000)) for pk in range(1, 2001)]
+        for pk in range(1, count - len(phrases) + 1):
+            name = (f'{rng.choice(COLORS)} {rng.choice(FABRICS)} {rng.choice(STYLES)} '
+                    f'{TYPES[min(int(rng.paretovariate(1.2)) - 1, len(TYPES) - 1)]} Model {rng.randint(1, 9999)}')
+            phrases.append((normalize(name), PRODUCT, pk, int(rng.paretovariate(1.1))))
+        return phrases
+
+    def handle(self, *args, **options):
+        phrases = self.phrases(options['phrases'])
+        tracemalloc.start()
+        started = time.perf_counter()
+        autocomplete = Autocomplete(AutocompleteIndex(phrases))
+        built = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(f'{len(phrases)} phrases, {len(autocomplete.index.keys)} keys, '
+                          f'{len(autocomplete.index.top)} precomputed prefixes built in {built:.1f}s '
+                          f'({memory / 2 ** 20:.0f}MB)')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'autocomplete.snapshot')
+            started = time.perf_counter()
+            autocomplete.save(path)
+            saved = time.perf_counter() - started
+            started = time.perf_counter()
+            autocomplete = Autocomplete.load(path)
+            self.stdout.write(f'snapshot of {os.path.getsize(path) / 2 ** 20:.1f}MB written in {saved:.2f}s, '
+                              f'loaded in {time.perf_counter() - started:.2f}s')
+
+        for kind, prefixes in PREFIXES.items():
+            timings, found = [], 0
+            for i in range(options['lookups']):
+                started = time.perf_counter()
+                found += len(autocomplete.suggest(prefixes[i % len(prefixes)]))
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(f'{kind:10} p50 {statistics.median(timings):6.3f}ms  '
+                              f'p99 {timings[int(len(timings) * 0.99) - 1]:6.3f}ms  '
+                              f'p99.9 {timings[int(len(timings) * 0.999) - 1]:6.3f}ms  '
+                              f'({found / len(timings):.1f} results)')
@@ -0,0 +1,133 @@
+"""
+Thundering herd benchmark of the catalog cache (see '_resources.cache'):
+    python manage.py bench_cache_stampede --processes 4 --threads 16 --rounds 10
+The price of a popular product is changed (like the crawler does) and right after that every thread of every process
+requests its page at the same time, for 'rounds' times. Processes are 'TieredCache' objects of this process over one
+stand-in of the shared cache with the latency of a network round trip ('_resources.cache_standin'), their threads are
+threads of this process. It's run with the cache before single-flight (every reader that misses computes the page) and
+with the current cache. Computations of the page (database reads), stale and coalesced reads and p50/p99 latency are
+reported. Benchmark products are deleted at the end.
+"""
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from _resources.cache import TieredCache
+from product import cache, views
+from product.models import Category, Brand, Product
+from product.views import ProductViewSet
+
+
+class NaiveCache(TieredCache):
+    """'TieredCache.get_or_set' before single-flight and stale values"""
+    MISSING = object()
+
+    def get_or_set(self, name, groups, compute):
+        key = self.make_key(name, groups)
+        value = self.local.get(key, self.MISSING)
+        if value is not self.MISSING:
+            self.count('local_hits')
+            return value
+        value = self.shared.get(key, self.MISSING)
+        if value is not self.MISSING:
+            self.count('shared_hits')
+        else:
+            self.count('misses')
+            value = compute()
+            self.shared.set(key, value, self.timeout)
+        self.local.set(key, value, min(self.local_timeout, self.timeout))
+        return value
+
+
+class ThreadCache(threading.local):
+    """'catalog_cache' of the views in the benchmark: the cache of the process that the thread belongs to"""
+    process = None
+
+    def __getattr__(self, name):
+        return getattr(self.process, name)
+
+
+def percentile(values, p):
+    return statistics.quantiles(values, n=100)[p - 1] * 1000 if len(values) > 1 else 0
+
+
+class Command(BaseCommand):
+    help = 'Compare database reads and latency of a popular product page after its price is changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=10)
+        parser.add_argument('--latency', type=float, default=0.0005, help='Seconds of a shared cache round trip')
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name='Bench Stampede')
+        brand = Brand.objects.create(name='Bench Stampede')
+        product = Product.objects.create(category=category, brand=brand, name='Bench Stampede',
+                                         description='Uzun ürün açıklaması. ' * 40, price=100, discount=0,
+                                         quantity_available=10)
+        shared = {'BACKEND': '_resources.cache_standin.StandInCache', 'OPTIONS': {'LATENCY': options['latency']}}
+        old_cache, thread_cache = cache.catalog_cache, ThreadCache()
+        self.stdout.write(f'{options["processes"]} processes x {options["threads"]} threads, {options["rounds"]} '
+                          f'price changes, shared cache round trip {options["latency"] * 1000:.1f}ms')
+        try:
+            for name, cache_class in (('without single-flight', NaiveCache), ('single-flight', TieredCache)):
+                caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                          'bench': dict(shared, LOCATION=f'bench-stampede-{cache_class.__name__}')}
+                with override_settings(CACHES=caches):
+                    processes = [cache_class('catalog', alias='bench') for i in range(options['processes'])]
+                    views.catalog_cache = thread_cache
+                    timings = self.run(product, processes, thread_cache, options)
+                    self.report(name, timings, processes)
+        finally:
+            cache.catalog_cache = views.catalog_cache = old_cache
+            product.delete()
+            brand.delete()
+            category.delete()
+
+    def run(self, product, processes, thread_cache, options):
+        factory = APIRequestFactory()
+        view = ProductViewSet.as_view({'get': 'retrieve'})
+        timings = []
+        timings_lock = threading.Lock()
+
+        def request(process, barrier):
+            thread_cache.process = process
+            barrier.wait()
+            started = time.perf_counter()
+            view(factory.get(f'/product/catalog/{product.slug}/'), slug=product.slug).render()
+            with timings_lock:
+                timings.append(time.perf_counter() - started)
+            connection.close()
+
+        # The page is cached before the first change
+        thread_cache.process = processes[0]
+        view(factory.get(f'/product/catalog/{product.slug}/'), slug=product.slug).render()
+        for i in range(options['rounds']):
+            cache.catalog_cache = processes[0]
+            product.price += 1
+            product.save()
+            # Versions of the other processes are cached for 'TIERED_CACHE_LOCAL_TIMEOUT' seconds
+            for process in processes:
+                process.local.clear()
+            barrier = threading.Barrier(len(processes) * options['threads'])
+            threads = [threading.Thread(target=request, args=(process, barrier))
+                       for process in processes for j in range(options['threads'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return timings
+
+    def report(self, name, timings, processes):
+        stats = [process.stats() for process in processes]
+        # The first read of the page (before the changes) is not counted
+        computed = sum(s['misses'] for s in stats) - 1
+        self.stdout.write(f'{name:24} page computed {computed:5} times  stale {sum(s["stale"] for s in stats):5}  '
+                          f'coalesced {sum(s["coalesced"] for s in stats):5}  p50 {percentile(timings, 50):7.1f}ms  '
+                          f'p99 {percentile(timings, 99):7.1f}ms')
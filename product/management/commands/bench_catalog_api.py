@@ -0,0 +1,92 @@
+"""
+Benchmark serialization throughput of the catalog api (see 'product.views.ProductViewSet'):
+    python manage.py bench_catalog_api --products 10000
+Synthetic products are created in a transaction that is rolled back at the end, so the configured database is not
+changed. One page of all the products is read with a naive 'ModelSerializer' (all the fields, nested category and
+brand without 'select_related') and with the catalog api (all the fields, card fields and a streamed page).
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction, reset_queries
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from product.models import Category, Brand, Product
+from product.serializers import CategorySummarySerializer, BrandSummarySerializer
+from product.views import ProductViewSet
+
+
+class NaiveProductSerializer(serializers.ModelSerializer):
+    category = CategorySummarySerializer(read_only=True)
+    brand = BrandSummarySerializer(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = '__all__'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the catalog api against a naive ModelSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def create_products(self, count):
+        categories = [Category.objects.create(name=f'Bench Category {i}') for i in range(20)]
+        brands = Brand.objects.bulk_create([Brand(name=f'Bench Brand {i}', slug=f'bench-brand-{i}')
+                                            for i in range(200)])
+        Product.objects.bulk_create(
+            [Product(category=categories[i % len(categories)], brand=brands[i % len(brands)], name=f'Bench Product {i}',
+                     slug=f'bench-product-{i}', description='Uzun ürün açıklaması. ' * 40, price=100 + i % 900,
+                     discount=i % 50, image=f'products/bench-{i}.jpg', quantity_available=i % 20)
+             for i in range(count)], batch_size=2000)
+
+    def measure(self, name, render, count):
+        timings, queries = [], 0
+        for i in range(self.repeat):
+            # The query log is full of the inserts (it keeps the last 9000 queries)
+            reset_queries()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                size = len(render())
+                timings.append(time.perf_counter() - started)
+            queries = len(captured.captured_queries)
+        median = statistics.median(timings)
+        self.stdout.write(f'{name:28} {median * 1000:8.1f}ms  {count / median:9.0f} rows/s  {queries:6} queries  '
+                          f'{size / 2 ** 20:6.1f}MB')
+
+    def handle(self, *args, **options):
+        count, self.repeat = options['products'], options['repeat']
+        factory = APIRequestFactory()
+        view = ProductViewSet.as_view({'get': 'list'})
+        with transaction.atomic():
+            self.create_products(count)
+
+            def naive():
+                request = factory.get('/product/catalog/')
+                data = NaiveProductSerializer(Product.objects.all(), many=True, context={'request': request}).data
+                return JSONRenderer().render(data)
+
+            def catalog(fields='', stream=False):
+                # Pages bigger than the stream threshold are streamed, so the threshold is raised for the normal page
+                threshold = ProductViewSet.pagination_class.stream_threshold
+                ProductViewSet.pagination_class.stream_threshold = threshold if stream else count
+                try:
+                    response = view(factory.get('/product/catalog/', {'page_size': count, 'fields': fields}))
+                    if stream:
+                        return b''.join(response.streaming_content)
+                    return response.render().content
+                finally:
+                    ProductViewSet.pagination_class.stream_threshold = threshold
+
+            self.measure('naive ModelSerializer', naive, count)
+            self.measure('catalog api', catalog, count)
+            self.measure('catalog api (card fields)', lambda: catalog('id,name,price,image'), count)
+            self.measure('catalog api (streamed)', lambda: catalog(stream=True), count)
+            self.measure('catalog api (card, streamed)', lambda: catalog('id,name,price,image', stream=True), count)
+            transaction.set_rollback(True)
@@ -0,0 +1,126 @@
+"""
+Benchmark the catalog cache (see 'product.cache') with several processes that share one cache server:
+    python manage.py bench_catalog_cache --products 5000 --requests 5000 --processes 4 --latency 0.0005
+Synthetic products are created in a transaction that is rolled back at the end, so the configured database is not
+changed. Every request is a product detail, a category listing or a brand page (popular pages are requested more,
+like the real traffic) and it's sent to one of the processes, some requests are price changes of a product. Processes
+are 'TieredCache' objects of this process over one stand-in of the shared cache with the latency of a network round
+trip ('_resources.cache_standin'). The same requests are run without the cache, with only the shared cache and with
+both tiers. Median and p99 latency, hit ratio and round trips to the shared cache are reported.
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction, reset_queries
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from _resources.cache import TieredCache
+from product import cache, views
+from product.models import Category, Brand, Product
+from product.views import ProductViewSet
+
+
+def percentile(values, p):
+    return statistics.quantiles(values, n=100)[p - 1] * 1000 if len(values) > 1 else 0
+
+
+class Command(BaseCommand):
+    help = 'Compare latency of the catalog pages without the cache, with the shared cache and with both tiers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--latency', type=float, default=0.0005, help='Seconds of a shared cache round trip')
+        parser.add_argument('--writes', type=float, default=0.01, help='Probability of a price change')
+
+    def create_products(self, count):
+        roots = [Category.objects.create(name=f'Bench Cache {i}') for i in range(5)]
+        categories = roots + [Category.objects.create(name=f'Bench Cache {i}', parent=roots[i % len(roots)])
+                              for i in range(5, 25)]
+        brands = Brand.objects.bulk_create([Brand(name=f'Bench Cache {i}', slug=f'bench-cache-{i}')
+                                            for i in range(50)])
+        Product.objects.bulk_create(
+            [Product(category=categories[i % len(categories)], brand=brands[i % len(brands)], name=f'Bench Cache {i}',
+                     slug=f'bench-cache-{i}', description='Uzun ürün açıklaması. ' * 10, price=100 + i % 900,
+                     discount=i % 50, quantity_available=10) for i in range(count)], batch_size=2000)
+        return categories, brands
+
+    def workload(self, options, categories, brands):
+        """'(kind, argument)' of every request, the same for every run"""
+        generator = random.Random(0)
+        products = list(Product.objects.filter(category__in=categories).values_list('slug', flat=True))
+        # Popular pages are requested more (Zipf-like)
+        pick = (lambda items: items[min(int(generator.paretovariate(1.2)) - 1, len(items) - 1)])
+        requests = []
+        for i in range(options['requests']):
+            draw = generator.random()
+            if draw < options['writes']:
+                requests.append(('write', pick(products)))
+            elif draw < 0.6:
+                requests.append(('detail', pick(products)))
+            elif draw < 0.85:
+                requests.append(('category', pick(categories).slug))
+            else:
+                requests.append(('brand', pick(brands).pk))
+        return requests
+
+    def run(self, requests, processes):
+        factory = APIRequestFactory()
+        detail, listing = ProductViewSet.as_view({'get': 'retrieve'}), ProductViewSet.as_view({'get': 'list'})
+        timings = []
+        for i, (kind, argument) in enumerate(requests):
+            # Every request is answered by one of the processes
+            if processes:
+                cache.catalog_cache = views.catalog_cache = processes[i % len(processes)]
+            started = time.perf_counter()
+            if kind == 'write':
+                product = Product.objects.get(slug=argument)
+                product.price += 1
+                product.save()
+                continue
+            if kind == 'detail':
+                response = detail(factory.get(f'/product/catalog/{argument}/'), slug=argument)
+            else:
+                response = listing(factory.get('/product/catalog/', {kind: argument, 'page_size': 20}))
+            response.render()
+            timings.append(time.perf_counter() - started)
+            reset_queries()
+        return timings
+
+    def report(self, name, timings, processes):
+        line = f'{name:24} p50 {percentile(timings, 50):7.2f}ms  p99 {percentile(timings, 99):7.2f}ms'
+        if processes:
+            stats = [process.stats() for process in processes]
+            local, shared, misses = (sum(s[counter] for s in stats) for counter in ('local_hits', 'shared_hits',
+                                                                                     'misses'))
+            reads = local + shared + misses
+            line += (f'  hits {(local + shared) / reads:6.1%} (local {local / reads:6.1%}, shared {shared / reads:6.1%})'
+                     f'  shared round trips {processes[0].shared.round_trips:6}')
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        shared = {'BACKEND': '_resources.cache_standin.StandInCache', 'OPTIONS': {'LATENCY': options['latency']}}
+        old_cache = cache.catalog_cache
+        with transaction.atomic():
+            categories, brands = self.create_products(options['products'])
+            requests = self.workload(options, categories, brands)
+            self.stdout.write(f'{len(requests)} requests, {options["processes"]} processes, shared cache round trip '
+                              f'{options["latency"] * 1000:.1f}ms')
+            runs = (('no cache', None, None), ('shared cache', 'bench-shared', 1), ('local + shared cache',
+                                                                                     'bench-tiered', None))
+            try:
+                for name, location, local_size in runs:
+                    caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                              'bench': dict(shared, LOCATION=location or 'bench')}
+                    with override_settings(CACHES=caches, TIERED_CACHE_TIMEOUT=600 if location else 0):
+                        # Only the versions are kept in the process when 'local_size' is 1
+                        processes = [TieredCache('catalog', alias='bench', local_size=local_size)
+                                     for i in range(options['processes'])] if location else []
+                        self.report(name, self.run(requests, processes), processes)
+            finally:
+                cache.catalog_cache = views.catalog_cache = old_cache
+                transaction.set_rollback(True)
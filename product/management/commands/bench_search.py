@@ -0,0 +1,72 @@
+"""
+Benchmark latency of the full-text search (see 'product.search') over a synthetic corpus:
+    python manage.py bench_search --products 1000000 --queries 200
+Synthetic documents are written straight into the search index (like the crawler does) in a transaction that is
+rolled back at the end, so the configured database is not changed. Latency percentiles are reported for every kind
+of query (a page of 20 ids, like 'vitrin.views.find_product').
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from product.models import Product
+from product.search import get_index, normalize, search_products
+
+
+COLORS = ['Siyah', 'Beyaz', 'Kırmızı', 'Mavi', 'Lacivert', 'Yeşil', 'Bej', 'Gri', 'Pembe', 'Mor', 'Haki', 'Ekru']
+FABRICS = ['Pamuklu', 'Keten', 'Viskon', 'Saten', 'Triko', 'Deri', 'Kadife', 'Şifon', 'Denim', 'Polar']
+STYLES = ['Oversize', 'Slim Fit', 'Regular', 'Kruvaze', 'Bağcıklı', 'Kapüşonlu', 'Düğmeli', 'Fermuarlı', 'Desenli']
+TYPES = ['Elbise', 'Gömlek', 'Tişört', 'Pantolon', 'Etek', 'Ceket', 'Mont', 'Kazak', 'Hırka', 'Ayakkabı', 'Çanta',
+         'Şort', 'Sweatshirt', 'Bluz', 'Yelek', 'Tayt', 'Bot', 'Sneaker', 'Şapka', 'Kemer']
+CATEGORIES = ['Kadın Giyim', 'Erkek Giyim', 'Çocuk', 'Ayakkabı', 'Aksesuar', 'Spor', 'İç Giyim', 'کیف و کفش']
+QUERIES = {
+    'common word': ['elbise', 'siyah', 'gomlek', 'pantolon', 'tisort'],
+    'two words': ['siyah elbise', 'kirmizi gomlek', 'pamuklu tisort', 'deri ceket', 'mavi denim'],
+    'prefix': ['elb', 'gom', 'kaz', 'sne', 'pan'],
+    'rare': ['brand 777 bot', 'kadife hirka mor', 'sifon bluz ekru', 'model 4242'],
+    'persian': ['كيف', 'کفش'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark full-text search latency over a synthetic corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=200, help='Searches of every kind of query')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def documents(self, first, count):
+        rng = random.Random(first)
+        for pk in range(first, first + count):
+            name = (f'{rng.choice(COLORS)} {rng.choice(FABRICS)} {rng.choice(STYLES)} '
+                    f'{TYPES[min(int(rng.paretovariate(1.2)) - 1, len(TYPES) - 1)]} Model {rng.randint(1, 9999)}')
+            yield (pk, normalize(name), normalize(f'Brand {rng.randint(1, 2000)}'), normalize(rng.choice(CATEGORIES)),
+                   normalize(f'{name} ürün açıklaması'))
+
+    def handle(self, *args, **options):
+        index = get_index()
+        first = (Product.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        with transaction.atomic():
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                for start in range(0, options['products'], options['batch_size']):
+                    index.insert(cursor, list(self.documents(first + start,
+                                                             min(options['batch_size'], options['products'] - start))))
+            self.stdout.write(f'{options["products"]} documents indexed in {time.perf_counter() - started:.1f}s')
+
+            for kind, queries in QUERIES.items():
+                timings, found = [], 0
+                for i in range(options['queries']):
+                    started = time.perf_counter()
+                    found += len(search_products(queries[i % len(queries)], limit=20))
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                self.stdout.write(f'{kind:12} p50 {statistics.median(timings):7.2f}ms  '
+                                  f'p95 {timings[int(len(timings) * 0.95) - 1]:7.2f}ms  '
+                                  f'p99 {timings[int(len(timings) * 0.99) - 1]:7.2f}ms  '
+                                  f'({found / len(timings):.1f} results)')
+            transaction.set_rollback(True)
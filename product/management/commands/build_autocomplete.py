@@ -0,0 +1,28 @@
+"""
+Build the autocomplete index from the database and write its snapshot (see 'product.autocomplete'):
+    python manage.py build_autocomplete
+Workers load the snapshot at startup, so it's built after deploys and periodically (eg: nightly with cron) to add
+popularity changes and remove deleted products. Products changed between the snapshots are added by the workers.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from product.autocomplete import Autocomplete
+
+
+class Command(BaseCommand):
+    help = 'Build the autocomplete snapshot that workers load at startup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.AUTOCOMPLETE_SNAPSHOT)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        autocomplete = Autocomplete.build()
+        autocomplete.save(options['output'])
+        self.stdout.write(f'{len(autocomplete.index.phrases)} phrases ({len(autocomplete.index.keys)} keys) written to '
+                          f'{options["output"]} ({os.path.getsize(options["output"]) / 2 ** 20:.1f}MB) in '
+                          f'{time.perf_counter() - started:.1f}s')
@@ -0,0 +1,30 @@
+"""
+Index all the products again (eg: after the index is lost or the normalization is changed):
+    python manage.py rebuild_search_index --batch-size 5000
+The index is updated incrementally by the crawler and the product signals (see 'product.search'), so it's not needed
+after crawls.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product.models import Product
+from product.search import update_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of the products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        last, indexed = 0, 0
+        while True:
+            ids = list(Product.objects.filter(id__gt=last).order_by('id')
+                       .values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            with transaction.atomic():
+                indexed += update_index(Product.objects.filter(id__gte=ids[0], id__lte=ids[-1]))
+            last = ids[-1]
+        self.stdout.write(f'{indexed} products indexed')
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='external_id',
+            field=models.CharField(blank=True, editable=False, max_length=30, null=True, unique=True, verbose_name='external id'),
+        ),
+    ]
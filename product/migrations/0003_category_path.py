@@ -0,0 +1,34 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+def fill_category_paths(apps, schema_editor):
+    """Build path of the existing categories from their parents"""
+    Category = apps.get_model('product', 'Category')
+    categories = {category.id: category for category in Category.objects.all()}
+
+    def path(category):
+        if not category.path:
+            parent = categories.get(category.parent_id)
+            category.path = (path(parent) if parent else '') + f'{category.id:07d}/'
+        return category.path
+
+    for category in categories.values():
+        path(category)
+    Category.objects.bulk_update(categories.values(), ['path'], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_product_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:36
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='quantity_available',
+            field=models.PositiveIntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)], verbose_name='quantity available'),
+        ),
+    ]
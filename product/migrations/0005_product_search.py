@@ -0,0 +1,81 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:02
+
+import re
+import unicodedata
+
+from django.db import migrations
+
+
+# A frozen copy of the index and the normalization of 'product.search' when this migration was written
+TABLE = 'product_search'
+DESCRIPTION_LENGTH = 1000
+CHARACTERS = str.maketrans({
+    'ı': 'i',
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    '‌': ' ',
+    'ـ': '',
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+})
+WORDS = re.compile(r'\w+')
+CREATE = {
+    'sqlite': [f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(name, brand, category, description, "
+               f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6')"],
+    'postgresql': [f'CREATE TABLE IF NOT EXISTS {TABLE} (product_id bigint PRIMARY KEY, document tsvector NOT NULL)',
+                   f'CREATE INDEX IF NOT EXISTS {TABLE}_document ON {TABLE} USING GIN (document)'],
+}
+INSERT = {
+    'sqlite': f'INSERT INTO {TABLE} (rowid, name, brand, category, description) VALUES (%s, %s, %s, %s, %s)',
+    'postgresql': f"INSERT INTO {TABLE} (product_id, document) VALUES (%s, "
+                  f"setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') || "
+                  f"setweight(to_tsvector('simple', %s), 'C') || setweight(to_tsvector('simple', %s), 'D'))",
+}
+
+
+def normalize(text):
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text.lower().translate(CHARACTERS))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(WORDS.findall(unicodedata.normalize('NFC', text).translate(CHARACTERS)))
+
+
+def create_search_index(apps, schema_editor):
+    """Make the full-text index of the database ('product.search') and index the existing active products"""
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE:
+        raise NotImplementedError(f'full-text search is not supported on {vendor}')
+    rows = apps.get_model('product', 'Product').objects.filter(is_active=True)\
+        .values_list('id', 'name', 'brand__name', 'category__name', 'description').iterator(chunk_size=2000)
+    with schema_editor.connection.cursor() as cursor:
+        for statement in CREATE[vendor]:
+            cursor.execute(statement)
+        documents = []
+        for pk, name, brand, category, description in rows:
+            documents.append((pk, normalize(name), normalize(brand), normalize(category),
+                              normalize(description[:DESCRIPTION_LENGTH])))
+            if len(documents) == 2000:
+                cursor.executemany(INSERT[vendor], documents)
+                documents = []
+        if documents:
+            cursor.executemany(INSERT[vendor], documents)
+
+
+def drop_search_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_product_quantity_available'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.2 on 2026-10-18 15:06
+
+import bisect
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def state_keys(brand, price, discount, is_active):
+    """Facet values of a product (a frozen copy of 'product.facets.state_keys' of this migration)"""
+    keys = [('active', int(is_active))]
+    if is_active:
+        bucket = max(0, bisect.bisect_right(settings.FACET_PRICE_BUCKETS, price - min(discount, price)) - 1)
+        keys += [('brand', brand or 0), ('price', bucket)]
+    return keys
+
+
+def count_facets(apps, schema_editor):
+    """Facet counts of the existing products"""
+    Product = apps.get_model('product', 'Product')
+    FacetCount = apps.get_model('product', 'FacetCount')
+    counts = Counter()
+    for category, *values in Product.objects.values_list('category', 'brand', 'price', 'discount', 'is_active')\
+            .iterator():
+        counts.update({(category, *key): 1 for key in state_keys(*values)})
+    FacetCount.objects.bulk_create([FacetCount(category_id=category, facet=facet, value=value, count=count)
+                                    for (category, facet, value), count in counts.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('brand', 'brand'), ('price', 'price'), ('active', 'active')], max_length=10, verbose_name='facet')),
+                ('value', models.IntegerField(verbose_name='value')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('category', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='facet_count_category', to='product.category', verbose_name='category')),
+            ],
+            options={
+                'verbose_name': 'FacetCount',
+                'verbose_name_plural': 'FacetCount',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('category', 'facet', 'value'), name='facet_count_unique_category_facet_value'),
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
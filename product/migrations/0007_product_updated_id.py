@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 17:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_facet_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated', 'id'], name='product_updated_id'),
+        ),
+    ]
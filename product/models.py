@@ -1,22 +1,73 @@
-from django.db import models
+import hashlib
+
+from django.db import models, connection, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.utils.text import slugify
 from django.urls import reverse
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
 
+from _resources.func import get_random_string
+from .slugs import allocate_slugs
+
+
+def category_path_segment(pk):
+    """Part of the materialized path for a category. Ids are zero padded so paths are sorted like the tree"""
+    return f'{pk:07d}/'
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name=_('name'))
     slug = models.SlugField(unique=True, editable=False)
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='children')
+    # Materialized path: ids of the ancestors and the category itself (eg: '0000001/0000004/0000012/'). All the
+    # categories of a subtree have the path of the subtree root as prefix, so a subtree is one range on the index
+    path = models.CharField(max_length=255, db_index=True, editable=False, blank=True)
 
     class Meta:
         verbose_name = 'Category'
         verbose_name_plural = 'Category'
         
     def save(self, *args, **kwargs):
-        self.slug = slugify(self.name)
+        # Same category names are used under diffrent parents (eg: 'Kadin > Giyim' and 'Erkek > Giyim') so
+        # slug is built on parent slug. Slugs of deep categories are cut to the field length, so a hash of the whole
+        # slug is added if the cut slug is taken (it's the same every time the category is saved)
+        name = slugify(f'{self.parent.slug}-{self.name}') if self.parent else slugify(self.name)
+        suffix = hashlib.sha1(name.encode()).hexdigest()[:6]
+        self.slug = allocate_slugs(Category, {None: (name, suffix)}, exclude=[self.pk] if self.pk else ())[None]
         super(Category, self).save(*args, **kwargs)
+        self.update_path()
+
+    def update_path(self):
+        """Set path of the category (id is needed so it's done after saving) and move its descendants if it moved"""
+        path = (self.parent.path if self.parent else '') + category_path_segment(self.pk)
+        if path == self.path:
+            return
+        if self.path:
+            # Replace old prefix of all the descendants with one query
+            Category.objects.filter(**Category.subtree_lookup(self.path)).exclude(pk=self.pk)\
+                .update(path=Concat(Value(path), Substr('path', len(self.path) + 1)))
+        Category.objects.filter(pk=self.pk).update(path=path)
+        self.path = path
+
+    @staticmethod
+    def subtree_lookup(path, prefix=''):
+        """
+        Filter arguments of the paths starting with 'path'. It's a range and not 'startswith' so database uses the
+        index. '/' is just before '0' so every path with this prefix is less than the upper bound.
+        """
+        return {f'{prefix}path__gte': path, f'{prefix}path__lt': path[:-1] + '0'}
+
+    def get_descendants(self, include_self=True):
+        """All the categories under this category with one query"""
+        queryset = Category.objects.filter(**self.subtree_lookup(self.path)).order_by('path')
+        return queryset if include_self else queryset.exclude(pk=self.pk)
+
+    def get_breadcrumbs(self):
+        """Ancestors of the category and itself from the root. Read from the in-process tree without any query"""
+        from .tree import get_category_tree
+        return get_category_tree().breadcrumbs(self.pk)
 
     def __str__(self):
         return self.name
@@ -29,11 +80,36 @@ class Brand(models.Model):
     class Meta:
         verbose_name = 'Brand'
         verbose_name_plural = 'Brand'
+
+    def save(self, *args, **kwargs):
+        self.slug = slugify(self.name)
+        super(Brand, self).save(*args, **kwargs)
     
     def __str__(self):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def in_category(self, category):
+        """Products of the category and all of its subcategories with one query (a range on 'Category.path')"""
+        return self.filter(**Category.subtree_lookup(category.path, prefix='category__'))
+
+    def set_active(self, is_active):
+        """
+        Activate or deactivate the products, change their facet counts (see 'product.facets') and invalidate their
+        cached pages (see 'product.cache')
+        """
+        from .cache import invalidate_products
+        from .facets import read_states, record_changes
+        with transaction.atomic():
+            old = read_states(self.filter(is_active=not is_active))
+            updated = Product.objects.filter(pk__in=old).update(is_active=is_active)
+            record_changes(old, {pk: state._replace(is_active=is_active) for pk, state in old.items()})
+        if old:
+            invalidate_products(Product.objects.filter(pk__in=old).values_list('slug', flat=True), old)
+        return updated
+
+
 class Product(models.Model):
     category = models.ForeignKey('Category',
                                  verbose_name=_('category'),
@@ -47,6 +123,9 @@ class Product(models.Model):
                               null=True)
     name = models.CharField(verbose_name=_('name'), max_length=200)
     slug = models.SlugField(unique=True, editable=False)
+    # Id of the product in Trendyol. Crawled products are upserted by this field
+    external_id = models.CharField(verbose_name=_('external id'), max_length=30, unique=True, null=True, blank=True,
+                                   editable=False)
     description = models.TextField(verbose_name=_('description'), blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=0,
                                 verbose_name=_('price'),
@@ -58,28 +137,88 @@ class Product(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True, verbose_name=_('is active'))
-    # quantity_available = models.PositiveIntegerField(default=0,
-    #                                                  verbose_name=_('quantity available'),
-    #                                                  validators=[MinValueValidator(0)])
+    # Stock of the product. It's only changed with conditional updates (see 'order.inventory')
+    quantity_available = models.PositiveIntegerField(default=0,
+                                                     verbose_name=_('quantity available'),
+                                                     validators=[MinValueValidator(0)])
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Product'
         verbose_name_plural = 'Product'
+        indexes = [
+            # Changed products are read on '(updated, id)' by every process (see 'product.autocomplete')
+            models.Index(fields=['updated', 'id'], name='product_updated_id'),
+        ]
 
     def save(self, *args, **kwargs):
-        self.slug = slugify(self.name)
+        # Slug is not changed after the product created. Many products have the same name so a free slug is allocated
+        if not self.slug:
+            self.slug = allocate_slugs(Product, {None: (self.name, self.external_id or get_random_string(4))})[None]
         super(Product, self).save(*args, **kwargs)
 
     def __str__(self):
         return self.name
     
-    # def reduce_quantity(self, quantity):
-    #     if self.quantity_available >= quantity:
-    #         self.quantity_available -= quantity
-    #         self.save()
-    #         return True
-    #     return False
-    
-    # def increase_quantity(self, quantity):
-    #     self.quantity_available += quantity
-    #     self.save()
+    def reduce_quantity(self, quantity):
+        """Take the quantity from the stock with one conditional update. Return False if there is not enough stock"""
+        updated = Product.objects.filter(pk=self.pk, quantity_available__gte=quantity)\
+            .update(quantity_available=models.F('quantity_available') - quantity)
+        return bool(updated)
+
+    def increase_quantity(self, quantity):
+        Product.objects.filter(pk=self.pk).update(quantity_available=models.F('quantity_available') + quantity)
+
+
+class FacetCountManager(models.Manager):
+    def add_counts(self, deltas):
+        """Add the deltas ('(category id, facet, value): delta') to the counts with one 'INSERT ... ON CONFLICT'"""
+        deltas = [(key, delta) for key, delta in deltas.items() if delta]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            # Batches keep the parameters under the limit of SQLite
+            for start in range(0, len(deltas), 1000):
+                batch = deltas[start:start + 1000]
+                values = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+                params = [value for key, delta in batch for value in (*key, delta)]
+                cursor.execute(f'INSERT INTO {table} (category_id, facet, value, count) VALUES {values} '
+                               f'ON CONFLICT (category_id, facet, value) DO UPDATE SET count = {table}.count + '
+                               f'excluded.count', params)
+
+
+class FacetCount(models.Model):
+    """
+    Number of the products of a category (without its subcategories) with a facet value: brand id (0 is no brand),
+    price bucket (see 'FACET_PRICE_BUCKETS') or active flag. Brands and prices are counted for active products only.
+    Counts are changed with deltas (see 'product.facets')
+    """
+    BRAND = 'brand'
+    PRICE = 'price'
+    ACTIVE = 'active'
+    FACET_CHOICES = [
+        (BRAND, _('brand')),
+        (PRICE, _('price')),
+        (ACTIVE, _('active')),
+    ]
+    # No database constraint: counts of the deleted products are changed after their category is deleted
+    category = models.ForeignKey('Category',
+                                 verbose_name=_('category'),
+                                 on_delete=models.DO_NOTHING,
+                                 db_constraint=False,
+                                 related_name='facet_count_category')
+    facet = models.CharField(verbose_name=_('facet'), max_length=10, choices=FACET_CHOICES)
+    value = models.IntegerField(verbose_name=_('value'))
+    count = models.IntegerField(verbose_name=_('count'), default=0)
+
+    objects = FacetCountManager()
+
+    class Meta:
+        verbose_name = 'FacetCount'
+        verbose_name_plural = 'FacetCount'
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'facet', 'value'], name='facet_count_unique_category_facet_value'),
+        ]
+
+    def __str__(self):
+        return f'{self.category_id} {self.facet}={self.value}: {self.count}'
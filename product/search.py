@@ -0,0 +1,164 @@
+"""
+Full-text search of the products.
+
+** Documents of the products (name, brand, category and description) are kept in a search index of the database:
+an FTS5 virtual table in SQLite and a 'tsvector' column with a GIN index in PostgreSQL (table 'product_search' made by
+the migrations). Results are ranked by the database (bm25 in SQLite, 'ts_rank' in PostgreSQL) and name matches weigh
+more than brand, category and description matches.
+
+** Texts of the documents and the queries are normalized in python, so the same word written in diffrent ways is
+found ('normalize'): Turkish dotted and dotless i ('KIRMIZI', 'kırmızı', 'kirmizi'), Arabic and Persian yeh and kaf
+('كيف', 'کیف'), diacritics and Turkish letters ('ş' -> 's'), Persian and Arabic digits and zero-width non-joiner.
+The last word of the query is a prefix, so the results are found while the user is typing.
+
+** Ranking needs a score for every matching document, which is too slow for common words in a big catalog (half of
+the products match 'elbise'). So only the newest 'SEARCH_RANK_WINDOW' matches are ranked: the window is found on the
+document lists of the index (cheap) and only its documents are scored.
+
+** The index is updated incrementally: the crawler updates the documents of every upserted batch ('update_index' in
+'crawler.ingest') and 'product.signals' updates documents of the products that are saved or deleted one by one.
+Inactive products are removed from the index. 'manage.py rebuild_search_index' is only for recovery.
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+
+
+TABLE = 'product_search'
+# Weights of name, brand, category and description
+WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+# Only the beginning of long descriptions is indexed
+DESCRIPTION_LENGTH = 1000
+
+CHARACTERS = str.maketrans({
+    'ı': 'i',
+    '\u064a': 'ی', '\u0649': 'ی', '\u0626': 'ی',     # Arabic yeh, alef maksura, yeh with hamza
+    '\u0643': 'ک',     # Arabic kaf
+    '\u0629': 'ه', '\u06c0': 'ه',     # teh marbuta, heh with yeh
+    '\u0623': 'ا', '\u0625': 'ا', '\u0671': 'ا',     # alef with hamza, alef wasla
+    '\u0624': 'و',     # waw with hamza
+    '\u200c': ' ',     # zero-width non-joiner
+    '\u0640': '',     # tatweel
+    **{chr(0x06F0 + i): str(i) for i in range(10)},     # Persian digits
+    **{chr(0x0660 + i): str(i) for i in range(10)},     # Arabic digits
+})
+WORDS = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lower case words of the text without diacritics and with one form of every letter, separated by spaces"""
+    if not text:
+        return ''
+    # 'İ'.lower() is 'i' with a combining dot that is removed with the other marks
+    text = unicodedata.normalize('NFKD', text.lower().translate(CHARACTERS))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(WORDS.findall(unicodedata.normalize('NFC', text).translate(CHARACTERS)))
+
+
+def query_terms(query):
+    """Words of the query and if the last one is a prefix (the user is still typing it)"""
+    terms = normalize(query).split()[:10]
+    return terms, bool(terms) and not query[-1:].isspace()
+
+
+class SQLiteIndex:
+    def create(self, cursor):
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(name, brand, category, description, "
+                       f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6')")
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def remove(self, cursor, ids):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({", ".join(["%s"] * len(ids))})', list(ids))
+
+    def insert(self, cursor, documents):
+        cursor.executemany(f'INSERT INTO {TABLE} (rowid, name, brand, category, description) '
+                           f'VALUES (%s, %s, %s, %s, %s)', documents)
+
+    def search(self, cursor, terms, prefix, window, limit, offset):
+        match = ' '.join(f'"{term}"' for term in terms) + ('*' if prefix else '')
+        cursor.execute(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY rowid DESC LIMIT 1 OFFSET %s',
+                       [match, window])
+        bound = cursor.fetchone()
+        cursor.execute(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid > %s '
+                       f'ORDER BY bm25({TABLE}, {", ".join(map(str, WEIGHTS))}) LIMIT %s OFFSET %s',
+                       [match, bound[0] if bound else 0, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresIndex:
+    DOCUMENT = ("setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'C') || setweight(to_tsvector('simple', %s), 'D')")
+
+    def create(self, cursor):
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {TABLE} (product_id bigint PRIMARY KEY, document tsvector NOT NULL)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_document ON {TABLE} USING GIN (document)')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def remove(self, cursor, ids):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE product_id = ANY(%s)', [list(ids)])
+
+    def insert(self, cursor, documents):
+        cursor.executemany(f'INSERT INTO {TABLE} (product_id, document) VALUES (%s, {self.DOCUMENT}) '
+                           f'ON CONFLICT (product_id) DO UPDATE SET document = excluded.document', documents)
+
+    def search(self, cursor, terms, prefix, window, limit, offset):
+        # Terms are only letters and digits (see 'normalize') so they are safe in 'to_tsquery'
+        query = ' & '.join(terms) + (':*' if prefix else '')
+        weights = '{' + ', '.join(str(w / WEIGHTS[0]) for w in reversed(WEIGHTS)) + '}'
+        cursor.execute(f"SELECT product_id FROM (SELECT product_id, document FROM {TABLE} "
+                       f"WHERE document @@ to_tsquery('simple', %s) ORDER BY product_id DESC LIMIT %s) matches "
+                       f"ORDER BY ts_rank(%s::float4[], document, to_tsquery('simple', %s)) DESC, product_id "
+                       f"LIMIT %s OFFSET %s",
+                       [query, window, weights, query, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_index(vendor=None):
+    vendor = vendor or connection.vendor
+    if vendor == 'sqlite':
+        return SQLiteIndex()
+    if vendor == 'postgresql':
+        return PostgresIndex()
+    raise NotImplementedError(f'full-text search is not supported on {vendor}')
+
+
+def update_index(queryset):
+    """
+    Write documents of the active products of the queryset in the index and remove the inactive ones. Products are
+    read with one query
+    """
+    ids, documents = [], []
+    rows = queryset.values_list('id', 'is_active', 'name', 'brand__name', 'category__name', 'description')
+    for pk, is_active, name, brand, category, description in rows.iterator(chunk_size=2000):
+        ids.append(pk)
+        if is_active:
+            documents.append((pk, normalize(name), normalize(brand), normalize(category),
+                              normalize(description[:DESCRIPTION_LENGTH])))
+    index = get_index()
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), 500):
+            index.remove(cursor, ids[start:start + 500])
+        if documents:
+            index.insert(cursor, documents)
+    return len(documents)
+
+
+def remove_from_index(ids):
+    if ids:
+        with connection.cursor() as cursor:
+            get_index().remove(cursor, list(ids))
+
+
+def search_products(query, limit=20, offset=0):
+    """Ids of the active products that match all the words of the query, the best match first"""
+    terms, prefix = query_terms(query)
+    if not terms:
+        return []
+    with connection.cursor() as cursor:
+        return get_index().search(cursor, terms, prefix, settings.SEARCH_RANK_WINDOW, limit, offset)
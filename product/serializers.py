@@ -0,0 +1,31 @@
+from rest_framework import serializers
+
+from _resources.serializers import SparseFieldsMixin
+from .models import Category, Brand, Product
+
+
+class CategorySummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug']
+
+
+class BrandSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Brand
+        fields = ['id', 'name', 'slug']
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Product of the catalog api. Only the fields of '?fields=' are serialized (see '_resources.serializers')"""
+    category = CategorySummarySerializer(read_only=True)
+    brand = BrandSummarySerializer(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'slug', 'price', 'discount', 'image', 'category', 'brand', 'description',
+                  'quantity_available', 'created', 'updated']
+        only_fields = {
+            'category': ['category__id', 'category__name', 'category__slug'],
+            'brand': ['brand__id', 'brand__name', 'brand__slug'],
+        }
@@ -0,0 +1,107 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.db.models.functions import Substr
+from django.dispatch import receiver
+
+from . import facets
+from .cache import invalidate, invalidate_products, CATEGORIES, BRANDS
+from .models import Category, Brand, Product, FacetCount
+from .search import update_index, remove_from_index
+from .tree import reset_category_tree
+
+
+def read_old_name(instance):
+    """Name of the category or the brand before it's saved, so its products are indexed only if the name is changed"""
+    instance._old_name = type(instance).objects.filter(pk=instance.pk).values_list('name', flat=True).first() \
+        if instance.pk else None
+
+
+@receiver(pre_save, sender=Category)
+def read_category_name(sender, instance=None, **kwargs):
+    read_old_name(instance)
+
+
+@receiver(post_save, sender=Category)
+def reset_tree_after_category_saved(sender, instance=None, created=False, **kwargs):
+    """Load category tree again in the next request (and index the new name of the category)"""
+    reset_category_tree()
+    invalidate([CATEGORIES])
+    if not created and getattr(instance, '_old_name', None) != instance.name:
+        update_index(Product.objects.filter(category=instance))
+
+
+@receiver(post_delete, sender=Category)
+def move_children_after_category_deleted(sender, instance=None, **kwargs):
+    """Children of the deleted category become roots ('on_delete=SET_NULL') so its path is removed from their subtree"""
+    if instance.path:
+        Category.objects.filter(**Category.subtree_lookup(instance.path))\
+            .update(path=Substr('path', len(instance.path) + 1))
+    reset_category_tree()
+    invalidate([CATEGORIES])
+    # Counts of its products are changed (to zero) after they are deleted, so they are deleted at the end
+    FacetCount.objects.filter(category=instance.pk).delete()
+    facets.indexes.reset()
+
+
+@receiver(pre_save, sender=Brand)
+def read_brand_name(sender, instance=None, **kwargs):
+    read_old_name(instance)
+
+
+@receiver(post_save, sender=Brand)
+def index_brand_products(sender, instance=None, created=False, **kwargs):
+    """Index the new name of the brand in the documents of its products"""
+    invalidate([BRANDS])
+    if not created and getattr(instance, '_old_name', None) != instance.name:
+        update_index(Product.objects.filter(brand=instance))
+
+
+@receiver(pre_delete, sender=Brand)
+def read_brand_products(sender, instance=None, **kwargs):
+    """Products of the brand, they are not found by their brand after it's set to null"""
+    instance._product_ids = list(Product.objects.filter(brand=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Brand)
+def move_brand_counts(sender, instance=None, **kwargs):
+    """
+    Products of the deleted brand have no brand now ('on_delete=SET_NULL'), so they are counted for brand 0 and
+    indexed without the brand name
+    """
+    ids = getattr(instance, '_product_ids', [])
+    for start in range(0, len(ids), 500):
+        update_index(Product.objects.filter(pk__in=ids[start:start + 500]))
+    counts = FacetCount.objects.filter(facet=FacetCount.BRAND, value=instance.pk)
+    FacetCount.objects.add_counts({(category, FacetCount.BRAND, 0): count
+                                   for category, count in counts.values_list('category', 'count')})
+    counts.delete()
+    facets.indexes.reset()
+    invalidate([BRANDS])
+
+
+@receiver(pre_save, sender=Product)
+def read_facet_state(sender, instance=None, **kwargs):
+    """Facet values of the product before it's saved, so its counts could be changed after saving"""
+    instance._facet_state = facets.read_states(Product.objects.filter(pk=instance.pk)) if instance.pk else dict()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance=None, **kwargs):
+    """
+    Products saved one by one (eg: in admin) are indexed and counted here. Crawled products are indexed and counted
+    by 'crawler.ingest'
+    """
+    update_index(Product.objects.filter(pk=instance.pk))
+    old = getattr(instance, '_facet_state', dict())
+    new = {instance.pk: facets.facet_state(instance.category_id, instance.brand_id, instance.price, instance.discount,
+                                           instance.is_active)}
+    facets.record_changes(old, new)
+    invalidate_products([instance.slug], old, new)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance=None, **kwargs):
+    remove_from_index([instance.pk])
+    old = {instance.pk: facets.facet_state(instance.category_id, instance.brand_id, instance.price, instance.discount,
+                                           instance.is_active)}
+    facets.record_changes(old, dict())
+    invalidate_products([instance.slug], old)
@@ -0,0 +1,41 @@
+"""
+Allocate unique slugs for many objects with only one query.
+
+** 'slug' of 'Product' is 'unique=True' but many products have the same name. So every object gets its slugified
+name if it's free and '<slugified name>-<suffix>' if it's not. For crawled products 'suffix' is the external id
+which is unique itself. Slugs of categories are made from their parent slug, so slugs of deep categories are cut to
+the field length and they get a hash of the whole slug as suffix if the cut slug is taken.
+"""
+from django.utils.text import slugify
+
+
+def allocate_slugs(model, items, exclude=()):
+    """
+    'items' is a dictionary of 'key: (name, suffix)'. Return a dictionary of 'key: slug' with slugs that are unique
+    among the items and the rows of the model (except the rows with a pk in 'exclude', eg: the object itself).
+    """
+    rows = model.objects.exclude(pk__in=exclude) if exclude else model.objects.all()
+    max_length = model._meta.get_field('slug').max_length
+    candidates = dict()
+    for key, (name, suffix) in items.items():
+        base = slugify(name)[:max_length].strip('-') or model._meta.model_name
+        suffix = slugify(str(suffix))
+        candidates[key] = [base, f"{base[:max_length - len(suffix) - 1].strip('-')}-{suffix}"]
+    all_candidates = [slug for options in candidates.values() for slug in options]
+    taken = set(rows.filter(slug__in=all_candidates).values_list('slug', flat=True))
+
+    slugs = dict()
+    for key, options in candidates.items():
+        free = [slug for slug in options if slug not in taken]
+        if free:
+            slug = free[0]
+        else:
+            # Very rare. Both of the candidates are taken so add a counter to the suffixed one
+            counter = 2
+            slug = f'{options[1][:max_length - 4]}-{counter}'
+            while slug in taken or rows.filter(slug=slug).exists():
+                counter += 1
+                slug = f'{options[1][:max_length - 4]}-{counter}'
+        taken.add(slug)
+        slugs[key] = slug
+    return slugs
@@ -1,3 +1,614 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection, transaction, OperationalError
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from _resources.cache import TieredCache
+
+from crawler.ingest import ingest_products
+from . import facets
+from .cache import catalog_cache
+from .autocomplete import Autocomplete, AutocompleteIndex, PRODUCT, BRAND, CATEGORY, SCAN_LIMIT, phrase_keys, \
+    reset_autocomplete, get_autocomplete, start_refresher
+from .models import Category, Brand, Product, FacetCount
+from .search import TABLE, normalize, search_products
+from .serializers import ProductSerializer
+from .tree import get_category_tree
+from .views import CatalogPagination
+
+
+class TestCategoryTree(TestCase):
+
+    def setUp(self) -> None:
+        self.women = Category.objects.create(name='Kadin')
+        self.clothes = Category.objects.create(name='Giyim', parent=self.women)
+        self.dresses = Category.objects.create(name='Elbise', parent=self.clothes)
+        self.shoes = Category.objects.create(name='Ayakkabi', parent=self.women)
+        self.men = Category.objects.create(name='Erkek')
+        for category in (self.dresses, self.shoes, self.clothes, self.men):
+            Product.objects.create(category=category, name=f'{category.name} urun', price=100, discount=0)
+
+    def test_category_path(self):
+        """Test if path of every category is made from ids of its ancestors"""
+        self.assertEqual(self.women.path, f'{self.women.id:07d}/')
+        self.assertEqual(self.dresses.path, f'{self.women.id:07d}/{self.clothes.id:07d}/{self.dresses.id:07d}/')
+        self.assertEqual(list(self.women.get_descendants(include_self=False)),
+                         [self.clothes, self.dresses, self.shoes])
+
+    def test_move_subtree(self):
+        """Test if paths of the descendants change when their ancestor moves"""
+        self.clothes.parent = self.men
+        self.clothes.save()
+        self.dresses.refresh_from_db()
+
+        self.assertEqual(self.dresses.path, f'{self.men.id:07d}/{self.clothes.id:07d}/{self.dresses.id:07d}/')
+        self.assertEqual(set(Product.objects.in_category(self.men).values_list('category', flat=True)),
+                         {self.men.id, self.clothes.id, self.dresses.id})
+
+    def test_delete_parent(self):
+        """Test if children of a deleted category become roots"""
+        self.women.delete()
+        self.dresses.refresh_from_db()
+
+        self.assertEqual(self.dresses.path, f'{self.clothes.id:07d}/{self.dresses.id:07d}/')
+        self.assertEqual([node.name for node in get_category_tree().roots], ['Giyim', 'Ayakkabi', 'Erkek'])
+
+    def test_products_in_subtree(self):
+        """Test if products of a category and all of its subcategories are found with one query"""
+        with self.assertNumQueries(1):
+            products = list(Product.objects.in_category(self.women).order_by('id'))
+        self.assertEqual([p.category_id for p in products], [self.dresses.id, self.shoes.id, self.clothes.id])
+
+    def test_breadcrumbs_without_query(self):
+        """Test if breadcrumbs and menus are read from the in-process tree"""
+        get_category_tree()
+        with self.assertNumQueries(0):
+            breadcrumbs = self.dresses.get_breadcrumbs()
+            menu = [(node.name, [child.name for child in node.children]) for node in get_category_tree().roots]
+        self.assertEqual([node.name for node in breadcrumbs], ['Kadin', 'Giyim', 'Elbise'])
+        self.assertEqual(menu, [('Kadin', ['Giyim', 'Ayakkabi']), ('Erkek', [])])
+
+    def test_tree_reset_on_save(self):
+        """Test if the tree of the process is loaded again after a category changes"""
+        tree = get_category_tree()
+        Category.objects.create(name='Cocuk')
+
+        self.assertIsNot(get_category_tree(), tree)
+        self.assertEqual(get_category_tree().get_by_slug('cocuk').name, 'Cocuk')
+
+    def test_deep_slugs(self):
+        """Test if slugs of deep categories fit the field and stay unique and the same when they are saved again"""
+        parent = self.dresses
+        for name in ['Abiye ve Mezuniyet Elbiseleri', 'Uzun Abiye Elbise', 'Saten Uzun Abiye', 'Siyah']:
+            parent = Category.objects.create(name=name, parent=parent)
+        other = Category.objects.create(name='Kirmizi', parent=parent.parent)
+        max_length = Category._meta.get_field('slug').max_length
+
+        self.assertTrue(len(parent.slug) <= max_length and len(other.slug) <= max_length)
+        self.assertNotEqual(parent.slug, other.slug)
+        slugs = (parent.slug, other.slug)
+        parent.save()
+        other.save()
+        self.assertEqual((parent.slug, other.slug), slugs)
+        self.assertEqual(Category.objects.get(pk=parent.pk).slug, parent.slug)
+
+
+class TestSearch(TestCase):
+
+    def setUp(self) -> None:
+        self.dresses = Category.objects.create(name='Elbise')
+        self.bags = Category.objects.create(name='کیف')
+        self.brand = Brand.objects.create(name='Koton')
+        self.red = Product.objects.create(category=self.dresses, brand=self.brand, name='Kırmızı Saten Elbise',
+                                          price=100, discount=0)
+        self.black = Product.objects.create(category=self.dresses, name='Siyah Elbise',
+                                            description='Kırmızı düğmeli', price=100, discount=0)
+        self.bag = Product.objects.create(category=self.bags, name='کیف چرم', price=100, discount=0)
+
+    def test_normalize(self):
+        """Test if Turkish and Persian letters and diacritics are written in one way"""
+        self.assertEqual(normalize('KIRMIZI'), normalize('kırmızı'))
+        self.assertEqual(normalize('İPEK Gömlek'), 'ipek gomlek')
+        self.assertEqual(normalize('كيف'), normalize('کیف'))
+        self.assertEqual(normalize('مي\u200cخواهم ۱۲'), 'می خواهم 12')
+
+    def test_search(self):
+        """Test if products are found with prefixes and diffrent forms of the words, name matches first"""
+        self.assertEqual(search_products('kirmizi'), [self.red.pk, self.black.pk])
+        self.assertEqual(search_products('KIRMIZI elb'), [self.red.pk, self.black.pk])
+        self.assertEqual(search_products('koton'), [self.red.pk])
+        self.assertEqual(search_products('كيف'), [self.bag.pk])
+        self.assertEqual(search_products('yok'), [])
+
+    def test_incremental_updates(self):
+        """Test if saved, deactivated, deleted and crawled products are indexed without a rebuild"""
+        self.red.name = 'Mavi Elbise'
+        self.red.save()
+        self.assertEqual(search_products('kirmizi'), [self.black.pk])
+        self.black.is_active = False
+        self.black.save()
+        self.assertEqual(search_products('elbise'), [self.red.pk])
+        self.bag.delete()
+        self.assertEqual(search_products('کیف'), [])
+        self.brand.name = 'LC Waikiki'
+        self.brand.save()
+        self.assertEqual(search_products('waikiki'), [self.red.pk])
+
+    def test_category_and_brand_changes(self):
+        """Test if products are indexed again only when the name is changed and a deleted brand is not found"""
+        with CaptureQueriesContext(connection) as queries:
+            self.dresses.save()
+        self.assertFalse([q for q in queries.captured_queries if TABLE in q['sql']])
+        self.dresses.name = 'Abiye'
+        self.dresses.save()
+        self.assertEqual(search_products('abiye'), [self.red.pk, self.black.pk])
+        self.brand.delete()
+        self.assertEqual(search_products('koton'), [])
+        self.assertEqual(search_products('kirmizi saten'), [self.red.pk])
+
+        ingest_products([{'external_id': '42', 'name': 'Keten Gömlek', 'description': '', 'category_path': ['Giyim'],
+                          'brand': 'Mavi', 'price': 100, 'discount': 0, 'images': []}])
+        self.assertEqual(search_products('gomlek'), list(Product.objects.filter(external_id='42')
+                                                         .values_list('id', flat=True)))
+
+    def test_find_product(self):
+        """Test if the search page returns the products in the order of the ranks"""
+        data = self.client.get(reverse('vitrin:find-product'), {'q': 'kırmızı'}).json()
+
+        self.assertEqual([product['id'] for product in data['results']], [self.red.pk, self.black.pk])
+        self.assertEqual(data['results'][0]['brand'], 'Koton')
+        self.assertIsNone(data['next'])
+        self.assertEqual(self.client.get(reverse('vitrin:find-product')).json()['code'], 400)
+
+
+class TestFacets(TestCase):
+
+    def setUp(self) -> None:
+        facets.indexes.reset()
+        self.women = Category.objects.create(name='Kadin')
+        self.dresses = Category.objects.create(name='Elbise', parent=self.women)
+        self.shoes = Category.objects.create(name='Ayakkabi', parent=self.women)
+        self.koton, self.mavi = Brand.objects.create(name='Koton'), Brand.objects.create(name='Mavi')
+        self.products = [Product.objects.create(category=category, brand=brand, name=f'Urun {i}', price=price,
+                                                discount=discount)
+                         for i, (category, brand, price, discount) in enumerate([
+                             (self.dresses, self.koton, 300, 100),     # bucket 0
+                             (self.dresses, self.koton, 700, 0),     # bucket 2
+                             (self.dresses, self.mavi, 400, 0),     # bucket 1
+                             (self.shoes, self.mavi, 3000, 0),     # bucket 4
+                             (self.shoes, None, 450, 0),     # bucket 1
+                         ])]
+
+    def assert_consistent(self, category, selections=((), ())):
+        """Counts of the precomputed rows and the bitmaps must be the same as the counts of SQL"""
+        for brands, prices in selections:
+            self.assertEqual(facets.facet_counts(category, brands, prices), facets.sql_counts(category, brands, prices))
+        self.assertEqual(facets.subtree_counts(category), facets.sql_counts(category))
+
+    def test_counts(self):
+        """Test if the counts of a category page are read from the precomputed counts with one query"""
+        get_category_tree()
+        with self.assertNumQueries(1):
+            counts = facets.facet_counts(self.women)
+
+        self.assertEqual(counts, {'brand': {self.koton.pk: 2, self.mavi.pk: 2, 0: 1}, 'price': {0: 1, 1: 2, 2: 1, 4: 1},
+                                  'active': {1: 5}, 'total': 5})
+        self.assertEqual(facets.facet_counts(self.dresses)['total'], 3)
+
+    def test_selections(self):
+        """Test if the counts of every facet are filtered with the selections of the other facets"""
+        for _ in range(settings.FACET_INDEX_WARM_HITS + 1):
+            counts = facets.facet_counts(self.women, [self.mavi.pk], [1, 2])
+
+        self.assertEqual(counts['total'], 1)
+        self.assertEqual(counts['brand'], {self.koton.pk: 1, self.mavi.pk: 1, 0: 1})
+        self.assertEqual(counts['price'], {1: 1, 4: 1})
+        with self.assertNumQueries(0):
+            facets.facet_counts(self.women, [self.mavi.pk], [1, 2])
+        self.assertEqual(facets.indexes.get(self.women.pk).product_ids([self.koton.pk, 0], [1]),
+                         [self.products[4].pk])
+
+    def test_incremental_updates(self):
+        """Test if saved, deactivated, deleted and crawled products change the counts and the warm bitmaps"""
+        selections = [([self.koton.pk], []), ([], [1]), ([0, self.mavi.pk], [0, 1, 4])]
+        for _ in range(settings.FACET_INDEX_WARM_HITS):
+            facets.facet_counts(self.women, [self.koton.pk])
+        self.assertIsNotNone(facets.indexes.get(self.women.pk))
+
+        # Bitmaps are changed when the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.products[0]
+            product.brand, product.price, product.category = self.mavi, 5000, self.shoes
+            product.save()
+            Product.objects.filter(pk__in=[self.products[1].pk, self.products[2].pk]).set_active(False)
+            self.products[3].delete()
+            ingest_products([{'external_id': '42', 'name': 'Elbise', 'description': '',
+                              'category_path': ['Kadin', 'Elbise'], 'brand': 'Koton', 'price': 200, 'discount': 0,
+                              'images': []}])
+            self.mavi.delete()
+
+        self.assert_consistent(self.women, selections)
+        self.assert_consistent(self.dresses, selections)
+        self.assertEqual(facets.facet_counts(self.women)['active'], {0: 2, 1: 3})
+
+    def test_rolled_back_changes(self):
+        """Test if changes of a rolled back transaction do not change the warm bitmaps"""
+        for _ in range(settings.FACET_INDEX_WARM_HITS):
+            facets.facet_counts(self.women, [self.koton.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Product.objects.filter(pk=self.products[0].pk).set_active(False)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assert_consistent(self.women, [([self.koton.pk], [])])
+
+    def test_changes_while_loading(self):
+        """Test if changes that are committed after the products of a page are read are applied to its bitmaps"""
+        load = facets.FacetIndex.load
+
+        def load_and_change(category_ids):
+            index = load(category_ids)
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.filter(pk=self.products[2].pk).set_active(False)
+            return index
+
+        with mock.patch.object(facets.FacetIndex, 'load', side_effect=load_and_change):
+            for _ in range(settings.FACET_INDEX_WARM_HITS):
+                facets.facet_counts(self.women, [self.koton.pk])
+        self.assertIsNotNone(facets.indexes.get(self.women.pk))
+        self.assert_consistent(self.women, [([self.koton.pk], []), ([self.mavi.pk], [1])])
+
+    def test_rare_values(self):
+        """Test if rare brands of a big page are kept as positions and counted like the bitmaps"""
+        rng = random.Random(1)
+        states = {pk: facets.FacetState(1, rng.randrange(1, 200), rng.randrange(7), rng.random() < 0.9)
+                  for pk in range(1, 4001)}
+        index = facets.FacetIndex([1], states)
+
+        def selected(brands, prices):
+            return [pk for pk, s in states.items() if s and s.is_active and (not brands or s.brand in brands)
+                    and (not prices or s.bucket in prices)]
+
+        def expected(brands, prices):
+            return {'brand': dict(Counter(states[pk].brand for pk in selected((), prices))),
+                    'price': dict(Counter(states[pk].bucket for pk in selected(brands, ()))),
+                    'active': dict(Counter(int(s.is_active) for s in states.values() if s)),
+                    'total': len(selected(brands, prices))}
+
+        self.assertIsInstance(index.bitmaps[(FacetCount.BRAND, 100)], array)
+        self.assertIsInstance(index.bitmaps[(FacetCount.PRICE, 3)], int)
+        for pk in range(1, 400):
+            state = states[pk] = facets.FacetState(1, 100, 3, True) if pk % 2 else None
+            index.apply(pk, state)
+        self.assertIsInstance(index.bitmaps[(FacetCount.BRAND, 100)], int)
+        for brands, prices in [((), ()), ((100,), ()), ((7, 150), (1, 3)), ((), (2,)), ((0, 5), (6,))]:
+            self.assertEqual(index.counts(brands, prices), expected(brands, prices))
+            self.assertEqual(index.product_ids(brands, prices), selected(brands, prices))
+
+    def test_category_facets(self):
+        """Test if the facets page has the brand names and the price ranges"""
+        data = self.client.get(reverse('product:category-facets', args=[self.women.slug]), {'brand': self.koton.pk})\
+            .json()
+
+        self.assertEqual(data['total'], 2)
+        self.assertEqual([(brand['name'], brand['count']) for brand in data['brands']][0], ('Koton', 2))
+        self.assertEqual([price['count'] for price in data['prices']], [1, 0, 1, 0, 0, 0, 0])
+        self.assertEqual(self.client.get(reverse('product:category-facets', args=['yok'])).json()['code'], 404)
+        self.assertEqual(self.client.get(reverse('product:category-facets', args=[self.women.slug]),
+                                         {'price': 'x'}).json()['code'], 400)
+
+
+class TestAutocomplete(TestCase):
+
+    def setUp(self) -> None:
+        reset_autocomplete()
+        self.dresses = Category.objects.create(name='Elbise')
+        self.koton = Brand.objects.create(name='Koton')
+        for name in ['Siyah Saten Elbise', 'Siyah Saten Elbise', 'Kırmızı Elbise', 'Siyah Gömlek']:
+            Product.objects.create(category=self.dresses, brand=self.koton, name=name, price=100, discount=0)
+        Product.objects.create(category=self.dresses, name='Sim Elbise', price=100, discount=0, is_active=False)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(reset_autocomplete)
+
+    def test_suggest(self):
+        """Test if phrases are found from the start of their words and more popular ones come first"""
+        autocomplete = Autocomplete.build()
+        self.assertEqual([r['text'] for r in autocomplete.suggest('si')], ['siyah saten elbise', 'siyah gomlek'])
+        self.assertEqual([(r['text'], r['kind']) for r in autocomplete.suggest('ELB')],
+                         [('elbise', CATEGORY), ('siyah saten elbise', PRODUCT), ('kirmizi elbise', PRODUCT)])
+        self.assertEqual(autocomplete.suggest('kot'), [{'text': 'koton', 'kind': BRAND, 'id': self.koton.pk}])
+        self.assertEqual(autocomplete.suggest('sim'), [])
+        with self.settings(AUTOCOMPLETE_MAX_PHRASES=2):
+            self.assertEqual([r['text'] for r in Autocomplete.build().suggest('e')], ['elbise'])
+
+    def test_big_ranges(self):
+        """Test if precomputed phrases of the big ranges are the same as scanning all their keys"""
+        rng = random.Random(1)
+        words = ['siyah', 'saten', 'sim', 'elbise', 'etek', 'gomlek']
+        phrases = [(f'{rng.choice(words)} {rng.choice(words)} {i}', PRODUCT, i, rng.randint(0, 10 ** 6))
+                   for i in range(SCAN_LIMIT * 4)]
+        index = AutocompleteIndex(phrases)
+        self.assertIn('s', index.top)
+        for prefix in ['s', 'si', 'siyah', 'siyah s', 'e', 'gomlek e', '12']:
+            expected = sorted({(phrase[3], i) for i, phrase in enumerate(phrases)
+                               if any(key.startswith(prefix) for key in phrase_keys(phrase[0]))}, reverse=True)[:10]
+            self.assertEqual(index.lookup(prefix, 10), expected)
+
+    def test_snapshot(self):
+        """Test if the index is loaded from the snapshot without queries and changed products are added later"""
+        path = os.path.join(self.directory.name, 'autocomplete.snapshot')
+        Autocomplete.build().save(path)
+        Product.objects.create(category=self.dresses, name='Saten Etek', price=100, discount=0)
+        with self.assertNumQueries(0):
+            autocomplete = Autocomplete.load(path)
+            self.assertEqual([r['text'] for r in autocomplete.suggest('saten')], ['siyah saten elbise'])
+        self.assertEqual(autocomplete.refresh(), 1)
+        self.assertEqual([r['text'] for r in autocomplete.suggest('saten')], ['siyah saten elbise', 'saten etek'])
+        self.assertEqual(autocomplete.refresh(), 0)
+        with self.settings(AUTOCOMPLETE_OVERLAY_SIZE=1):
+            Product.objects.create(category=self.dresses, name='Saten Bluz', price=100, discount=0)
+            autocomplete.refresh()
+        self.assertEqual(autocomplete.overlay.phrases, [])
+        self.assertEqual(len(autocomplete.suggest('saten')), 3)
+
+    def test_refresh_same_time(self):
+        """Test if products changed at the same time are all added when they are read in more than one refresh"""
+        path = os.path.join(self.directory.name, 'autocomplete.snapshot')
+        Autocomplete.build().save(path)
+        autocomplete = Autocomplete.load(path)
+        for name in ['Saten Etek', 'Saten Bluz', 'Saten Ceket']:
+            Product.objects.create(category=self.dresses, name=name, price=100, discount=0)
+        Product.objects.filter(name__startswith='Saten').update(updated=timezone.now() + timedelta(minutes=1))
+        with self.settings(AUTOCOMPLETE_OVERLAY_SIZE=2):
+            self.assertEqual([autocomplete.refresh() for _ in range(3)], [2, 1, 0])
+        self.assertEqual(len(autocomplete.suggest('saten')), 4)
+
+    def test_view(self):
+        with override_settings(AUTOCOMPLETE_SNAPSHOT=os.path.join(self.directory.name, 'missing')):
+            response = self.client.get(reverse('vitrin:autocomplete'), {'q': 'kırm'}).json()
+        self.assertEqual(response['results'], [{'text': 'kirmizi elbise', 'kind': PRODUCT,
+                                                'id': Product.objects.get(name='Kırmızı Elbise').pk}])
+        self.assertEqual(self.client.get(reverse('vitrin:autocomplete')).json()['code'], 400)
+
+    def test_background_load(self):
+        """Test if workers start without waiting for the index and a broken database gives an empty index"""
+        loading, loaded = threading.Event(), threading.Event()
+
+        def build():
+            loading.set()
+            loaded.wait(5)
+            raise OperationalError('no such table: product_product')
+
+        missing = os.path.join(self.directory.name, 'missing')
+        with override_settings(AUTOCOMPLETE_SNAPSHOT=missing, AUTOCOMPLETE_REFRESH=0), \
+                mock.patch.object(Autocomplete, 'build', side_effect=build), self.assertLogs('product.autocomplete'):
+            start_refresher()
+            self.assertTrue(loading.wait(5))
+            self.assertEqual(get_autocomplete().suggest('siyah'), [])
+            loaded.set()
+            for thread in threading.enumerate():
+                if thread.name == 'autocomplete-refresher':
+                    thread.join(5)
+        autocomplete = get_autocomplete()
+        self.assertIs(get_autocomplete(), autocomplete)
+        self.assertEqual(autocomplete.suggest('siyah'), [])
+
+
+class TestCatalogApi(TestCase):
+
+    def setUp(self) -> None:
+        catalog_cache.clear()
+        self.women = Category.objects.create(name='Kadin')
+        self.dresses = Category.objects.create(name='Elbise', parent=self.women)
+        self.koton = Brand.objects.create(name='Koton')
+        self.products = [Product.objects.create(category=self.dresses if i % 2 else self.women,
+                                                brand=self.koton if i % 3 else None, name=f'Urun {i}',
+                                                description='Uzun aciklama', price=100 + i, discount=0)
+                         for i in range(7)]
+        self.url = reverse('product:catalog-list')
+
+    def count_queries(self, *args, **kwargs):
+        """Response of the url and the number of the product queries"""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(*args, **kwargs)
+        return response, len([q for q in captured.captured_queries
+                              if q['sql'].startswith('SELECT') and 'FROM "product_product"' in q['sql']])
+
+    def test_sparse_fields(self):
+        """Test if only the requested fields are serialized and their columns are read with one query"""
+        response, queries = self.count_queries(self.url, {'fields': 'id,name,brand'})
+        self.assertEqual(queries, 1)
+        self.assertEqual(response.json()['results'][0], {'id': self.products[-1].pk, 'name': 'Urun 6', 'brand': None})
+        self.assertEqual(response.json()['results'][1]['brand']['name'], 'Koton')
+        response, queries = self.count_queries(self.url, {'fields': 'id,price'})
+        self.assertEqual(queries, 1)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'price'})
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(self.url, {'fields': 'id,price'})
+        sql = [q['sql'] for q in captured.captured_queries if 'FROM "product_product"' in q['sql']][0]
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"description"', sql)
+        self.assertEqual(set(self.client.get(self.url).json()['results'][0]), set(ProductSerializer.Meta.fields))
+        self.assertEqual(self.client.get(self.url, {'fields': 'id,secret'}).status_code, 400)
+
+    def test_pages(self):
+        """Test if pages are read after the cursor, filtered by category and big pages are streamed"""
+        response = self.client.get(self.url, {'fields': 'id', 'page_size': 3}).json()
+        ids = [row['id'] for row in response['results']]
+        while response['next']:
+            response = self.client.get(response['next']).json()
+            ids += [row['id'] for row in response['results']]
+        self.assertEqual(ids, [product.pk for product in reversed(self.products)])
+        response = self.client.get(self.url, {'fields': 'id', 'category': self.dresses.slug}).json()
+        self.assertEqual([row['id'] for row in response['results']], [self.products[5].pk, self.products[3].pk,
+                                                                       self.products[1].pk])
+        with mock.patch.object(CatalogPagination, 'stream_threshold', 2), \
+                mock.patch.object(CatalogPagination, 'stream_chunk_size', 2):
+            response = self.client.get(self.url, {'fields': 'id,name', 'page_size': 5})
+            self.assertTrue(response.streaming)
+            data = json.loads(b''.join(response.streaming_content))
+            self.assertEqual([row['id'] for row in data['results']], ids[:5])
+            data = json.loads(b''.join(self.client.get(data['next']).streaming_content))
+            self.assertEqual([row['id'] for row in data['results']], ids[5:])
+
+
+class TestCatalogCache(TestCase):
+
+    def setUp(self) -> None:
+        catalog_cache.clear()
+        self.women = Category.objects.create(name='Kadin')
+        self.dresses = Category.objects.create(name='Elbise', parent=self.women)
+        self.men = Category.objects.create(name='Erkek')
+        self.koton = Brand.objects.create(name='Koton')
+        self.dress = Product.objects.create(category=self.dresses, brand=self.koton, name='Elbise', price=100,
+                                            discount=0)
+        self.url = reverse('product:catalog-list')
+        self.detail_url = reverse('product:catalog-detail', kwargs={'slug': self.dress.slug})
+
+    def count_queries(self, *args, **kwargs):
+        """Data of the page and the number of the product queries"""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(*args, **kwargs)
+        return response.json(), len([q for q in captured.captured_queries
+                                     if q['sql'].startswith('SELECT') and 'FROM "product_product"' in q['sql']])
+
+    def test_hits(self):
+        """Test if pages are read from the cache the second time and other pages are not cached"""
+        for url, data in ((self.detail_url, None), (self.url, {'category': self.women.slug}),
+                          (self.url, {'brand': self.koton.pk})):
+            first, queries = self.count_queries(url, data)
+            self.assertEqual(queries, 1)
+            second, queries = self.count_queries(url, data)
+            self.assertEqual(queries, 0)
+            self.assertEqual(first, second)
+        self.assertEqual(self.count_queries(self.url)[1], 1)
+        self.assertEqual(self.count_queries(self.url)[1], 1)
+        # Parameters that the view does not read are the same page
+        self.assertEqual(self.count_queries(self.detail_url, {'x': 'y' * 300})[1], 0)
+        self.assertEqual(self.count_queries(self.url, {'brand': self.koton.pk, 'page_size': 'x'})[1], 0)
+        self.assertEqual(self.count_queries(self.url, {'brand': self.koton.pk, 'page_size': 2})[1], 1)
+        stats = catalog_cache.stats()
+        self.assertEqual((stats['misses'], stats['local_hits'], stats['shared_hits']), (4, 5, 0))
+        # Another process reads the pages from the shared cache
+        catalog_cache.local.clear()
+        self.assertEqual(self.count_queries(self.detail_url)[1], 0)
+        self.assertEqual(catalog_cache.stats()['shared_hits'], 1)
+        self.assertEqual(self.client.get(reverse('product:catalog-detail', kwargs={'slug': 'none'})).status_code, 404)
+
+    def test_hosts(self):
+        """Test if pages asked with another scheme or host are not given the links of the first request"""
+        Product.objects.create(category=self.dresses, brand=self.koton, name='Etek', price=100, discount=0)
+        data = {'brand': self.koton.pk, 'page_size': 1}
+        links = [self.client.get(self.url, data, **headers).json()['next']
+                 for headers in ({}, {'secure': True}, {'HTTP_HOST': 'shop.example.com'})]
+
+        self.assertEqual([link.split('/')[:3] for link in links],
+                         [['http:', '', 'testserver'], ['https:', '', 'testserver'], ['http:', '', 'shop.example.com']])
+
+    def test_invalidation(self):
+        """Test if saved, deactivated and upserted products, categories and brands invalidate only their pages"""
+        women, dresses, men = ({'category': category.slug} for category in (self.women, self.dresses, self.men))
+        for data in (women, dresses, men):
+            self.client.get(self.url, data)
+        self.client.get(self.detail_url)
+        self.dress.price = 90
+        self.dress.save()
+        self.assertEqual(self.count_queries(self.url, men)[1], 0)
+        self.assertEqual(self.client.get(self.detail_url).json()['price'], '90')
+        self.assertEqual(self.client.get(self.url, women).json()['results'][0]['price'], '90')
+        # Old and new listings of the moved product
+        self.dress.category = self.men
+        self.dress.save()
+        self.assertEqual(self.client.get(self.url, men).json()['results'][0]['id'], self.dress.pk)
+        self.assertEqual(self.client.get(self.url, dresses).json()['results'], [])
+        Product.objects.filter(pk=self.dress.pk).set_active(False)
+        self.assertEqual(self.client.get(self.detail_url).status_code, 404)
+        self.assertEqual(self.client.get(self.url, men).json()['results'], [])
+        Product.objects.filter(pk=self.dress.pk).set_active(True)
+        self.koton.name = 'Koton Kids'
+        self.koton.save()
+        self.assertEqual(self.client.get(self.detail_url).json()['brand']['name'], 'Koton Kids')
+        ingest_products([{'external_id': '42', 'name': 'Yeni Elbise', 'description': '', 'category_path': ['Kadin'],
+                          'brand': 'Koton Kids', 'price': 50, 'discount': 0, 'images': []}])
+        self.assertEqual([row['name'] for row in self.client.get(self.url, {'brand': self.koton.pk}).json()['results']],
+                         ['Yeni Elbise', 'Elbise'])
+        self.assertEqual(self.client.get(self.url, women).json()['results'][0]['name'], 'Yeni Elbise')
+        self.assertGreater(catalog_cache.stats()['invalidations'], 0)
+
+    def test_invalidation_after_commit(self):
+        """Test if a page that is read before the transaction commits is read again after the commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dress.price = 80
+            self.dress.save()
+            # Another request reads the old row before the commit
+            with mock.patch.object(ProductSerializer, 'to_representation', return_value={'price': '100'}):
+                self.assertEqual(self.client.get(self.detail_url).json()['price'], '100')
+        self.assertEqual(self.client.get(self.detail_url).json()['price'], '80')
+
+    def test_stampede(self):
+        """Test if concurrent misses of a key are computed once in all the processes and stale values are served"""
+        processes = [TieredCache('catalog-test', alias='shared'), TieredCache('catalog-test', alias='shared')]
+        computed = []
+
+        def compute():
+            computed.append(1)
+            time.sleep(0.05)
+            return len(computed)
+
+        def read(number, results):
+            results[number] = processes[number % 2].get_or_set('/page/', ['product:x'], compute)
+
+        def herd(size=8):
+            results = [None] * size
+            threads = [threading.Thread(target=read, args=(i, results)) for i in range(size)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return results
+
+        self.assertEqual(herd(), [1] * 8)
+        self.assertEqual(len(computed), 1)
+        stats = [process.stats() for process in processes]
+        self.assertEqual(sum(s['misses'] for s in stats), 1)
+        self.assertEqual(sum(s['coalesced'] for s in stats), 7)
+        # The old value is served while the changed page is computed
+        processes[0].invalidate(['product:x'])
+        processes[1].local.clear()
+        results = herd()
+        self.assertEqual(len(computed), 2)
+        self.assertEqual(sorted(results)[-1], 2)
+        self.assertGreater(results.count(1), 0)
+        self.assertEqual(processes[0].get_or_set('/page/', ['product:x'], compute), 2)
+
+    def test_early_refresh(self):
+        """Test if entries are computed again before they expire only when they are chosen"""
+        values = iter(range(10))
+        page = TieredCache('catalog-test', alias='shared', local_timeout=0.001)
+        self.assertEqual(page.get_or_set('/page/', ['product:x'], lambda: next(values)), 0)
+        with override_settings(TIERED_CACHE_EARLY_REFRESH=10 ** 12):
+            with mock.patch('_resources.cache.random.random', return_value=0):
+                self.assertEqual(page.get_or_set('/page/', ['product:x'], lambda: next(values)), 0)
+            with mock.patch('_resources.cache.random.random', return_value=0.999):
+                self.assertEqual(page.get_or_set('/page/', ['product:x'], lambda: next(values)), 1)
+        self.assertEqual(page.stats()['early_refreshes'], 1)
+        with override_settings(TIERED_CACHE_TIMEOUT=1):
+            page.get_or_set('/other/', ['product:x'], lambda: 'old')
+        time.sleep(1.01)
+        self.assertEqual(page.get_or_set('/other/', ['product:x'], lambda: 'new'), 'new')
@@ -0,0 +1,102 @@
+"""
+In-process tree of all the categories, used for menus, breadcrumbs and finding the category of a listing page.
+
+** Categories change very rarely but they are needed in every page. The whole tree is loaded with one query (sorted
+by 'Category.path' so parents come before their children) and kept in the memory of every process for
+'CATEGORY_TREE_TIMEOUT' seconds. Saving or deleting a category resets the tree of the current process (see
+'product.signals'), other processes see the change after the timeout.
+"""
+import time
+
+from django.conf import settings
+
+from .models import Category
+
+
+class CategoryNode:
+    """A category in the tree. It has the same 'id', 'name', 'slug', 'parent_id' and 'path' of the model"""
+    __slots__ = ('id', 'name', 'slug', 'parent_id', 'path', 'parent', 'children')
+
+    def __init__(self, id, name, slug, parent_id, path):
+        self.id = id
+        self.name = name
+        self.slug = slug
+        self.parent_id = parent_id
+        self.path = path
+        self.parent = None
+        self.children = []
+
+    @property
+    def depth(self):
+        return self.path.count('/') - 1
+
+    def ancestors(self):
+        """Ancestors of the node from the root"""
+        nodes, node = [], self.parent
+        while node:
+            nodes.insert(0, node)
+            node = node.parent
+        return nodes
+
+    def descendants(self):
+        """All the nodes under this node in the tree order"""
+        for child in self.children:
+            yield child
+            yield from child.descendants()
+
+    def __repr__(self):
+        return f'<CategoryNode {self.id}: {self.name}>'
+
+
+class CategoryTree:
+    def __init__(self, rows):
+        """'rows' are dictionaries of category fields sorted by path"""
+        self.nodes = dict()
+        self.slugs = dict()
+        self.roots = []
+        for row in rows:
+            node = CategoryNode(row['id'], row['name'], row['slug'], row['parent_id'], row['path'])
+            self.nodes[node.id] = node
+            self.slugs[node.slug] = node
+            node.parent = self.nodes.get(node.parent_id)
+            (node.parent.children if node.parent else self.roots).append(node)
+
+    @classmethod
+    def load(cls):
+        return cls(Category.objects.order_by('path').values('id', 'name', 'slug', 'parent_id', 'path'))
+
+    def get(self, category_id):
+        return self.nodes.get(category_id)
+
+    def get_by_slug(self, slug):
+        return self.slugs.get(slug)
+
+    def breadcrumbs(self, category_id):
+        """Ancestors of the category and itself from the root"""
+        node = self.nodes.get(category_id)
+        return node.ancestors() + [node] if node else []
+
+    def subtree_ids(self, category_id):
+        """Ids of the category and all of its descendants"""
+        node = self.nodes.get(category_id)
+        return [node.id] + [child.id for child in node.descendants()] if node else []
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+_tree = None
+_loaded = 0
+
+
+def get_category_tree():
+    """Category tree of this process. Loaded with one query if it's not loaded or it's older than the timeout"""
+    global _tree, _loaded
+    if _tree is None or time.monotonic() - _loaded > settings.CATEGORY_TREE_TIMEOUT:
+        _tree, _loaded = CategoryTree.load(), time.monotonic()
+    return _tree
+
+
+def reset_category_tree():
+    global _tree
+    _tree = None
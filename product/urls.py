@@ -1,9 +1,16 @@
-from django.urls import path
+from django.urls import path, include
+from rest_framework import routers
+
 from . import views
 
 
 app_name = 'product'
 
+router = routers.DefaultRouter()
+
+router.register('catalog', views.ProductViewSet, 'catalog')
+
 urlpatterns = [
-    
-]
\ No newline at end of file
+    path('category/<slug:slug>/facets/', views.category_facets, name='category-facets'),
+    path('', include(router.urls)),
+]
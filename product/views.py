@@ -1,8 +1,135 @@
+import hashlib
+import json
+
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_GET
 from django.views.generic import DetailView
-from product.models import Product
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.viewsets import ReadOnlyModelViewSet
+from product.models import Product, Brand, FacetCount
+
+from _resources.pagination import KeysetPagination
+from .cache import catalog_cache, detail_groups, listing_groups
+from .facets import facet_counts, price_ranges
+from .serializers import ProductSerializer
+from .tree import get_category_tree
 
 
 class ProductDetailView(DetailView):
     model = Product
     template_name = ''
+
+
+def int_list(values):
+    try:
+        return sorted({int(value) for value in values})
+    except ValueError:
+        return None
+
+
+@require_GET
+def category_facets(request, slug):
+    """Facet counts of the category page with the selected brands and price buckets ('?brand=3&brand=7&price=1')"""
+    node = get_category_tree().get_by_slug(slug)
+    if node is None:
+        return JsonResponse(data={'msg': 'دسته بندی پیدا نشد', 'status': 'nok', 'code': 404})
+    brands, prices = int_list(request.GET.getlist('brand')), int_list(request.GET.getlist('price'))
+    ranges = price_ranges()
+    if brands is None or prices is None or any(bucket not in range(len(ranges)) for bucket in prices):
+        return JsonResponse(data={'msg': 'فیلتر نامعتبر است', 'status': 'nok', 'code': 400})
+    counts = facet_counts(node, brands, prices)
+    names = dict(Brand.objects.filter(id__in=counts[FacetCount.BRAND]).values_list('id', 'name'))
+    return JsonResponse(data={
+        'msg': '',
+        'status': 'ok',
+        'code': 200,
+        'total': counts['total'],
+        'brands': [{'id': brand, 'name': names.get(brand), 'count': count, 'selected': brand in brands}
+                   for brand, count in sorted(counts[FacetCount.BRAND].items(), key=lambda item: -item[1])],
+        'prices': [{'bucket': bucket, 'low': low, 'high': high, 'count': counts[FacetCount.PRICE].get(bucket, 0),
+                    'selected': bucket in prices} for bucket, (low, high) in enumerate(ranges)],
+        'active': {'active': counts[FacetCount.ACTIVE].get(1, 0), 'inactive': counts[FacetCount.ACTIVE].get(0, 0)},
+    })
+
+
+class CatalogPagination(KeysetPagination):
+    ordering = ('-id', )
+    page_size = 40
+    # Big pages (eg: feeds of the partners) are streamed
+    max_page_size = 10000
+
+
+class ProductViewSet(ReadOnlyModelViewSet):
+    """
+    Active products of the catalog, newest first ('?category=<slug>', '?brand=<id>'). Clients choose the fields with
+    '?fields=id,name,price,image': only their columns are read and only the needed relations are joined, so every page
+    is one query. Pages bigger than 'CatalogPagination.stream_threshold' are streamed. Product details, category
+    listings and brand pages are cached (see 'product.cache')
+    """
+    serializer_class = ProductSerializer
+    permission_classes = [permissions.AllowAny, ]
+    pagination_class = CatalogPagination
+    lookup_field = 'slug'
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = ProductSerializer.requested_fields(self.request)
+        return context
+
+    def get_queryset(self):
+        fields = ProductSerializer.requested_fields(self.request)
+        # 'id' is the cursor of the pages
+        only = ProductSerializer.only_fields(fields) + ['id']
+        queryset = Product.objects.filter(is_active=True).only(*only)
+        relations = [relation for relation in ('category', 'brand') if relation in (fields or [relation])]
+        # 'select_related()' without relations follows every foreign key
+        if relations:
+            queryset = queryset.select_related(*relations)
+        category = self.request.query_params.get('category')
+        if category:
+            node = get_category_tree().get_by_slug(category)
+            queryset = queryset.in_category(node) if node else queryset.none()
+        brand = self.request.query_params.get('brand')
+        if brand:
+            queryset = queryset.filter(brand=brand) if brand.isdigit() else queryset.none()
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        paginator = self.paginator
+        if paginator.should_stream(request):
+            serializer = self.get_serializer()
+            return paginator.stream_page(self.get_queryset(), request, serializer.to_representation, view=self)
+        groups = self.listing_groups()
+        if groups is None:
+            return super().list(request, *args, **kwargs)
+        return Response(catalog_cache.get_or_set(
+            self.cache_name(), groups, lambda: super(ProductViewSet, self).list(request, *args, **kwargs).data))
+
+    def retrieve(self, request, *args, **kwargs):
+        slug = kwargs[self.lookup_field]
+        return Response(catalog_cache.get_or_set(
+            self.cache_name(slug), detail_groups(slug),
+            lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs).data))
+
+    def cache_name(self, slug=None):
+        """
+        Hash of the page and the parameters that the view reads. Other parameters (eg: '?x=1') are the same page and a
+        long query string is not a longer key. Image urls and page links are absolute, so scheme and host are in it too
+        """
+        params = self.request.query_params
+        fields = ProductSerializer.requested_fields(self.request)
+        page = [self.action, slug, sorted(fields or []), params.get('category', ''), params.get('brand', ''),
+                self.request.scheme, self.request.get_host()]
+        if slug is None:
+            page += [params.get(self.paginator.cursor_query_param, ''), self.paginator.get_page_size(self.request)]
+        return f'{self.action}:' + hashlib.sha256(json.dumps(page).encode()).hexdigest()
+
+    def listing_groups(self):
+        """Groups of the category listing or the brand page, 'None' for the other pages (they are not cached)"""
+        category, brand = self.request.query_params.get('category'), self.request.query_params.get('brand')
+        node = get_category_tree().get_by_slug(category) if category else None
+        if (category and node is None) or (brand and not brand.isdigit()) or not (node or brand):
+            return None
+        return listing_groups(node.id if node else None, int(brand) if brand else None)
@@ -0,0 +1,130 @@
+"""
+Check the queries of every page of the site (the urls of 'config/urls.py') against seeded data of diffrent sizes:
+    python manage.py check_query_budget --sizes 5 20 60
+Every size is seeded in a transaction that is rolled back at the end (products, users with addresses, orders of the
+signed in staff user with their lines and a cart), so the configured database is not changed. Every url is requested
+once to load the process caches and then measured with 'QueryBudget' (queries of django-silk are not counted).
+Cached pages (see 'product.cache') are not cached here, their queries are checked.
+
+The command fails if queries of a page grow with the rows (N+1 queries). Pages of the third-party apps (admin, silk,
+debug toolbar, ...) are not checked.
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import get_resolver, reverse, NoReverseMatch, URLPattern, URLResolver
+from silk.collector import DataCollector
+
+from _resources.querybudget import QueryBudget, QueryBudgetExceeded, check_scaling
+from account.models import Address
+from cart.models import Cart, CartItem
+from order.models import Order, OrderLine
+from product import facets
+from product.autocomplete import reset_autocomplete
+from product.models import Category, Brand, Product
+from product.tree import reset_category_tree
+
+
+# Urls of the third-party apps and the pages that can't be requested again (eg: logout)
+EXCLUDED_URLS = ('/admin/', '/ckeditor/', '/__debug__/', '/silk/', '/watchman/', '/api-auth/', '/login/logout/')
+# Url parameters of the pages that are not the same as other pages with a parameter of this name
+PARAMETERS = {
+    'product:category-facets': {'slug': 'category'},
+}
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'query-budget'}}
+
+
+def url_patterns(resolver=None, namespace='', parameters=()):
+    """'(name with namespace, parameters)' of every named url"""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        pattern_parameters = parameters + tuple(pattern.pattern.regex.groupindex)
+        if isinstance(pattern, URLResolver):
+            yield from url_patterns(pattern, f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace,
+                                    pattern_parameters)
+        # Format suffix urls of rest-framework ('.json') are the same pages
+        elif isinstance(pattern, URLPattern) and pattern.name and 'format' not in pattern_parameters:
+            yield f'{namespace}{pattern.name}', tuple(dict.fromkeys(pattern_parameters))
+
+
+class Command(BaseCommand):
+    help = 'Check that queries of the pages do not grow with the rows of the tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[5, 20, 60])
+        parser.add_argument('--milliseconds', type=float, default=None, help='Time budget of every page')
+
+    def seed(self, size):
+        """Data of the size and the values of the url parameters"""
+        admin = get_user_model().objects.create_superuser('query-budget-admin', 'password')
+        users = get_user_model().objects.bulk_create([get_user_model()(username=f'query-budget-{i}', slug=f'qb-{i}')
+                                                      for i in range(size)])
+        Address.objects.bulk_create([Address(user=user, city='Tehran') for user in users])
+        root = Category.objects.create(name='Query Budget')
+        categories = [Category.objects.create(name=f'Query Budget {i}', parent=root) for i in range(max(1, size // 5))]
+        brands = Brand.objects.bulk_create([Brand(name=f'Query Budget {i}', slug=f'query-budget-{i}')
+                                            for i in range(max(1, size // 5))])
+        products = [Product.objects.create(category=categories[i % len(categories)], brand=brands[i % len(brands)],
+                                           name=f'Query Budget Elbise {i}', price=100 + i, discount=0,
+                                           quantity_available=10) for i in range(size)]
+        cart = Cart.objects.create(user=admin)
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product) for product in products])
+        orders = Order.objects.bulk_create([Order(user=admin, cart=cart) for i in range(size)])
+        OrderLine.objects.bulk_create([OrderLine(order=order, product=product, name=product.name, unit_price=100,
+                                                 quantity=1, total=100) for order in orders for product in products[:3]])
+        # Process caches of the old data
+        reset_category_tree()
+        reset_autocomplete()
+        facets.indexes.reset()
+        return admin, {'slug': products[0].slug, 'category': root.slug, 'order_id': orders[0].order_id,
+                       'username': users[0].username, 'pk': users[0].address_user.pk}
+
+    def measure(self, client, url):
+        client.get(url)
+        # django-silk keeps the last request and explains its queries in the next request
+        DataCollector().clear()
+        with QueryBudget() as budget:
+            response = client.get(url)
+        return response.status_code, budget
+
+    def handle(self, *args, **options):
+        results = dict()
+        for size in sorted(options['sizes']):
+            with transaction.atomic(), override_settings(CACHES=LOCAL_CACHE, TIERED_CACHE_TIMEOUT=0):
+                admin, values = self.seed(size)
+                client = Client(raise_request_exception=False)
+                client.force_login(admin)
+                for name, parameters in url_patterns():
+                    sources = PARAMETERS.get(name, dict())
+                    try:
+                        url = reverse(name, kwargs={p: values[sources.get(p, p)] for p in parameters})
+                    except (KeyError, NoReverseMatch):
+                        continue
+                    if url.startswith(EXCLUDED_URLS):
+                        continue
+                    results.setdefault(name, dict())[size] = self.measure(client, url)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'{size:5} {url}')
+                transaction.set_rollback(True)
+
+        failed = []
+        sizes = sorted(options['sizes'])
+        self.stdout.write(f'{"page":40}' + ''.join(f'{size:>22}' for size in sizes))
+        for name, measures in results.items():
+            problems = []
+            try:
+                budgets = check_scaling(lambda size: measures[size][1], [size for size in sizes if size in measures])
+            except QueryBudgetExceeded:
+                budgets = {size: measures[size][1] for size in sizes if size in measures}
+                problems.append('GROWS')
+            if options['milliseconds'] and max(b.milliseconds for b in budgets.values()) > options['milliseconds']:
+                problems.append('SLOW')
+            if problems:
+                failed.append(name)
+            self.stdout.write(f'{name:40}' + ''.join(
+                f'{measures[size][1].count:6}q {measures[size][1].milliseconds:7.1f}ms {measures[size][0]:4}'
+                if size in measures else f'{"-":>22}' for size in sizes) + '  ' + ' '.join(problems))
+        if failed:
+            raise CommandError(f'pages over the budget: {", ".join(failed)}')
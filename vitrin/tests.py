@@ -0,0 +1,60 @@
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from _resources.querybudget import QueryBudget, QueryBudgetExceeded, check_scaling
+from product.models import Category, Product
+from .management.commands.check_query_budget import url_patterns
+
+
+class TestQueryBudget(TestCase):
+
+    def setUp(self) -> None:
+        self.category = Category.objects.create(name='Elbise')
+
+    def create_products(self, count):
+        Product.objects.filter(category=self.category).delete()
+        for i in range(count):
+            Product.objects.create(category=self.category, name=f'Urun {i}', price=100, discount=0)
+
+    def test_budget(self):
+        """Test if queries of the block are counted (without the queries of django-silk) and the budget is checked"""
+        with QueryBudget(2) as budget:
+            self.client.get(reverse('vitrin:index'))
+            Product.objects.count()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM "silk_request"')
+        self.assertEqual(budget.count, 1)
+        with self.assertRaises(QueryBudgetExceeded):
+            with QueryBudget(1):
+                list(Product.objects.all())
+                list(Category.objects.all())
+
+        @QueryBudget(queries=1)
+        def count_products():
+            return Product.objects.count()
+
+        # Every call has its own budget
+        count_products()
+        count_products()
+
+    def test_scaling(self):
+        """Test if queries that grow with the rows (N+1) are found"""
+        def measure(read):
+            def run(size):
+                self.create_products(size)
+                with QueryBudget() as budget:
+                    read()
+                return budget
+            return run
+
+        check_scaling(measure(lambda: [p.category.name for p in Product.objects.select_related('category')]), [1, 5])
+        with self.assertRaises(QueryBudgetExceeded):
+            check_scaling(measure(lambda: [p.category.name for p in Product.objects.all()]), [1, 5])
+
+    def test_url_patterns(self):
+        """Test if all the named urls of 'config/urls.py' are found with their parameters"""
+        patterns = dict(url_patterns())
+        self.assertEqual(patterns['vitrin:index'], ())
+        self.assertEqual(patterns['product:category-facets'], ('slug', ))
+        self.assertEqual(patterns['order:history-detail'], ('order_id', ))
@@ -6,6 +6,7 @@ from . import views
 app_name = 'vitrin'
 
 urlpatterns = [
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('find-product/', views.find_product, name='find-product'),
     path('', views.index, name='index'),
 ]
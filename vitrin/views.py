@@ -1,5 +1,10 @@
+from django.http import JsonResponse
 from django.shortcuts import render, HttpResponse
 
+from product.models import Product
+from product.autocomplete import get_autocomplete
+from product.search import search_products
+
 
 def index(request):
     """Index page of the shop"""
@@ -8,5 +13,35 @@ def index(request):
 
 
 def find_product(request):
-    """Find the product that user wants to buy"""
-    return HttpResponse('<div style="text-align: center;"><h1>This will be served for finding the product...</h1></div>')
+    """Find the product that user wants to buy: ranked products that match all the words of 'q' (see 'product.search')"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse(data={'msg': 'عبارت جستجو وارد نشده است', 'status': 'nok', 'code': 400})
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    page_size = 20
+    # One more id is read to know if there is a next page
+    ids = search_products(query, limit=page_size + 1, offset=(page - 1) * page_size)
+    products = Product.objects.filter(id__in=ids[:page_size]).select_related('brand')\
+        .only('id', 'name', 'slug', 'price', 'discount', 'image', 'brand__name')
+    by_id = {product.id: product for product in products}
+    results = [{'id': product.id,
+                'name': product.name,
+                'slug': product.slug,
+                'brand': product.brand.name if product.brand else None,
+                'price': product.price,
+                'discount': product.discount,
+                'image': product.image.url if product.image else None}
+               for product in (by_id[pk] for pk in ids[:page_size] if pk in by_id)]
+    return JsonResponse(data={'msg': '', 'status': 'ok', 'code': 200, 'results': results,
+                              'next': page + 1 if len(ids) > page_size else None})
+
+
+def autocomplete(request):
+    """Suggestions of the product, brand and category names while user types 'q' (see 'product.autocomplete')"""
+    query = request.GET.get('q', '')
+    if not query.strip():
+        return JsonResponse(data={'msg': 'عبارت جستجو وارد نشده است', 'status': 'nok', 'code': 400})
+    return JsonResponse(data={'msg': '', 'status': 'ok', 'code': 200, 'results': get_autocomplete().suggest(query)})